@@ -0,0 +1,71 @@
+import random
+import sys
+import time
+
+from cubik import RubikCube
+from cubik.cubik import branching_factor
+
+
+def benchmark_movements(n_movements=200000):
+	"""
+	Measures how many movements per second the cube can do through do_movement() and undo()
+	:param n_movements: Number of movements to do
+	:return: Movements per second
+	"""
+	cube = RubikCube()
+	movements = [random.choice(RubikCube.POSSIBLE_MOVEMENTS) for _ in range(n_movements)]
+	start = time.perf_counter()
+	for movement in movements:
+		cube.do_movement(movement)
+	for _ in movements:
+		cube.undo()
+	return 2 * n_movements / (time.perf_counter() - start)
+
+
+def benchmark_random_cubes(n_cubes=2000):
+	"""
+	Measures how many random cubes per second can be generated
+	:param n_cubes: Number of cubes to generate
+	:return: Cubes per second
+	"""
+	start = time.perf_counter()
+	for _ in range(n_cubes):
+		RubikCube()
+	return n_cubes / (time.perf_counter() - start)
+
+
+def benchmark_state_keys(n_keys=20000):
+	"""
+	Compares the cube's json against its compact key as transposition table keys
+	:param n_keys: Number of keys to build
+	:return: Dict with keys/sec and bytes per key for both
+	"""
+	cube = RubikCube()
+	results = {}
+	for name in ('json', 'key'):
+		start = time.perf_counter()
+		for _ in range(n_keys):
+			key = getattr(cube, name)
+		results[name] = {'keys/sec': int(n_keys / (time.perf_counter() - start)), 'bytes': sys.getsizeof(key)}
+	return results
+
+
+def benchmark_branching_factor(depth=12):
+	"""
+	Compares the effective branching factor of the searches, only leaving out undoing the last movement against
+	pruning the sequences of get_successors() in every turn metric
+	:return: Dict with the branching factors
+	"""
+	results = {'opposite': len(RubikCube.POSSIBLE_MOVEMENTS) - 1}
+	for metric in RubikCube.METRICS:
+		results['pruned ' + metric] = branching_factor(depth, metric)
+	return results
+
+
+if __name__ == '__main__':
+	print("Movements/sec:\t", int(benchmark_movements()))
+	print("Random cubes/sec:\t", int(benchmark_random_cubes()))
+	for name, result in benchmark_state_keys().items():
+		print("State", name + ":\t", result['keys/sec'], "keys/sec,", result['bytes'], "bytes per key")
+	for name, factor in benchmark_branching_factor().items():
+		print("Branching factor", name + ":\t", round(factor, 2))
@@ -1 +1,3 @@
-from .cubik import RubikCube, BacktrackingSolver, HeuristicSolver
\ No newline at end of file
+from .cubik import RubikCube, BacktrackingSolver, HeuristicSolver, IDASolver
+from .bidirectional import BidirectionalSolver
+from .kociemba import KociembaSolver
@@ -0,0 +1,206 @@
+"""
+Batch solving: reads cubes as JSON lines, solves them in a pool of processes and writes every result as a JSON line as
+soon as it is ready.
+
+Every input line is a JSON object with an optional "id" (the line number if missing) and either a "scramble", the
+movements done to a solved cube (IE: "R U F1" or ["R", "U", "F1"]), or a "state", the 54 cells of RubikCube.state.
+Every output line has the "id", the "status" (solved, unsolved or error), the "solution" and its "length", the
+"time" in seconds and the "nodes" searched, or the "error" of cubes that can't be solved.
+
+Writing into a file, the cubes whose id is already in it are skipped, so a batch stopped or crashed midway is resumed
+running it again with the same output. With a solution cache, every worker process looks the cubes up in it before
+solving them and stores their solutions after.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .cubik import RubikCube, IDASolver
+from .kociemba import KociembaSolver, get_tables
+from .solution_cache import SolutionCache
+
+SOLVERS = ('kociemba', 'ida')
+
+# Solution cache of every path opened by this process
+_caches = {}
+
+
+def get_cache(path):
+	"""
+	Returns the SolutionCache of path, opening it only once per process. None if path is None
+	"""
+	if path is None:
+		return None
+	if path not in _caches:
+		_caches[path] = SolutionCache(path)
+	return _caches[path]
+
+
+def read_cube(task):
+	"""
+	Builds the cube of an input line
+	:param task: Dict of the input line
+	:return: RubikCube
+	:raise ValueError: If there's no valid scramble or state
+	"""
+	if 'invalid' in task:
+		raise ValueError(task['invalid'])
+	if 'state' in task:
+		if not isinstance(task['state'], list):
+			raise ValueError('A state is a list of 54 cells')
+		state = tuple(task['state'])
+		if len(state) != 54:
+			raise ValueError('A state has 54 cells, not ' + str(len(state)))
+		return RubikCube.from_state(state)
+	if 'scramble' in task:
+		scramble = task['scramble']
+		if isinstance(scramble, str):
+			scramble = scramble.split()
+		if not isinstance(scramble, list) or not all(isinstance(movement, str) for movement in scramble):
+			raise ValueError('A scramble is a string or a list of movements')
+		cube = RubikCube(cube=RubikCube.SOLVED)
+		for movement in scramble:
+			if movement not in RubikCube.MOVEMENTS:
+				raise ValueError('Invalid movement ' + str(movement))
+			cube.do_movement(movement)
+		cube.movements_applied = []
+		return cube
+	raise ValueError('Every line needs a scramble or a state')
+
+
+def solve_task(arguments):
+	"""
+	Solves an input line, in a worker process
+	:param arguments: (task, solver name, timeout, max_length, tables_path, cache_path)
+	:return: Dict of the output line
+	"""
+	task, solver_name, timeout, max_length, tables_path, cache_path = arguments
+	result = {'id': task['id']}
+	start = time.perf_counter()
+	try:
+		cube = read_cube(task)
+		if solver_name == 'kociemba':
+			solver = KociembaSolver(cube=cube, max_length=max_length, timeout=timeout, tables_path=tables_path,
+			                        cache=get_cache(cache_path))
+			solution = solver.solve()
+		else:
+			solver = IDASolver(cube=cube, cache=get_cache(cache_path))
+			solution = solver.solve(max_movements=max_length, time_limit=timeout)
+	# Malformed lines are only an error of their own cube, the batch goes on
+	except (TypeError, ValueError) as e:
+		result.update({'status': 'error', 'error': str(e), 'time': time.perf_counter() - start})
+		return result
+	result.update({'status': 'unsolved' if solution is None else 'solved', 'solution': solution,
+	               'length': None if solution is None else len(solution), 'time': time.perf_counter() - start,
+	               'nodes': solver.n_movements_done})
+	return result
+
+
+def read_tasks(lines, done=()):
+	"""
+	Yields the input lines as dicts, skipping blank lines and those whose id is in done
+	"""
+	for number, line in enumerate(lines):
+		if not line.strip():
+			continue
+		try:
+			task = json.loads(line)
+		except ValueError as e:
+			task = {'invalid': str(e)}
+		if not isinstance(task, dict):
+			task = {'invalid': 'Every line must be a JSON object'}
+		task.setdefault('id', number)
+		if isinstance(task['id'], (list, dict)):
+			task = {'id': number, 'invalid': 'An id must be a string or a number'}
+		if task['id'] not in done:
+			yield task
+
+
+def finished_ids(path):
+	"""
+	Returns the ids of the results already in path, dropping the last line if it was left half written
+	"""
+	done = set()
+	if not os.path.exists(path):
+		return done
+	with open(path, 'rb+') as file:
+		content = file.read()
+		if content and not content.endswith(b'\n'):
+			complete = content.rfind(b'\n') + 1
+			file.truncate(complete)
+			content = content[:complete]
+	for line in content.splitlines():
+		done.add(json.loads(line)['id'])
+	return done
+
+
+def solve_batch(lines, output, processes=None, solver='kociemba', timeout=10, max_length=None, tables_path=None,
+                done=(), cache_path=None):
+	"""
+	Solves every cube of the input lines, writing every result into output as soon as it is ready
+	:param lines: Iterable of JSON lines
+	:param output: Writable text file
+	:param processes: Worker processes. None for one per CPU
+	:param solver: 'kociemba' or 'ida'
+	:param timeout: Seconds to solve every cube
+	:param max_length: Longest solution accepted. None for the solver's default
+	:param tables_path: Directory of the kociemba tables. None for ~/.cache/cubik
+	:param done: Ids to skip
+	:param cache_path: SQLite file of the solution cache. None for no cache
+	:return: Number of cubes solved
+	"""
+	if solver not in SOLVERS:
+		raise ValueError('Invalid solver ' + solver)
+	if max_length is None:
+		max_length = 32 if solver == 'kociemba' else 20
+	if solver == 'kociemba':
+		# Loads or generates the tables once, before the workers are started
+		get_tables(tables_path)
+	if cache_path is not None:
+		# Creates the file once, before the workers open it
+		SolutionCache(cache_path).close()
+	arguments = ((task, solver, timeout, max_length, tables_path, cache_path) for task in read_tasks(lines, done))
+	n_solved = 0
+	with multiprocessing.Pool(processes) as pool:
+		for result in pool.imap_unordered(solve_task, arguments):
+			output.write(json.dumps(result) + '\n')
+			output.flush()
+			n_solved += result['status'] == 'solved'
+	return n_solved
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Solves cubes read as JSON lines, writing the solutions as JSON lines')
+	parser.add_argument('input', nargs='?', help='File of cubes. Stdin if missing')
+	parser.add_argument('-o', '--output', help='File of solutions, resumed if it exists. Stdout if missing')
+	parser.add_argument('-p', '--processes', type=int, help='Worker processes. One per CPU if missing')
+	parser.add_argument('-s', '--solver', choices=SOLVERS, default='kociemba', help='Solver to use')
+	parser.add_argument('-t', '--timeout', type=float, default=10, help='Seconds to solve every cube')
+	parser.add_argument('-m', '--max-length', type=int, help='Longest solution accepted')
+	parser.add_argument('--tables', help='Directory of the kociemba tables')
+	parser.add_argument('--cache', help='SQLite file of the solution cache')
+	arguments = parser.parse_args(argv)
+
+	done = finished_ids(arguments.output) if arguments.output else set()
+	input_file = open(arguments.input) if arguments.input else sys.stdin
+	output_file = open(arguments.output, 'a') if arguments.output else sys.stdout
+	try:
+		n_solved = solve_batch(input_file, output_file, processes=arguments.processes, solver=arguments.solver,
+		                       timeout=arguments.timeout, max_length=arguments.max_length,
+		                       tables_path=arguments.tables, done=done, cache_path=arguments.cache)
+	except KeyboardInterrupt:
+		n_solved = None
+	finally:
+		if arguments.input:
+			input_file.close()
+		if arguments.output:
+			output_file.close()
+	if n_solved is not None:
+		print(n_solved, "cubes solved", file=sys.stderr)
+
+
+if __name__ == '__main__':
+	main()
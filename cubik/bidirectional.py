@@ -0,0 +1,230 @@
+"""
+Bidirectional solver: two breadth first searches, one from the scrambled cube and one from solved, meeting in the
+middle. A solution of n movements only needs the states within about n / 2 movements of each end, instead of the ones
+within n movements of the scrambled cube, so short and medium scrambles are solved optimally without a heuristic.
+
+States are turned by a whole cube rotation into the one with the centres of RubikCube.SOLVED (endgame.normalize), so
+both searches keep one of the 24 orientations of every state and the backward one starts from a single solved state.
+Every search keeps a dict of the states it reached, keyed by the 54 bytes of the state (or, without verify, their 64 bit
+hash), whose values pack like the endgame tables the distance (3 bits) and the index in RubikCube.ALL_MOVEMENTS of the
+movement going back to its start (5 bits), so the solution is rebuilt from the state where both searches meet without
+keeping parents.
+"""
+from .cubik import RubikCube
+from .endgame import NO_MOVEMENT, normalize, undo_movements
+from .metrics import SearchMetrics, SearchStopped
+
+# Approximate memory of every state reached: the dict entry with its key (54 bytes, or its 64 bit hash), plus the
+# state kept in the frontier
+BYTES_PER_ENTRY = 150
+HASH_BYTES_PER_ENTRY = 125
+# Bytes of a flat state
+STATE_SIZE = 54
+# Most movements every search can go, limited by the 3 bits of the distance
+MAX_DEPTH = 7
+
+
+class BidirectionalSolver:
+	"""
+	Meet in the middle solver: always expands the smaller of both frontiers a whole level, so the first state reached
+	by both searches gives an optimal solution
+	"""
+
+	def __init__(self, cube=None, max_bytes=None, verify=True, metric='qstm', progress=None, progress_interval=1.0,
+	             cache=None):
+		"""
+		:param cube: RubikCube to solve. None to solve a random one
+		:param max_bytes: Approximate maximum memory of the states reached by both searches. Once the next level
+		wouldn't fit the search stops without a solution. None for no limit
+		:param verify: True to keep the whole states, ruling out hash collisions. False to keep only their hashes
+		:param metric: Turn metric whose movements are searched and counted, see RubikCube.METRICS
+		:param progress: Callable called with self.stats while searching, IE: metrics.print_progress. None for no
+		progress
+		:param progress_interval: Fewest seconds between calls to progress
+		:param cache: SolutionCache looked up before searching and updated after. None for no cache
+		"""
+		if metric not in RubikCube.METRICS:
+			raise ValueError('Invalid metric ' + metric)
+		self.cube = cube or RubikCube()
+		self.max_bytes = max_bytes
+		self.verify = verify
+		self.metric = metric
+		self.cache = cache
+		self.metrics = SearchMetrics(progress, progress_interval)
+		self.solution = None
+		self.__movements = RubikCube.METRICS[metric]
+		self.__getters = [RubikCube.MOVEMENTS[movement] for movement in self.__movements]
+		self.__undo = undo_movements(self.__movements)
+		self.__bytes_per_entry = BYTES_PER_ENTRY if verify else HASH_BYTES_PER_ENTRY
+		self.__forward = {}
+		self.__backward = {}
+		self.depths = [0, 0]
+		self.__branching = [len(self.__getters)] * 2
+
+	@property
+	def shortest_solution(self):
+		if self.solution is not None:
+			return {'initial_cube': self.cube.initial_cube, 'solution': self.solution}
+		else:
+			raise IndexError('No solutions found yet')
+
+	@property
+	def n_movements_done(self):
+		return self.metrics.nodes
+
+	@property
+	def memory(self):
+		"""
+		Approximate memory of the states reached by both searches
+		"""
+		return (len(self.__forward) + len(self.__backward)) * self.__bytes_per_entry
+
+	@property
+	def stats(self):
+		"""
+		Returns the counters of the search: nodes expanded, prunes by reason, time, the depth of both searches and the
+		states they reached
+		"""
+		stats = self.metrics.stats
+		stats['depths'] = tuple(self.depths)
+		stats['memory'] = self.memory
+		stats['tables'] = {'forward': len(self.__forward), 'backward': len(self.__backward)}
+		return stats
+
+	def __key(self, state):
+		return state if self.verify else hash(state)
+
+	def solve(self, max_movements=14, time_limit=None, max_nodes=None, cancel=None):
+		"""
+		Searches the shortest solution of the cube, leaving it in self.solution. The first solution found is the
+		shortest one, so if the budget or the memory runs out first there's none (self.stats['stopped'] tells why)
+		:param max_movements: Longest solution to look for, 2 * MAX_DEPTH at most
+		:param time_limit: Seconds the search can last. None for no limit
+		:param max_nodes: Nodes the search can expand. None for no limit
+		:param cancel: Object whose is_set() returns True once the search has to stop, IE: a threading.Event set by
+		another thread. None for no cancellation
+		:return: List of movements of the shortest solution or None if there is none with max_movements or less
+		:raise ValueError: If the cube can't be solved
+		"""
+		if max_movements > 2 * MAX_DEPTH:
+			raise ValueError('The bidirectional solver looks for solutions of ' + str(2 * MAX_DEPTH) +
+			                 ' movements at most')
+		self.cube.check()
+		self.metrics.restart(time_limit, max_nodes, cancel)
+		state = self.cube.state
+		if self.cache is not None:
+			cached = self.cache.get(state, self.metric)
+			if cached is not None and cached[1]:
+				if len(cached[0]) > max_movements:
+					return None
+				self.solution = cached[0]
+				return self.solution
+
+		start = normalize(state)[0]
+		solved = normalize(RubikCube(cube=RubikCube.SOLVED).state)[0]
+		self.__forward = {self.__key(start): NO_MOVEMENT}
+		self.__backward = {self.__key(solved): NO_MOVEMENT}
+		self.depths = [0, 0]
+		self.__branching = [len(self.__getters)] * 2
+		frontiers = [[start], [solved]] if self.verify else [bytearray(start), bytearray(solved)]
+		meeting = start if self.__key(start) in self.__backward else None
+		try:
+			while meeting is None and sum(self.depths) < max_movements:
+				side = 0 if self.__size(frontiers[0]) <= self.__size(frontiers[1]) else 1
+				if self.depths[side] == MAX_DEPTH:
+					side = 1 - side
+				frontiers[side], meeting = self.__expand(side, frontiers[side])
+		except SearchStopped:
+			pass
+		solution = None if meeting is None else self.__solution(state, meeting)
+		if solution is not None:
+			self.solution = solution
+			if self.cache is not None:
+				self.cache.put(state, solution, True, self.metric)
+		return solution
+
+	def __expand(self, side, frontier):
+		"""
+		Expands a whole level of a search
+		:param side: 0 for the forward search, 1 for the backward one
+		:param frontier: States of the deepest level of the search
+		:return: (new frontier, state reached by both searches or None)
+		:raise SearchStopped: If the budget or the memory runs out
+		"""
+		reached, other = (self.__forward, self.__backward) if side == 0 else (self.__backward, self.__forward)
+		size = self.__size(frontier)
+		# The next level is expected to grow as much as the last one
+		self.__check_memory(size * self.__branching[side])
+		distance = self.depths[side] = self.depths[side] + 1
+		key_of, undo = self.__key, self.__undo
+		# Without verify the keys don't keep the states, the frontier keeps them one after another in a bytearray
+		new_frontier = [] if self.verify else bytearray()
+		add = new_frontier.append if self.verify else new_frontier.extend
+		for state in self.__states(frontier):
+			if self.metrics.expand():
+				self.metrics.progress(self.stats)
+			self.__check_memory()
+			for movement, getter in zip(self.__movements, self.__getters):
+				child, rotation = normalize(getter(state))
+				key = key_of(child)
+				if key in reached:
+					self.metrics.prunes['transposition'] += 1
+					continue
+				reached[key] = (distance << 5) | undo[rotation][movement]
+				if key in other:
+					return new_frontier, child
+				add(child)
+		self.__branching[side] = self.__size(new_frontier) / size
+		return new_frontier, None
+
+	def __size(self, frontier):
+		return len(frontier) if self.verify else len(frontier) // STATE_SIZE
+
+	def __states(self, frontier):
+		if self.verify:
+			return frontier
+		return (frontier[i:i + STATE_SIZE] for i in range(0, len(frontier), STATE_SIZE))
+
+	def __check_memory(self, new_states=0):
+		"""
+		:param new_states: States about to be reached
+		:raise SearchStopped: If they don't fit in self.max_bytes
+		"""
+		if self.max_bytes is not None and self.memory + new_states * self.__bytes_per_entry > self.max_bytes:
+			self.metrics.stopped = 'memory'
+			raise SearchStopped('memory')
+
+	def __path(self, reached, state):
+		"""
+		Returns the states going from a state back to the start of a search
+		"""
+		states = [state]
+		value = reached.get(self.__key(state))
+		while value is not None and value & NO_MOVEMENT != NO_MOVEMENT:
+			state = normalize(RubikCube.MOVEMENTS[RubikCube.ALL_MOVEMENTS[value & NO_MOVEMENT]](state))[0]
+			states.append(state)
+			value = reached.get(self.__key(state))
+		return states if value is not None else None
+
+	def __solution(self, state, meeting):
+		"""
+		Rebuilds the solution going through the state reached by both searches
+		:param state: Flat state of the cube
+		:param meeting: State reached by both searches, normalized
+		:return: List of movements, or None if a hash collision broke the path
+		"""
+		forward = self.__path(self.__forward, meeting)
+		backward = self.__path(self.__backward, meeting)
+		if forward is None or backward is None:
+			return None
+		solution = []
+		for goal in forward[-2::-1] + backward[1:]:
+			for movement, getter in zip(self.__movements, self.__getters):
+				child = getter(state)
+				if normalize(child)[0] == goal:
+					solution.append(movement)
+					state = child
+					break
+			else:
+				return None
+		return solution
@@ -0,0 +1,131 @@
+"""
+Many cubes at once: CubeArray keeps the flat states of N cubes as an (N, 54) array of unsigned bytes and does the
+movements to all of them with numpy fancy indexing, so expanding a frontier or generating data doesn't loop over
+RubikCube objects. numpy is only needed by this module.
+"""
+from .cubik import RubikCube
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+if numpy is not None:
+	# PERMUTATIONS[i] is the permutation of the movement RubikCube.ALL_MOVEMENTS[i], the first ones those of
+	# RubikCube.POSSIBLE_MOVEMENTS
+	PERMUTATIONS = numpy.array([RubikCube.PERMUTATIONS[movement] for movement in RubikCube.ALL_MOVEMENTS],
+	                           dtype=numpy.intp)
+	MOVEMENT_INDEXES = {movement: i for i, movement in enumerate(RubikCube.ALL_MOVEMENTS)}
+	# Centre of the face of every cell
+	FACE_CENTRES = numpy.array([i // 9 * 9 + 4 for i in range(54)], dtype=numpy.intp)
+else:
+	MOVEMENT_INDEXES = None
+
+
+class CubeArray:
+	"""
+	Flat states of many cubes, as an (N, 54) numpy array of uint8 in self.states
+	"""
+
+	def __init__(self, states):
+		"""
+		:param states: Anything numpy can turn into an (N, 54) array, IE: a list of RubikCube.state, or the bytes of
+		the states one after another, IE: RubikCube.key
+		"""
+		if numpy is None:
+			raise ImportError('CubeArray needs numpy')
+		if isinstance(states, (bytes, bytearray)):
+			states = numpy.frombuffer(states, dtype=numpy.uint8)
+		self.states = numpy.asarray(states, dtype=numpy.uint8).reshape(-1, 54)
+
+	@staticmethod
+	def solved_cubes(n):
+		"""
+		Returns an array of n solved cubes
+		"""
+		return CubeArray(numpy.tile(numpy.array(RubikCube(cube=RubikCube.SOLVED).state, dtype=numpy.uint8), (n, 1)))
+
+	@staticmethod
+	def from_cubes(cubes):
+		"""
+		Returns an array with the states of an iterable of RubikCube
+		"""
+		return CubeArray([cube.state for cube in cubes])
+
+	def to_cubes(self):
+		"""
+		Returns the cubes of the array as a list of RubikCube
+		"""
+		return [RubikCube.from_state(tuple(state)) for state in self.states.tolist()]
+
+	def __len__(self):
+		return len(self.states)
+
+	def __getitem__(self, item):
+		"""
+		Returns the cubes selected by an index, a slice or a mask as a new CubeArray
+		"""
+		return CubeArray(self.states[item])
+
+	def copy(self):
+		return CubeArray(self.states.copy())
+
+	def do_movement(self, movement):
+		"""
+		Does the same movement to every cube
+		:param movement: (String) Movement of RubikCube.ALL_MOVEMENTS
+		"""
+		if movement not in MOVEMENT_INDEXES:
+			raise KeyError('Invalid movement ' + movement)
+		self.states = self.states[:, PERMUTATIONS[MOVEMENT_INDEXES[movement]]]
+
+	def do_movements(self, movements):
+		"""
+		Does a different movement to every cube
+		:param movements: N movements, as names or indexes of RubikCube.ALL_MOVEMENTS (a numpy array of indexes is
+		the fastest)
+		"""
+		movements = self.__indexes(movements)
+		if len(movements) != len(self.states):
+			raise ValueError('One movement per cube is needed')
+		self.states = numpy.take_along_axis(self.states, PERMUTATIONS[movements], axis=1)
+
+	@staticmethod
+	def __indexes(movements):
+		"""
+		Returns movements given as names or indexes of RubikCube.ALL_MOVEMENTS as a numpy array of indexes
+		"""
+		if isinstance(movements, numpy.ndarray):
+			return movements
+		return numpy.array([MOVEMENT_INDEXES[movement] if isinstance(movement, str) else movement
+		                    for movement in movements], dtype=numpy.intp)
+
+	def children(self, movements=None):
+		"""
+		Returns every cube one movement away: the child i * M + j is the cube i after the movement j
+		:param movements: M movements, as names or indexes of RubikCube.ALL_MOVEMENTS (a numpy array of indexes is the
+		fastest). None for RubikCube.POSSIBLE_MOVEMENTS
+		:return: CubeArray of N * M cubes
+		"""
+		if movements is None:
+			permutations = PERMUTATIONS[:len(RubikCube.POSSIBLE_MOVEMENTS)]
+		else:
+			permutations = PERMUTATIONS[self.__indexes(movements)]
+		return CubeArray(self.states[:, permutations].reshape(-1, 54))
+
+	@property
+	def solved(self):
+		"""
+		Returns a boolean array, True for the cubes with every face of a single colour
+		"""
+		faces = self.states.reshape(-1, 6, 9)
+		return (faces == faces[:, :, :1]).all(axis=(1, 2))
+
+	@property
+	def heuristic(self):
+		"""
+		Returns HeuristicSolver's heuristic of every cube: the cells, not counting centres, of the colour of their
+		face's centre
+		:return: Integer array
+		"""
+		return 48 - (self.states != self.states[:, FACE_CENTRES]).sum(axis=1)
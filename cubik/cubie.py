@@ -0,0 +1,478 @@
+"""
+Pieces of the cube: which corner or edge is on every slot and how it is twisted or flipped.
+Slots and pieces are numbered as RubikCube.CORNERS and RubikCube.EDGES. The orientation of a piece on a slot is the
+position, within the slot's cells, of the piece's first cell colour (its U/D colour, F/B for middle layer edges).
+
+CubieCube holds a cube this way, and its pieces can be summed up as small integer coordinates (twist, flip, corners,
+edges, slice) which are moved with move tables instead of pieces.
+"""
+import random
+from array import array
+from math import comb, factorial
+from operator import itemgetter
+
+from .cubik import RubikCube
+
+
+def _colours(slots):
+	"""
+	Maps the colours read on a slot to the piece and its orientation
+	:param slots: RubikCube.CORNERS or RubikCube.EDGES
+	:return: Dict (colours of the slot's cells) -> (piece, orientation)
+	"""
+	colours = {}
+	for piece, cells in enumerate(slots):
+		home = tuple(cell // 9 + 1 for cell in cells)
+		for orientation in range(len(cells)):
+			colours[home[-orientation:] + home[:-orientation]] = (piece, orientation)
+	return colours
+
+
+def _movements(slots):
+	"""
+	Describes every movement at piece level from its cells permutation
+	:param slots: RubikCube.CORNERS or RubikCube.EDGES
+	:return: Dict movement -> (sources, twists). After the movement, slot i holds the piece that was on slot sources[i]
+			with its orientation increased by twists[i]
+	"""
+	cell_slots = {cell: (slot, position) for slot, cells in enumerate(slots) for position, cell in enumerate(cells)}
+	movements = {}
+	for movement, permutation in RubikCube.PERMUTATIONS.items():
+		sources, twists = [], []
+		for cells in slots:
+			slot, position = cell_slots[permutation[cells[0]]]
+			sources.append(slot)
+			twists.append(-position % len(cells))
+		movements[movement] = (tuple(sources), tuple(twists))
+	return movements
+
+
+CORNER_COLOURS = _colours(RubikCube.CORNERS)
+EDGE_COLOURS = _colours(RubikCube.EDGES)
+
+CORNER_MOVEMENTS = _movements(RubikCube.CORNERS)
+EDGE_MOVEMENTS = _movements(RubikCube.EDGES)
+
+# Colours of every piece, starting by its first cell
+CORNER_HOMES = [tuple(cell // 9 + 1 for cell in cells) for cells in RubikCube.CORNERS]
+EDGE_HOMES = [tuple(cell // 9 + 1 for cell in cells) for cells in RubikCube.EDGES]
+
+# After a movement, centre i has the colour of centre CENTRE_MOVEMENTS[movement][i]
+CENTRE_MOVEMENTS = {movement: tuple(RubikCube.CENTRES.index(permutation[centre]) for centre in RubikCube.CENTRES)
+                    for movement, permutation in RubikCube.PERMUTATIONS.items()}
+
+
+def read_pieces(state, slots, colours):
+	"""
+	Reads the pieces of a flat state
+	:param state: Flat state of the cube (use only with numeric cube)
+	:param slots: RubikCube.CORNERS or RubikCube.EDGES
+	:param colours: CORNER_COLOURS or EDGE_COLOURS
+	:return: (permutation, orientation) lists, the piece on every slot and its orientation
+	"""
+	permutation, orientation = [], []
+	for cells in slots:
+		piece, twist = colours[tuple(state[cell] for cell in cells)]
+		permutation.append(piece)
+		orientation.append(twist)
+	return permutation, orientation
+
+
+def corners(state):
+	"""
+	Reads the corners of a flat state
+	:return: (permutation, orientation) lists, the corner on every slot and its twist (0, 1 or 2)
+	"""
+	return read_pieces(state, RubikCube.CORNERS, CORNER_COLOURS)
+
+
+def edges(state):
+	"""
+	Reads the edges of a flat state
+	:return: (permutation, orientation) lists, the edge on every slot and its flip (0 or 1)
+	"""
+	return read_pieces(state, RubikCube.EDGES, EDGE_COLOURS)
+
+
+def rank_arrangement(positions, n):
+	"""
+	Ranks an ordered selection of distinct slots
+	:param positions: Slots of the selected pieces, in order
+	:param n: Number of slots
+	:return: (int) Rank between 0 and n! / (n - len(positions))! - 1
+	"""
+	rank = 0
+	used = 0  # Bit mask of the slots already selected
+	for i, position in enumerate(positions):
+		rank = rank * (n - i) + position - (used & ((1 << position) - 1)).bit_count()
+		used |= 1 << position
+	return rank
+
+
+def unrank_arrangement(rank, n, k):
+	"""
+	Inverse of rank_arrangement()
+	:return: List of the k slots ranked by rank
+	"""
+	digits = []
+	for i in range(k - 1, -1, -1):
+		rank, digit = divmod(rank, n - i)
+		digits.append(digit)
+	free = list(range(n))
+	return [free.pop(digit) for digit in reversed(digits)]
+
+
+def relative_to_centres(state):
+	"""
+	Recolours a flat state so every face's centre has the colour of that face in RubikCube.SOLVED. Slice movements
+	move the centres, after this the pieces can be read as if they hadn't, as long as only face movements are done.
+	:param state: Flat state of the cube (use only with numeric cube)
+	:return: Recoloured flat state
+	"""
+	colours = {state[centre]: face + 1 for face, centre in enumerate(RubikCube.CENTRES)}
+	return tuple(colours[cell] for cell in state)
+
+
+# Coordinates
+
+N_TWIST = 3 ** 7
+N_FLIP = 2 ** 11
+N_CORNERS = factorial(8)
+N_EDGES = factorial(12)
+N_SLICE = comb(12, 4)
+
+SLICE_EDGES = (8, 9, 10, 11)
+
+
+def get_twist(orientation):
+	"""
+	Coordinate of the corners orientation, the last one follows from the rest
+	"""
+	twist = 0
+	for corner_orientation in orientation[:7]:
+		twist = twist * 3 + corner_orientation
+	return twist
+
+
+def set_twist(twist):
+	orientation = []
+	for _ in range(7):
+		twist, corner_orientation = divmod(twist, 3)
+		orientation.append(corner_orientation)
+	orientation.reverse()
+	return orientation + [-sum(orientation) % 3]
+
+
+def get_flip(orientation):
+	"""
+	Coordinate of the edges orientation, the last one follows from the rest
+	"""
+	flip = 0
+	for edge_orientation in orientation[:11]:
+		flip = flip * 2 + edge_orientation
+	return flip
+
+
+def set_flip(flip):
+	orientation = []
+	for _ in range(11):
+		flip, edge_orientation = divmod(flip, 2)
+		orientation.append(edge_orientation)
+	orientation.reverse()
+	return orientation + [sum(orientation) % 2]
+
+
+def get_corners(permutation):
+	return rank_arrangement(permutation, 8)
+
+
+def set_corners(corners):
+	return unrank_arrangement(corners, 8, 8)
+
+
+def get_edges(permutation):
+	return rank_arrangement(permutation, 12)
+
+
+def set_edges(edges):
+	return unrank_arrangement(edges, 12, 12)
+
+
+def get_slice(permutation):
+	"""
+	Coordinate of the slots holding the middle layer edges, ignoring their order
+	"""
+	slots = [slot for slot, edge in enumerate(permutation) if edge in SLICE_EDGES]
+	return sum(comb(slot, i + 1) for i, slot in enumerate(slots))
+
+
+def set_slice(slice_):
+	"""
+	Inverse of get_slice(), with the middle layer edges in order and the rest in any order
+	"""
+	slots = []
+	for i in range(4, 0, -1):
+		slot = i - 1
+		while comb(slot + 1, i) <= slice_:
+			slot += 1
+		slice_ -= comb(slot, i)
+		slots.append(slot)
+	slice_edges = iter(SLICE_EDGES)
+	other_edges = iter(range(8))
+	return [next(slice_edges) if slot in slots else next(other_edges) for slot in range(12)]
+
+
+SLICE_GOAL = get_slice(list(range(12)))
+
+
+# Colours of the centres in every orientation of the whole cube
+CENTRE_ORIENTATIONS = [tuple(state[centre] for centre in RubikCube.CENTRES) for state in RubikCube.solved_states()]
+
+# Every movement as itemgetters of the sources and the twists of corners, edges and centres
+_CUBIE_MOVEMENTS = {movement: (itemgetter(*CORNER_MOVEMENTS[movement][0]), CORNER_MOVEMENTS[movement][1],
+                               itemgetter(*EDGE_MOVEMENTS[movement][0]), EDGE_MOVEMENTS[movement][1],
+                               itemgetter(*CENTRE_MOVEMENTS[movement]))
+                    for movement in RubikCube.ALL_MOVEMENTS}
+
+
+class CubieCube:
+	"""
+	The cube as its pieces: cp[i] is the corner on corner slot i and co[i] its orientation, ep[i] the edge on edge
+	slot i and eo[i] its orientation, and centres the colours of the centres (slice movements move them).
+	"""
+
+	def __init__(self, cp=None, co=None, ep=None, eo=None, centres=None):
+		"""
+		Creates a cube, solved unless given its pieces
+		"""
+		self.cp = list(cp) if cp is not None else list(range(8))
+		self.co = list(co) if co is not None else [0] * 8
+		self.ep = list(ep) if ep is not None else list(range(12))
+		self.eo = list(eo) if eo is not None else [0] * 12
+		self.centres = tuple(centres) if centres is not None else tuple(range(1, 7))
+
+	@staticmethod
+	def from_state(state):
+		"""
+		Reads the pieces of a flat state
+		:param state: Flat state of the cube (use only with numeric cube)
+		:return: CubieCube
+		"""
+		cp, co = corners(state)
+		ep, eo = edges(state)
+		return CubieCube(cp, co, ep, eo, [state[centre] for centre in RubikCube.CENTRES])
+
+	@staticmethod
+	def from_cube(cube):
+		return CubieCube.from_state(cube.state)
+
+	def to_state(self):
+		"""
+		Inverse of from_state()
+		:return: Flat state of the cube
+		"""
+		state = [0] * 54
+		for pieces, orientations, slots, homes in ((self.cp, self.co, RubikCube.CORNERS, CORNER_HOMES),
+		                                           (self.ep, self.eo, RubikCube.EDGES, EDGE_HOMES)):
+			for cells, piece, orientation in zip(slots, pieces, orientations):
+				n = len(cells)
+				for i, colour in enumerate(homes[piece]):
+					state[cells[(i + orientation) % n]] = colour
+		for centre, colour in zip(RubikCube.CENTRES, self.centres):
+			state[centre] = colour
+		return tuple(state)
+
+	def to_cube(self):
+		return RubikCube.from_state(self.to_state())
+
+	def copy(self):
+		return CubieCube(self.cp, self.co, self.ep, self.eo, self.centres)
+
+	def do_movement(self, movement):
+		"""
+		Performs the movement
+		:param movement: (String) Movement of RubikCube.ALL_MOVEMENTS
+		"""
+		corners_sources, corners_twists, edges_sources, edges_twists, centres_sources = _CUBIE_MOVEMENTS[movement]
+		self.cp = list(corners_sources(self.cp))
+		self.co = [(orientation + twist) % 3 for orientation, twist in zip(corners_sources(self.co), corners_twists)]
+		self.ep = list(edges_sources(self.ep))
+		self.eo = [(orientation + twist) % 2 for orientation, twist in zip(edges_sources(self.eo), edges_twists)]
+		self.centres = centres_sources(self.centres)
+
+	@property
+	def twist(self):
+		return get_twist(self.co)
+
+	@twist.setter
+	def twist(self, twist):
+		self.co = set_twist(twist)
+
+	@property
+	def flip(self):
+		return get_flip(self.eo)
+
+	@flip.setter
+	def flip(self, flip):
+		self.eo = set_flip(flip)
+
+	@property
+	def corners(self):
+		return get_corners(self.cp)
+
+	@corners.setter
+	def corners(self, corners):
+		self.cp = set_corners(corners)
+
+	@property
+	def edges(self):
+		return get_edges(self.ep)
+
+	@edges.setter
+	def edges(self, edges):
+		self.ep = set_edges(edges)
+
+	@property
+	def slice(self):
+		return get_slice(self.ep)
+
+	@slice.setter
+	def slice(self, slice_):
+		self.ep = set_slice(slice_)
+
+
+def permutation_parity(permutation):
+	"""
+	Returns the parity of a permutation of 0..n-1, or of any distinct sortable values
+	:return: 0 if even, 1 if odd
+	"""
+	order = sorted(permutation)
+	positions = {value: i for i, value in enumerate(order)}
+	seen = [False] * len(permutation)
+	parity = 0
+	for start in range(len(permutation)):
+		length = 0
+		i = start
+		while not seen[i]:
+			seen[i] = True
+			i = positions[permutation[i]]
+			length += 1
+		if length:
+			parity ^= (length - 1) & 1
+	return parity
+
+
+def check_state(state):
+	"""
+	Checks a flat state can be solved: centres of a real cube, every piece once with its own colours, corner twists
+	and edge flips adding up and permutation parities matching
+	:param state: Flat state of the cube (use only with numeric cube)
+	:raise ValueError: If the state can't be solved
+	"""
+	centres = tuple(state[centre] for centre in RubikCube.CENTRES)
+	if centres not in CENTRE_ORIENTATIONS:
+		raise ValueError('Impossible centres ' + str(centres))
+	pieces = []
+	for name, slots, colours in (('corner', RubikCube.CORNERS, CORNER_COLOURS), ('edge', RubikCube.EDGES, EDGE_COLOURS)):
+		permutation, orientation = [], []
+		for slot, cells in enumerate(slots):
+			piece = colours.get(tuple(state[cell] for cell in cells))
+			if piece is None:
+				raise ValueError('Impossible ' + name + ' colours on ' + name + ' slot ' + str(slot))
+			permutation.append(piece[0])
+			orientation.append(piece[1])
+		if len(set(permutation)) != len(slots):
+			raise ValueError('Repeated ' + name)
+		pieces.append((permutation, orientation))
+	(cp, co), (ep, eo) = pieces
+	if sum(co) % 3:
+		raise ValueError('Twisted corner')
+	if sum(eo) % 2:
+		raise ValueError('Flipped edge')
+	if permutation_parity(cp) ^ permutation_parity(ep) != permutation_parity(centres):
+		raise ValueError('Permutation parity mismatch, two pieces are swapped')
+
+
+def random_cubie_cube(rng=random):
+	"""
+	Samples a uniformly random solvable cube: random corners and edges permutations whose parities match the one of the
+	centres (only slice movements move them), random orientations whose sums are 0 and a random orientation of the
+	whole cube
+	:param rng: random.Random or the random module
+	:return: CubieCube
+	"""
+	centres = rng.choice(CENTRE_ORIENTATIONS)
+	cp = list(range(8))
+	rng.shuffle(cp)
+	ep = list(range(12))
+	rng.shuffle(ep)
+	if permutation_parity(cp) ^ permutation_parity(ep) != permutation_parity(centres):
+		ep[0], ep[1] = ep[1], ep[0]
+	co = [rng.randrange(3) for _ in range(7)]
+	eo = [rng.randrange(2) for _ in range(11)]
+	return CubieCube(cp, co + [-sum(co) % 3], ep, eo + [sum(eo) % 2], centres)
+
+
+def random_state(rng=random):
+	"""
+	Samples a uniformly random solvable state
+	:param rng: random.Random or the random module
+	:return: Flat state of the cube
+	"""
+	return random_cubie_cube(rng).to_state()
+
+
+def random_states(n, seed=None):
+	"""
+	Yields n uniformly random solvable states, always the same ones for the same seed
+	:param n: Number of states
+	:param seed: Seed of the states. None for different ones every time
+	"""
+	rng = random.Random(seed)
+	for _ in range(n):
+		yield random_state(rng)
+
+
+def move_table(size, coordinate, movements):
+	"""
+	Generates the move table of a coordinate: table[value * len(movements) + i] is the value after movements[i]
+	:param size: Number of values of the coordinate
+	:param coordinate: Name of a CubieCube coordinate property (I.E: twist) or (get, set) functions taking and
+					returning a CubieCube
+	:param movements: List of movement sequences (I.E: ['R', 'R'] for a half turn)
+	:return: array of unsigned ints
+	"""
+	if isinstance(coordinate, str):
+		name = coordinate
+		get_coordinate = lambda cube: getattr(cube, name)
+
+		def set_coordinate(value):
+			cube = CubieCube()
+			setattr(cube, name, value)
+			return cube
+	else:
+		get_coordinate, set_coordinate = coordinate
+	table = array('I' if size > 0xffff else 'H', bytes((4 if size > 0xffff else 2) * size * len(movements)))
+	for value in range(size):
+		cube = set_coordinate(value)
+		for i, sequence in enumerate(movements):
+			moved = cube.copy()
+			for movement in sequence:
+				moved.do_movement(movement)
+			table[value * len(movements) + i] = get_coordinate(moved)
+	return table
+
+
+_move_tables = {}
+
+
+def get_move_table(coordinate):
+	"""
+	Returns the move table of twist, flip, corners or slice for RubikCube.POSSIBLE_MOVEMENTS, generating it only once
+	per process. table[value * 18 + i] is the value after RubikCube.POSSIBLE_MOVEMENTS[i]
+	"""
+	if coordinate not in _move_tables:
+		sizes = {'twist': N_TWIST, 'flip': N_FLIP, 'corners': N_CORNERS, 'slice': N_SLICE}
+		_move_tables[coordinate] = move_table(sizes[coordinate], coordinate,
+		                                      [[movement] for movement in RubikCube.POSSIBLE_MOVEMENTS])
+	return _move_tables[coordinate]
@@ -1,9 +1,80 @@
 import copy
+import itertools
 import json
+import multiprocessing
+import os
 import random
+from array import array
+from heapq import heappop, heappush
+from operator import itemgetter, ne
 
 import time
 
+from .metrics import SearchMetrics, SearchStopped
+from .transposition import TranspositionTable
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+def _symmetries(permutations, rotations):
+	"""
+	Returns the 48 symmetries of the cube: the 24 whole cube rotations, with and without a mirror through the M slice
+	:param permutations: RubikCube.PERMUTATIONS
+	:param rotations: RubikCube.ROTATIONS
+	:return: List of (cells permutation, movements) where movements maps every movement done to the transformed cube
+	to the movement doing the same to the original one
+	"""
+	def then(first, second):
+		return tuple(first[i] for i in second)
+
+	identity = tuple(range(54))
+	generators = []
+	for rotation in rotations.values():
+		permutation = identity
+		for movement in rotation:
+			permutation = then(permutation, permutations[movement])
+		generators.append(permutation)
+	symmetries = [identity]
+	for symmetry in symmetries:
+		for generator in generators:
+			rotated = then(symmetry, generator)
+			if rotated not in symmetries:
+				symmetries.append(rotated)
+
+	# Mirror through the M slice: L and R swap places and every face is flipped left to right
+	mirror = [0] * 54
+	for face, mirrored_face in enumerate((0, 1, 4, 3, 2, 5)):
+		for row in range(0, 9, 3):
+			for column in range(3):
+				mirror[mirrored_face * 9 + row + 2 - column] = face * 9 + row + column
+	symmetries += [then(symmetry, tuple(mirror)) for symmetry in symmetries]
+
+	names = {permutation: movement for movement, permutation in permutations.items()}
+	result = []
+	for symmetry in symmetries:
+		movements = {}
+		for movement, permutation in permutations.items():
+			# Doing movement after the symmetry is the same as doing the mapped movement before it
+			mapped = [0] * 54
+			for i in range(54):
+				mapped[symmetry[i]] = symmetry[permutation[i]]
+			movements[movement] = names[tuple(mapped)]
+		result.append((symmetry, movements))
+	return result
+
+
+def _half_turns(permutations):
+	"""
+	Returns the half turn of every face and slice (IE: U2 for U), the permutation of doing its quarter turn twice
+	:param permutations: Permutations of the quarter turns
+	:return: Dict movement -> cells permutation
+	"""
+	return {movement + '2': tuple(permutation[i] for i in permutation)
+	        for movement, permutation in permutations.items() if len(movement) == 1}
+
 
 class RubikCube:
 	SOLVED = [[num for _ in range(9)] for num in range(1, 7)]
@@ -35,6 +106,148 @@ class RubikCube:
 
 	POSSIBLE_MOVEMENTS = ['U', 'D', 'R', 'L', 'F', 'B', 'U1', 'D1', 'R1', 'L1', 'F1', 'B1', 'M', 'E', 'S', 'M1', 'E1',
 	                      'S1']
+	HALF_TURNS = ['U2', 'D2', 'R2', 'L2', 'F2', 'B2', 'M2', 'E2', 'S2']
+	ALL_MOVEMENTS = POSSIBLE_MOVEMENTS + HALF_TURNS
+	# Movements counted as one step by every turn metric:
+	#	- 'qtm': Quarter turns of the faces
+	#	- 'htm': Quarter and half turns of the faces
+	#	- 'qstm': Quarter turns of the faces and the slices (POSSIBLE_MOVEMENTS)
+	#	- 'stm': Quarter and half turns of the faces and the slices (ALL_MOVEMENTS)
+	METRICS = {'qtm': POSSIBLE_MOVEMENTS[:12], 'htm': POSSIBLE_MOVEMENTS[:12] + HALF_TURNS[:6],
+	           'qstm': POSSIBLE_MOVEMENTS, 'stm': ALL_MOVEMENTS}
+
+	# Every movement as a permutation of the flat 54 cells state (cell i is cell i % 9 of face i // 9):
+	# after the movement, cell i holds what was on cell PERMUTATIONS[movement][i]
+	PERMUTATIONS = {
+		'U': ( 0,  1,  2,  3,  4,  5, 20, 19, 18,
+		      15, 12,  9, 16, 13, 10, 17, 14, 11,
+		      27, 28, 29, 21, 22, 23, 24, 25, 26,
+		      36, 37, 38, 30, 31, 32, 33, 34, 35,
+		       8,  7,  6, 39, 40, 41, 42, 43, 44,
+		      45, 46, 47, 48, 49, 50, 51, 52, 53),
+		'D': (44, 43, 42,  3,  4,  5,  6,  7,  8,
+		       9, 10, 11, 12, 13, 14, 15, 16, 17,
+		      18, 19, 20, 21, 22, 23,  2,  1,  0,
+		      27, 28, 29, 30, 31, 32, 24, 25, 26,
+		      36, 37, 38, 39, 40, 41, 33, 34, 35,
+		      51, 48, 45, 52, 49, 46, 53, 50, 47),
+		'R': ( 0,  1, 11,  3,  4, 14,  6,  7, 17,
+		       9, 10, 29, 12, 13, 32, 15, 16, 35,
+		      18, 19, 20, 21, 22, 23, 24, 25, 26,
+		      27, 28, 47, 30, 31, 50, 33, 34, 53,
+		      42, 39, 36, 43, 40, 37, 44, 41, 38,
+		      45, 46,  2, 48, 49,  5, 51, 52,  8),
+		'L': (45,  1,  2, 48,  4,  5, 51,  7,  8,
+		       0, 10, 11,  3, 13, 14,  6, 16, 17,
+		      24, 21, 18, 25, 22, 19, 26, 23, 20,
+		       9, 28, 29, 12, 31, 32, 15, 34, 35,
+		      36, 37, 38, 39, 40, 41, 42, 43, 44,
+		      27, 46, 47, 30, 49, 50, 33, 52, 53),
+		'F': ( 0,  1,  2,  3,  4,  5,  6,  7,  8,
+		       9, 10, 11, 12, 13, 14, 26, 23, 20,
+		      18, 19, 45, 21, 22, 46, 24, 25, 47,
+		      33, 30, 27, 34, 31, 28, 35, 32, 29,
+		      15, 37, 38, 16, 40, 41, 17, 43, 44,
+		      42, 39, 36, 48, 49, 50, 51, 52, 53),
+		'B': ( 6,  3,  0,  7,  4,  1,  8,  5,  2,
+		      38, 41, 44, 12, 13, 14, 15, 16, 17,
+		      11, 19, 20, 10, 22, 23,  9, 25, 26,
+		      27, 28, 29, 30, 31, 32, 33, 34, 35,
+		      36, 37, 53, 39, 40, 52, 42, 43, 51,
+		      45, 46, 47, 48, 49, 50, 18, 21, 24),
+		'U1': ( 0,  1,  2,  3,  4,  5, 38, 37, 36,
+		       11, 14, 17, 10, 13, 16,  9, 12, 15,
+		        8,  7,  6, 21, 22, 23, 24, 25, 26,
+		       18, 19, 20, 30, 31, 32, 33, 34, 35,
+		       27, 28, 29, 39, 40, 41, 42, 43, 44,
+		       45, 46, 47, 48, 49, 50, 51, 52, 53),
+		'D1': (26, 25, 24,  3,  4,  5,  6,  7,  8,
+		        9, 10, 11, 12, 13, 14, 15, 16, 17,
+		       18, 19, 20, 21, 22, 23, 33, 34, 35,
+		       27, 28, 29, 30, 31, 32, 42, 43, 44,
+		       36, 37, 38, 39, 40, 41,  2,  1,  0,
+		       47, 50, 53, 46, 49, 52, 45, 48, 51),
+		'R1': ( 0,  1, 47,  3,  4, 50,  6,  7, 53,
+		        9, 10,  2, 12, 13,  5, 15, 16,  8,
+		       18, 19, 20, 21, 22, 23, 24, 25, 26,
+		       27, 28, 11, 30, 31, 14, 33, 34, 17,
+		       38, 41, 44, 37, 40, 43, 36, 39, 42,
+		       45, 46, 29, 48, 49, 32, 51, 52, 35),
+		'L1': ( 9,  1,  2, 12,  4,  5, 15,  7,  8,
+		       27, 10, 11, 30, 13, 14, 33, 16, 17,
+		       20, 23, 26, 19, 22, 25, 18, 21, 24,
+		       45, 28, 29, 48, 31, 32, 51, 34, 35,
+		       36, 37, 38, 39, 40, 41, 42, 43, 44,
+		        0, 46, 47,  3, 49, 50,  6, 52, 53),
+		'F1': ( 0,  1,  2,  3,  4,  5,  6,  7,  8,
+		        9, 10, 11, 12, 13, 14, 36, 39, 42,
+		       18, 19, 17, 21, 22, 16, 24, 25, 15,
+		       29, 32, 35, 28, 31, 34, 27, 30, 33,
+		       47, 37, 38, 46, 40, 41, 45, 43, 44,
+		       20, 23, 26, 48, 49, 50, 51, 52, 53),
+		'B1': ( 2,  5,  8,  1,  4,  7,  0,  3,  6,
+		       24, 21, 18, 12, 13, 14, 15, 16, 17,
+		       51, 19, 20, 52, 22, 23, 53, 25, 26,
+		       27, 28, 29, 30, 31, 32, 33, 34, 35,
+		       36, 37,  9, 39, 40, 10, 42, 43, 11,
+		       45, 46, 47, 48, 49, 50, 44, 41, 38),
+		'M': ( 0, 46,  2,  3, 49,  5,  6, 52,  8,
+		       9,  1, 11, 12,  4, 14, 15,  7, 17,
+		      18, 19, 20, 21, 22, 23, 24, 25, 26,
+		      27, 10, 29, 30, 13, 32, 33, 16, 35,
+		      36, 37, 38, 39, 40, 41, 42, 43, 44,
+		      45, 28, 47, 48, 31, 50, 51, 34, 53),
+		'E': ( 0,  1,  2, 41, 40, 39,  6,  7,  8,
+		       9, 10, 11, 12, 13, 14, 15, 16, 17,
+		      18, 19, 20,  5,  4,  3, 24, 25, 26,
+		      27, 28, 29, 21, 22, 23, 33, 34, 35,
+		      36, 37, 38, 30, 31, 32, 42, 43, 44,
+		      45, 46, 47, 48, 49, 50, 51, 52, 53),
+		'S': ( 0,  1,  2,  3,  4,  5,  6,  7,  8,
+		       9, 10, 11, 25, 22, 19, 15, 16, 17,
+		      18, 48, 20, 21, 49, 23, 24, 50, 26,
+		      27, 28, 29, 30, 31, 32, 33, 34, 35,
+		      36, 12, 38, 39, 13, 41, 42, 14, 44,
+		      45, 46, 47, 43, 40, 37, 51, 52, 53),
+		'M1': ( 0, 10,  2,  3, 13,  5,  6, 16,  8,
+		        9, 28, 11, 12, 31, 14, 15, 34, 17,
+		       18, 19, 20, 21, 22, 23, 24, 25, 26,
+		       27, 46, 29, 30, 49, 32, 33, 52, 35,
+		       36, 37, 38, 39, 40, 41, 42, 43, 44,
+		       45,  1, 47, 48,  4, 50, 51,  7, 53),
+		'E1': ( 0,  1,  2, 23, 22, 21,  6,  7,  8,
+		        9, 10, 11, 12, 13, 14, 15, 16, 17,
+		       18, 19, 20, 30, 31, 32, 24, 25, 26,
+		       27, 28, 29, 39, 40, 41, 33, 34, 35,
+		       36, 37, 38,  5,  4,  3, 42, 43, 44,
+		       45, 46, 47, 48, 49, 50, 51, 52, 53),
+		'S1': ( 0,  1,  2,  3,  4,  5,  6,  7,  8,
+		        9, 10, 11, 37, 40, 43, 15, 16, 17,
+		       18, 14, 20, 21, 13, 23, 24, 12, 26,
+		       27, 28, 29, 30, 31, 32, 33, 34, 35,
+		       36, 50, 38, 39, 49, 41, 42, 48, 44,
+		       45, 46, 47, 19, 22, 25, 51, 52, 53),
+	}
+	PERMUTATIONS.update(_half_turns(PERMUTATIONS))
+	MOVEMENTS = {movement: itemgetter(*permutation) for movement, permutation in PERMUTATIONS.items()}
+
+	# Cells of every piece. Corners: URF, UFL, ULB, UBR, DFR, DLF, DBL, DRB and edges: UR, UF, UL, UB, DR, DF, DL, DB,
+	# FR, FL, BL, BR, each one starting by its U/D cell (F/B for the middle layer edges) and going clockwise
+	CORNERS = ((17, 36, 29), (15, 27, 20), (9, 18, 6), (11, 8, 38), (47, 35, 42), (45, 26, 33), (51, 0, 24), (53, 44, 2))
+	EDGES = ((14, 37), (16, 28), (12, 19), (10, 7), (50, 43), (46, 34), (48, 25), (52, 1), (32, 39), (30, 23), (3, 21),
+	         (5, 41))
+	CENTRES = (4, 13, 22, 31, 40, 49)
+	# Colour of the centre of the face of every cell
+	FACE_CENTRES = itemgetter(*[i // 9 * 9 + 4 for i in range(54)])
+
+	# Whole cube rotations as movements
+	ROTATIONS = {'x': ['R', 'L1', 'M1'], 'y': ['U', 'D1', 'E1'], 'z': ['F', 'B1', 'S']}
+	# Rotations and mirrors of the whole cube, which don't change the movements needed to solve it
+	SYMMETRIES = _symmetries(PERMUTATIONS, ROTATIONS)
+	SYMMETRY_GETTERS = [itemgetter(*symmetry) for symmetry, movements in SYMMETRIES]
+	# Cells of the 48 transformed states one after another, as an itemgetter and as a numpy index (faster)
+	SYMMETRY_CELLS = itemgetter(*[cell for symmetry, movements in SYMMETRIES for cell in symmetry])
+	SYMMETRY_INDEX = numpy.array([cell for symmetry, movements in SYMMETRIES for cell in symmetry]) if numpy else None
 
 	def __init__(self, cube=None):
 		"""
@@ -42,12 +255,25 @@ class RubikCube:
 		:param cube: List of 6 (cube's faces) lists with 9 elements each (cells per face).
 					None to generate a random one
 		"""
-		self.cube = cube or copy.deepcopy(RubikCube.SOLVED)
+		self.cube = cube or RubikCube.SOLVED
 		if not cube:
 			self.generate_random_cube()
-		self.initial_cube = copy.deepcopy(self.cube)
+		self.initial_cube = self.cube
 		self.movements_applied = []
-		self.__functions = {'D': self.D}
+
+	@property
+	def cube(self):
+		"""
+		Returns the cube as a list of 6 faces with 9 cells each, built from the flat state.
+		Changing the returned lists does not change the cube, assign it back instead.
+		:return: List of 6 lists with 9 elements each
+		"""
+		state = self.state
+		return [list(state[i:i + 9]) for i in range(0, 54, 9)]
+
+	@cube.setter
+	def cube(self, cube):
+		self.state = tuple(cell for face in cube for cell in face)
 
 	@property
 	def solved(self):
@@ -55,13 +281,21 @@ class RubikCube:
 		Returns if the cube has all faces solved
 		:return: True if the cube is solved, False if it isn't
 		"""
-		for face in self.cube:
-			color = face[0]
-			for cell in face:
-				if cell != color:
-					return False
+		state = self.state
+		for i in range(0, 54, 9):
+			face = state[i:i + 9]
+			if face.count(face[0]) != 9:
+				return False
 		return True
 
+	@property
+	def misplaced(self):
+		"""
+		Returns the number of cells which aren't of the colour of their face's centre, 0 for every solved cube
+		:return: (int) Misplaced cells
+		"""
+		return sum(map(ne, self.state, RubikCube.FACE_CENTRES(self.state)))
+
 	@property
 	def last_movement(self):
 		"""
@@ -81,28 +315,131 @@ class RubikCube:
 		"""
 		return json.dumps({'cube': self.cube})
 
+	@property
+	def key(self):
+		"""
+		Returns a compact hashable key of the cube's state, one byte per cell (use only with numeric cube).
+		Two cubes have the same key if and only if they have the same state.
+		:return: (bytes) 54 bytes key
+		"""
+		return bytes(self.state)
+
+	@property
+	def canonical_key(self):
+		"""
+		Returns the key of the cube's canonical state, the same for every rotation and mirror of the cube
+		:return: (bytes) 54 bytes key
+		"""
+		return RubikCube.canonical(self.state)[0]
+
+	@property
+	def hash64(self):
+		"""
+		Returns a 64 bit hash of the cube's state, the hash of its key, so it's only the same between processes with the
+		same PYTHONHASHSEED. Smaller than the key for transposition tables, but different states may have the same hash.
+		:return: (int) Hash
+		"""
+		return hash(bytes(self.state))
+
+	@staticmethod
+	def from_state(state):
+		"""
+		Creates a cube from a flat state
+		:param state: Flat state of 54 cells, face after face
+		:return: RubikCube
+		"""
+		return RubikCube(cube=[list(state[i:i + 9]) for i in range(0, 54, 9)])
+
+	@staticmethod
+	def solved_states():
+		"""
+		Returns every solved state of the cube. As slice movements move the centres there are 24 of them,
+		one for each orientation of the whole cube.
+		:return: List of flat states
+		"""
+		rotations = [[RubikCube.MOVEMENTS[movement] for movement in rotation] for rotation in RubikCube.ROTATIONS.values()]
+		solved = RubikCube(cube=RubikCube.SOLVED).state
+		states = [solved]
+		seen = {solved}
+		for state in states:
+			for rotation in rotations:
+				rotated = state
+				for m in rotation:
+					rotated = m(rotated)
+				if rotated not in seen:
+					seen.add(rotated)
+					states.append(rotated)
+		return states
+
+	@staticmethod
+	def canonical(state):
+		"""
+		Returns the canonical state of a state: its smallest key among its 48 symmetries
+		:param state: Flat state of the cube
+		:return: (key, symmetry) where RubikCube.SYMMETRY_GETTERS[symmetry] transforms state into the canonical state
+		"""
+		if numpy is not None:
+			transformed = numpy.frombuffer(bytes(state), dtype=numpy.uint8)[RubikCube.SYMMETRY_INDEX].tobytes()
+		else:
+			transformed = bytes(RubikCube.SYMMETRY_CELLS(state))
+		keys = [transformed[i:i + 54] for i in range(0, len(transformed), 54)]
+		key = min(keys)
+		return key, keys.index(key)
+
+	@staticmethod
+	def map_movements(movements, symmetry):
+		"""
+		Maps movements done to a cube transformed by a symmetry (IE: the solution of its canonical state) to the
+		movements doing the same to the original cube
+		:param movements: List of movements
+		:param symmetry: Index of RubikCube.SYMMETRIES
+		:return: List of movements
+		"""
+		mapping = RubikCube.SYMMETRIES[symmetry][1]
+		return [mapping[movement] for movement in movements]
+
 	@staticmethod
 	def get_opposite_movement(movement):
 		"""
-		Returns the opposite movement of a movement. I.E: Given movement U it returns U1
+		Returns the opposite movement of a movement. I.E: Given movement U it returns U1, given U2 it returns U2
 		:param movement: (String) Movement you want the opposite of
 		:return: (String) The opposite movement of the provided movement
 		"""
 		if len(movement) == 1:
 			return movement + "1"
+		elif movement[1] == "2":
+			return movement
 		else:
 			return movement[0]
 
+	@staticmethod
+	def count_movements(movements, metric='qstm'):
+		"""
+		Returns the length of a sequence of movements in a turn metric (see RubikCube.METRICS): a half turn is two
+		steps in the quarter turn metrics, and a slice movement is two steps in the face turn metrics
+		:param movements: List of movements
+		:param metric: 'qtm', 'htm', 'qstm' or 'stm'
+		:return: (int) Number of steps
+		"""
+		if metric not in RubikCube.METRICS:
+			raise ValueError('Invalid metric ' + metric)
+		length = 0
+		for movement in movements:
+			half = movement.endswith('2') and metric in ('qtm', 'qstm')
+			slice_movement = movement[0] in 'MES' and metric in ('qtm', 'htm')
+			length += (2 if half else 1) * (2 if slice_movement else 1)
+		return length
+
 	def do_movement(self, movement):
 		"""
 		Performs the movement and registers the movement into the movements_applied cube's history.
 		:param movement: (String) Movement to be done IE: U
 		"""
-		m = getattr(self, movement)
-		if not m or (m and not callable(m)):
+		m = RubikCube.MOVEMENTS.get(movement)
+		if not m:
 			raise KeyError('Invalid movement ' + movement)
 		self.movements_applied.append(movement)
-		m()
+		self.state = m(self.state)
 
 	def undo(self):
 		"""
@@ -110,335 +447,129 @@ class RubikCube:
 		"""
 		if self.movements_applied:
 			movement = self.movements_applied.pop()
-			opposite_movement = getattr(self, RubikCube.get_opposite_movement(movement))
-			opposite_movement()
+			opposite_movement = RubikCube.MOVEMENTS[RubikCube.get_opposite_movement(movement)]
+			self.state = opposite_movement(self.state)
 		else:
 			raise IndexError('No movements were made in the first place')
 
 	def R(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		e0, e1, e2, e3, e4, e5, e6, e7, e8 = face5
-
-		a2, a5, a8 = face1[2], face1[5], face1[8]
-		b2, b5, b8 = face2[2], face2[5], face2[8]
-		d2, d5, d8 = face4[2], face4[5], face4[8]
-		f2, f5, f8 = face6[2], face6[5], face6[8]
-
-		self.cube[0][2], self.cube[0][5], self.cube[0][8] = b2, b5, b8
-		self.cube[1][2], self.cube[1][5], self.cube[1][8] = d2, d5, d8
-		self.cube[3][2], self.cube[3][5], self.cube[3][8] = f2, f5, f8
-		self.cube[5][2], self.cube[5][5], self.cube[5][8] = a2, a5, a8
-
-		self.cube[4][0], self.cube[4][1], self.cube[4][2] = e6, e3, e0
-		self.cube[4][3], self.cube[4][4], self.cube[4][5] = e7, e4, e1
-		self.cube[4][6], self.cube[4][7], self.cube[4][8] = e8, e5, e2
+		self.state = RubikCube.MOVEMENTS['R'](self.state)
 
 	def R1(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		e0, e1, e2, e3, e4, e5, e6, e7, e8 = face5
-
-		a2, a5, a8 = face1[2], face1[5], face1[8]
-		b2, b5, b8 = face2[2], face2[5], face2[8]
-		d2, d5, d8 = face4[2], face4[5], face4[8]
-		f2, f5, f8 = face6[2], face6[5], face6[8]
-
-		self.cube[0][2], self.cube[0][5], self.cube[0][8] = f2, f5, f8
-		self.cube[1][2], self.cube[1][5], self.cube[1][8] = a2, a5, a8
-		self.cube[3][2], self.cube[3][5], self.cube[3][8] = b2, b5, b8
-		self.cube[5][2], self.cube[5][5], self.cube[5][8] = d2, d5, d8
-
-		self.cube[4][0], self.cube[4][1], self.cube[4][2] = e2, e5, e8
-		self.cube[4][3], self.cube[4][4], self.cube[4][5] = e1, e4, e7
-		self.cube[4][6], self.cube[4][7], self.cube[4][8] = e0, e3, e6
+		self.state = RubikCube.MOVEMENTS['R1'](self.state)
 
 	def L(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		c0, c1, c2, c3, c4, c5, c6, c7, c8 = face3
-
-		a0, a3, a6 = face1[0], face1[3], face1[6]
-		b0, b3, b6 = face2[0], face2[3], face2[6]
-		d0, d3, d6 = face4[0], face4[3], face4[6]
-		f0, f3, f6 = face6[0], face6[3], face6[6]
-
-		self.cube[0][0], self.cube[0][3], self.cube[0][6] = f0, f3, f6
-		self.cube[1][0], self.cube[1][3], self.cube[1][6] = a0, a3, a6
-		self.cube[3][0], self.cube[3][3], self.cube[3][6] = b0, b3, b6
-		self.cube[5][0], self.cube[5][3], self.cube[5][6] = d0, d3, d6
-
-		self.cube[2][0], self.cube[2][1], self.cube[2][2] = c6, c3, c0
-		self.cube[2][3], self.cube[2][4], self.cube[2][5] = c7, c4, c1
-		self.cube[2][6], self.cube[2][7], self.cube[2][8] = c8, c5, c2
+		self.state = RubikCube.MOVEMENTS['L'](self.state)
 
 	def L1(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		c0, c1, c2, c3, c4, c5, c6, c7, c8 = face3
-
-		a0, a3, a6 = face1[0], face1[3], face1[6]
-		b0, b3, b6 = face2[0], face2[3], face2[6]
-		d0, d3, d6 = face4[0], face4[3], face4[6]
-		f0, f3, f6 = face6[0], face6[3], face6[6]
-
-		self.cube[0][0], self.cube[0][3], self.cube[0][6] = b0, b3, b6
-		self.cube[1][0], self.cube[1][3], self.cube[1][6] = d0, d3, d6
-		self.cube[3][0], self.cube[3][3], self.cube[3][6] = f0, f3, f6
-		self.cube[5][0], self.cube[5][3], self.cube[5][6] = a0, a3, a6
-
-		self.cube[2][0], self.cube[2][1], self.cube[2][2] = c2, c5, c8
-		self.cube[2][3], self.cube[2][4], self.cube[2][5] = c1, c4, c7
-		self.cube[2][6], self.cube[2][7], self.cube[2][8] = c0, c3, c6
+		self.state = RubikCube.MOVEMENTS['L1'](self.state)
 
 	def U(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		b0, b1, b2, b3, b4, b5, b6, b7, b8 = face2
-
-		a6, a7, a8 = face1[6], face1[7], face1[8]
-		c0, c1, c2 = face3[0], face3[1], face3[2]
-		d0, d1, d2 = face4[0], face4[1], face4[2]
-		e0, e1, e2 = face5[0], face5[1], face5[2]
-
-		self.cube[0][6], self.cube[0][7], self.cube[0][8] = c2, c1, c0
-		self.cube[2][0], self.cube[2][1], self.cube[2][2] = d0, d1, d2
-		self.cube[3][0], self.cube[3][1], self.cube[3][2] = e0, e1, e2
-		self.cube[4][0], self.cube[4][1], self.cube[4][2] = a8, a7, a6
-
-		self.cube[1][0], self.cube[1][1], self.cube[1][2] = b6, b3, b0
-		self.cube[1][3], self.cube[1][4], self.cube[1][5] = b7, b4, b1
-		self.cube[1][6], self.cube[1][7], self.cube[1][8] = b8, b5, b2
+		self.state = RubikCube.MOVEMENTS['U'](self.state)
 
 	def U1(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		b0, b1, b2, b3, b4, b5, b6, b7, b8 = face2
-
-		a6, a7, a8 = face1[6], face1[7], face1[8]
-		c0, c1, c2 = face3[0], face3[1], face3[2]
-		d0, d1, d2 = face4[0], face4[1], face4[2]
-		e0, e1, e2 = face5[0], face5[1], face5[2]
-
-		self.cube[0][6], self.cube[0][7], self.cube[0][8] = e2, e1, e0
-		self.cube[2][0], self.cube[2][1], self.cube[2][2] = a8, a7, a6
-		self.cube[3][0], self.cube[3][1], self.cube[3][2] = c0, c1, c2
-		self.cube[4][0], self.cube[4][1], self.cube[4][2] = d0, d1, d2
-
-		self.cube[1][0], self.cube[1][1], self.cube[1][2] = b2, b5, b8
-		self.cube[1][3], self.cube[1][4], self.cube[1][5] = b1, b4, b7
-		self.cube[1][6], self.cube[1][7], self.cube[1][8] = b0, b3, b6
+		self.state = RubikCube.MOVEMENTS['U1'](self.state)
 
 	def D(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		f0, f1, f2, f3, f4, f5, f6, f7, f8 = face6
-
-		a0, a1, a2 = face1[0], face1[1], face1[2]
-		c6, c7, c8 = face3[6], face3[7], face3[8]
-		d6, d7, d8 = face4[6], face4[7], face4[8]
-		e6, e7, e8 = face5[6], face5[7], face5[8]
-
-		self.cube[0][0], self.cube[0][1], self.cube[0][2] = e8, e7, e6
-		self.cube[2][6], self.cube[2][7], self.cube[2][8] = a2, a1, a0
-		self.cube[3][6], self.cube[3][7], self.cube[3][8] = c6, c7, c8
-		self.cube[4][6], self.cube[4][7], self.cube[4][8] = d6, d7, d8
-
-		self.cube[5][0], self.cube[5][1], self.cube[5][2] = f6, f3, f0
-		self.cube[5][3], self.cube[5][4], self.cube[5][5] = f7, f4, f1
-		self.cube[5][6], self.cube[5][7], self.cube[5][8] = f8, f5, f2
+		self.state = RubikCube.MOVEMENTS['D'](self.state)
 
 	def D1(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		f0, f1, f2, f3, f4, f5, f6, f7, f8 = face6
-
-		a0, a1, a2 = face1[0], face1[1], face1[2]
-		c6, c7, c8 = face3[6], face3[7], face3[8]
-		d6, d7, d8 = face4[6], face4[7], face4[8]
-		e6, e7, e8 = face5[6], face5[7], face5[8]
-
-		self.cube[0][0], self.cube[0][1], self.cube[0][2] = c8, c7, c6
-		self.cube[2][6], self.cube[2][7], self.cube[2][8] = d6, d7, d8
-		self.cube[3][6], self.cube[3][7], self.cube[3][8] = e6, e7, e8
-		self.cube[4][6], self.cube[4][7], self.cube[4][8] = a2, a1, a0
-
-		self.cube[5][0], self.cube[5][1], self.cube[5][2] = f2, f5, f8
-		self.cube[5][3], self.cube[5][4], self.cube[5][5] = f1, f4, f7
-		self.cube[5][6], self.cube[5][7], self.cube[5][8] = f0, f3, f6
+		self.state = RubikCube.MOVEMENTS['D1'](self.state)
 
 	def F(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		d0, d1, d2, d3, d4, d5, d6, d7, d8 = face4
-
-		b6, b7, b8 = face2[6], face2[7], face2[8]
-		c2, c5, c8 = face3[2], face3[5], face3[8]
-		e0, e3, e6 = face5[0], face5[3], face5[6]
-		f0, f1, f2 = face6[0], face6[1], face6[2]
-
-		self.cube[1][6], self.cube[1][7], self.cube[1][8] = c8, c5, c2
-		self.cube[2][2], self.cube[2][5], self.cube[2][8] = f0, f1, f2
-		self.cube[4][0], self.cube[4][3], self.cube[4][6] = b6, b7, b8
-		self.cube[5][0], self.cube[5][1], self.cube[5][2] = e6, e3, e0
-
-		self.cube[3][0], self.cube[3][1], self.cube[3][2] = d6, d3, d0
-		self.cube[3][3], self.cube[3][4], self.cube[3][5] = d7, d4, d1
-		self.cube[3][6], self.cube[3][7], self.cube[3][8] = d8, d5, d2
+		self.state = RubikCube.MOVEMENTS['F'](self.state)
 
 	def F1(self):
-
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		d0, d1, d2, d3, d4, d5, d6, d7, d8 = face4
-
-		b6, b7, b8 = face2[6], face2[7], face2[8]
-		c2, c5, c8 = face3[2], face3[5], face3[8]
-		e0, e3, e6 = face5[0], face5[3], face5[6]
-		f0, f1, f2 = face6[0], face6[1], face6[2]
-
-		self.cube[1][6], self.cube[1][7], self.cube[1][8] = e0, e3, e6
-		self.cube[2][2], self.cube[2][5], self.cube[2][8] = b8, b7, b6
-		self.cube[4][0], self.cube[4][3], self.cube[4][6] = f2, f1, f0
-		self.cube[5][0], self.cube[5][1], self.cube[5][2] = c2, c5, c8
-
-		self.cube[3][0], self.cube[3][1], self.cube[3][2] = d2, d5, d8
-		self.cube[3][3], self.cube[3][4], self.cube[3][5] = d1, d4, d7
-		self.cube[3][6], self.cube[3][7], self.cube[3][8] = d0, d3, d6
+		self.state = RubikCube.MOVEMENTS['F1'](self.state)
 
 	def B(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-
-		b0, b1, b2 = face2[0], face2[1], face2[2]
-		c0, c3, c6 = face3[0], face3[3], face3[6]
-		e2, e5, e8 = face5[2], face5[5], face5[8]
-		f6, f7, f8 = face6[6], face6[7], face6[8]
-
-		a0, a1, a2, a3, a4, a5, a6, a7, a8 = face1
-
-		self.cube[1][0], self.cube[1][1], self.cube[1][2] = e2, e5, e8
-		self.cube[2][0], self.cube[2][3], self.cube[2][6] = b2, b1, b0
-		self.cube[4][2], self.cube[4][5], self.cube[4][8] = f8, f7, f6
-		self.cube[5][6], self.cube[5][7], self.cube[5][8] = c0, c3, c6
-
-		self.cube[0][0], self.cube[0][1], self.cube[0][2] = a6, a3, a0
-		self.cube[0][3], self.cube[0][4], self.cube[0][5] = a7, a4, a1
-		self.cube[0][6], self.cube[0][7], self.cube[0][8] = a8, a5, a2
+		self.state = RubikCube.MOVEMENTS['B'](self.state)
 
 	def B1(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		b0, b1, b2 = face2[0], face2[1], face2[2]
-		c0, c3, c6 = face3[0], face3[3], face3[6]
-		e2, e5, e8 = face5[2], face5[5], face5[8]
-		f6, f7, f8 = face6[6], face6[7], face6[8]
-
-		a0, a1, a2, a3, a4, a5, a6, a7, a8 = face1
-
-		self.cube[1][0], self.cube[1][1], self.cube[1][2] = c6, c3, c0
-		self.cube[2][0], self.cube[2][3], self.cube[2][6] = f6, f7, f8
-		self.cube[4][2], self.cube[4][5], self.cube[4][8] = b0, b1, b2
-		self.cube[5][6], self.cube[5][7], self.cube[5][8] = e8, e5, e2
-
-		self.cube[0][0], self.cube[0][1], self.cube[0][2] = a2, a5, a8
-		self.cube[0][3], self.cube[0][4], self.cube[0][5] = a1, a4, a7
-		self.cube[0][6], self.cube[0][7], self.cube[0][8] = a0, a3, a6
+		self.state = RubikCube.MOVEMENTS['B1'](self.state)
 
 	def M(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		a1, a4, a7 = face1[1], face1[4], face1[7]
-		b1, b4, b7 = face2[1], face2[4], face2[7]
-		d1, d4, d7 = face4[1], face4[4], face4[7]
-		f1, f4, f7 = face6[1], face6[4], face6[7]
-
-		self.cube[0][1], self.cube[0][4], self.cube[0][7] = f1, f4, f7
-		self.cube[1][1], self.cube[1][4], self.cube[1][7] = a1, a4, a7
-		self.cube[3][1], self.cube[3][4], self.cube[3][7] = b1, b4, b7
-		self.cube[5][1], self.cube[5][4], self.cube[5][7] = d1, d4, d7
+		self.state = RubikCube.MOVEMENTS['M'](self.state)
 
 	def M1(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		a1, a4, a7 = face1[1], face1[4], face1[7]
-		b1, b4, b7 = face2[1], face2[4], face2[7]
-		d1, d4, d7 = face4[1], face4[4], face4[7]
-		f1, f4, f7 = face6[1], face6[4], face6[7]
-
-		self.cube[0][1], self.cube[0][4], self.cube[0][7] = b1, b4, b7
-		self.cube[1][1], self.cube[1][4], self.cube[1][7] = d1, d4, d7
-		self.cube[3][1], self.cube[3][4], self.cube[3][7] = f1, f4, f7
-		self.cube[5][1], self.cube[5][4], self.cube[5][7] = a1, a4, a7
+		self.state = RubikCube.MOVEMENTS['M1'](self.state)
 
 	def E(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
+		self.state = RubikCube.MOVEMENTS['E'](self.state)
 
-		a3, a4, a5 = face1[3], face1[4], face1[5]
-		c3, c4, c5 = face3[3], face3[4], face3[5]
-		d3, d4, d5 = face4[3], face4[4], face4[5]
-		e3, e4, e5 = face5[3], face5[4], face5[5]
+	def E1(self):
+		self.state = RubikCube.MOVEMENTS['E1'](self.state)
 
-		self.cube[0][3], self.cube[0][4], self.cube[0][5] = e5, e4, e3
-		self.cube[2][3], self.cube[2][4], self.cube[2][5] = a5, a4, a3
-		self.cube[3][3], self.cube[3][4], self.cube[3][5] = c3, c4, c5
-		self.cube[4][3], self.cube[4][4], self.cube[4][5] = d3, d4, d5
+	def S(self):
+		self.state = RubikCube.MOVEMENTS['S'](self.state)
 
-	def E1(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
+	def S1(self):
+		self.state = RubikCube.MOVEMENTS['S1'](self.state)
 
-		a3, a4, a5 = face1[3], face1[4], face1[5]
-		c3, c4, c5 = face3[3], face3[4], face3[5]
-		d3, d4, d5 = face4[3], face4[4], face4[5]
-		e3, e4, e5 = face5[3], face5[4], face5[5]
+	def U2(self):
+		self.state = RubikCube.MOVEMENTS['U2'](self.state)
 
-		self.cube[0][3], self.cube[0][4], self.cube[0][5] = c5, c4, c3
-		self.cube[2][3], self.cube[2][4], self.cube[2][5] = d3, d4, d5
-		self.cube[3][3], self.cube[3][4], self.cube[3][5] = e3, e4, e5
-		self.cube[4][3], self.cube[4][4], self.cube[4][5] = a5, a4, a3
+	def D2(self):
+		self.state = RubikCube.MOVEMENTS['D2'](self.state)
 
-	def S(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		b3, b4, b5 = face2[3], face2[4], face2[5]
-		c1, c4, c7 = face3[1], face3[4], face3[7]
-		e1, e4, e7 = face5[1], face5[4], face5[7]
-		f3, f4, f5 = face6[3], face6[4], face6[5]
+	def R2(self):
+		self.state = RubikCube.MOVEMENTS['R2'](self.state)
 
-		self.cube[1][3], self.cube[1][4], self.cube[1][5] = c7, c4, c1
-		self.cube[2][1], self.cube[2][4], self.cube[2][7] = f3, f4, f5
-		self.cube[4][1], self.cube[4][4], self.cube[4][7] = b3, b4, b5
-		self.cube[5][3], self.cube[5][4], self.cube[5][5] = e7, e4, e1
+	def L2(self):
+		self.state = RubikCube.MOVEMENTS['L2'](self.state)
 
-	def S1(self):
-		face1, face2, face3, face4, face5, face6 = copy.deepcopy(self.cube)
-		b3, b4, b5 = face2[3], face2[4], face2[5]
-		c1, c4, c7 = face3[1], face3[4], face3[7]
-		e1, e4, e7 = face5[1], face5[4], face5[7]
-		f3, f4, f5 = face6[3], face6[4], face6[5]
+	def F2(self):
+		self.state = RubikCube.MOVEMENTS['F2'](self.state)
+
+	def B2(self):
+		self.state = RubikCube.MOVEMENTS['B2'](self.state)
 
-		self.cube[1][3], self.cube[1][4], self.cube[1][5] = e1, e4, e7
-		self.cube[2][1], self.cube[2][4], self.cube[2][7] = b5, b4, b3
-		self.cube[4][1], self.cube[4][4], self.cube[4][7] = f5, f4, f3
-		self.cube[5][3], self.cube[5][4], self.cube[5][5] = c1, c4, c7
+	def M2(self):
+		self.state = RubikCube.MOVEMENTS['M2'](self.state)
+
+	def E2(self):
+		self.state = RubikCube.MOVEMENTS['E2'](self.state)
+
+	def S2(self):
+		self.state = RubikCube.MOVEMENTS['S2'](self.state)
 
 	def check(self, debug=False):  # Use only with numeric cube
+		"""
+		Checks the cube can be solved: 9 cells of every colour, centres of a real cube, every piece once with its own
+		colours, corner twists and edge flips adding up and permutation parities matching
+		:param debug: True to display the cube if it can't be solved
+		:raise ValueError: If the cube can't be solved
+		"""
+		from .cubie import check_state
 		cells = {a: 0 for a in range(1, 7)}
-		for face in self.cube:
-			for cell in face:
-				cells[cell] += 1
-
-		for cell in cells:
-			if cells[cell] != 9:
-				if debug:
-					print(cells)
-					self.display()
-				raise Exception('Corrupted rubik cube')
+		for cell in self.state:
+			if cell not in cells:
+				raise ValueError('Corrupted rubik cube: invalid colour ' + str(cell))
+			cells[cell] += 1
+
+		try:
+			for cell in cells:
+				if cells[cell] != 9:
+					raise ValueError('Corrupted rubik cube: ' + str(cells[cell]) + ' cells of colour ' + str(cell))
+			check_state(self.state)
+		except ValueError:
+			if debug:
+				print(cells)
+				self.display()
+			raise
 
 	@staticmethod
 	def __get_random_cell(cell_list):
 		random.shuffle(cell_list)
 		return cell_list.pop()
 
-	def generate_random_cube(self):
-		self.cube = copy.deepcopy(RubikCube.SOLVED)
-		movements = random.randint(200, 500)
-		for _ in range(movements):
-			movement = random.choice(RubikCube.POSSIBLE_MOVEMENTS)
-			m = getattr(self, movement)
-			m()
+	def generate_random_cube(self, seed=None):
+		"""
+		Puts the cube in a uniformly random solvable state
+		:param seed: Seed of the random state. None to use the random module
+		"""
+		from .cubie import random_state
+		self.state = random_state(random.Random(seed) if seed is not None else random)
 
 	def display(self):
 		"""
@@ -472,182 +603,843 @@ class RubikCube:
 		print("     ", "\t", face6[6], face6[7], face6[8], "\t", "      ")
 
 
+_successors = {}
+
+
+def get_successors(metric='qstm'):
+	"""
+	Returns the movements worth trying after the last two movements of a search. A sequence of movements is only tried
+	if every window of up to 3 movements is the first one, in the order of the movements of the metric, of the
+	shortest sequences reaching the same cube up to a whole cube rotation (which doesn't change the movements needed).
+	That leaves out undoing the last movement, both orders of commuting movements (U D and D U), a movement three
+	times (U U U is U1), two half turns or a half and a quarter turn of the same face (U2 U is U1) and pairs of face
+	movements a slice movement does (R L1 is M1 and a rotation).
+	Solutions found with them still solve the cube, maybe leaving it rotated.
+	:param metric: Turn metric whose movements are searched, see RubikCube.METRICS
+	:return: Dict (previous movement, last movement) -> list of movements, None for movements not done yet
+	"""
+	if metric in _successors:
+		return _successors[metric]
+	if metric not in RubikCube.METRICS:
+		raise ValueError('Invalid metric ' + metric)
+	movements = RubikCube.METRICS[metric]
+	rotations = RubikCube.SYMMETRY_GETTERS[:24]
+	# Cubes are labelled cells, so the cube after a sequence is its permutation
+	cubes = {(): tuple(range(54))}
+	first = {}
+	canonical = set()
+	for length in range(4):
+		for sequence in itertools.product(range(len(movements)), repeat=length):
+			if length:
+				cubes[sequence] = RubikCube.MOVEMENTS[movements[sequence[-1]]](cubes[sequence[:-1]])
+			rotated = min(rotation(cubes[sequence]) for rotation in rotations)
+			if rotated not in first:
+				first[rotated] = sequence
+				canonical.add(sequence)
+	successors = {}
+	for previous in [None] + movements:
+		for last in [None] + movements:
+			if last is None and previous is not None:
+				continue
+			done = tuple(movements.index(movement) for movement in (previous, last) if movement is not None)
+			if done in canonical:
+				successors[previous, last] = [movement for i, movement in enumerate(movements)
+				                              if done + (i,) in canonical]
+	_successors[metric] = successors
+	return successors
+
+
+def branching_factor(depth=12, metric='qstm'):
+	"""
+	Returns the effective branching factor of searches using get_successors(): how many times more sequences of depth
+	movements are tried than of depth - 1
+	"""
+	successors = get_successors(metric)
+	counts = {(None, None): 1}
+	previous_total = 1
+	for _ in range(depth):
+		new_counts = {}
+		for (previous, last), count in counts.items():
+			for movement in successors[previous, last]:
+				new_counts[last, movement] = new_counts.get((last, movement), 0) + count
+		previous_total = sum(counts.values())
+		counts = new_counts
+	return sum(counts.values()) / previous_total
+
+
 class BacktrackingSolver:
 
-	def __init__(self, cube=None):
+	# Seconds between checks of the budget while waiting for the workers of a parallel search
+	POLL_INTERVAL = 0.1
+
+	def __init__(self, cube=None, max_states=None, max_bytes=None, replacement='depth', verify=True, symmetry=False,
+	             metric='qstm', progress=None, progress_interval=1.0, cache=None, endgame=None):
+		"""
+		:param cube: RubikCube to solve. None to solve a random one
+		:param max_states: Maximum number of states kept to cut off repeated branches. None for no limit
+		:param max_bytes: Approximate maximum memory of the states kept. None for no limit
+		:param replacement: 'depth' or 'lru', which states are replaced once there's no room for more
+		:param verify: True to keep whole states, False to keep only their 64 bit hashes (less memory, but a state
+		may be taken for another one with the same hash)
+		:param symmetry: True to keep states by their canonical state, so rotations and mirrors of a state are taken
+		as the same state
+		:param metric: Turn metric whose movements are searched, see RubikCube.METRICS
+		:param progress: Callable called with self.stats while searching, IE: metrics.print_progress. None for no
+		progress
+		:param progress_interval: Fewest seconds between calls to progress
+		:param cache: SolutionCache looked up before searching and updated after. None for no cache
+		:param endgame: EndgameTable of the metric finishing the solution of the states in it without searching. None
+		for no table
+		"""
+		if metric not in RubikCube.METRICS:
+			raise ValueError('Invalid metric ' + metric)
+		if endgame is not None and endgame.metric != metric:
+			raise ValueError('The endgame table is of the metric ' + endgame.metric)
 		self.cube = cube or RubikCube()
-		self.n_movements_done = 0
-		self.states = {}
+		self.metric = metric
+		self.metrics = SearchMetrics(progress, progress_interval)
+		self.cache = cache
+		self.endgame = endgame
+		self.states = TranspositionTable(max_states, max_bytes, replacement, verify)
+		self.symmetry = symmetry
+		# Movements applied to the cube before the search, which can't be pruned with the search's movements
+		self.search_start = None
 		self.solved_solutions = {}
 		self.smallest_solution = 40000
 		self.n_solutions = 0
+		# multiprocessing.Value with the smallest solution found by any process, in parallel searches, and its value
+		# read without taking its lock (see share_bound)
+		self.shared_bound = None
+		self.__shared_value = None
+		# Entries of the transposition table of every worker process of a parallel search
+		self.__worker_states = {}
 
 	@property
 	def shortest_solution(self):
 		if self.solved_solutions:
-			shortest_solution = self.solved_solutions[sorted(self.solved_solutions.keys())[0]]
-			return {'initial_cube': self.cube.initial_cube, 'solution': shortest_solution.pop()}
+			return {'initial_cube': self.cube.initial_cube, 'solution': list(self.best_solution)}
 		else:
 			raise IndexError('No solutions found yet')
 
-	def solve(self, movements_left=20, debug=False):
+	@property
+	def best_solution(self):
+		"""
+		Returns the first of the shortest solutions found, None if there's none yet
+		"""
+		if not self.solved_solutions:
+			return None
+		return self.solved_solutions[min(self.solved_solutions)][0]
+
+	@property
+	def n_movements_done(self):
+		return self.metrics.nodes
+
+	@property
+	def stats(self):
+		"""
+		Returns the counters of the search: nodes expanded, prunes by reason, time, solutions found and the size of
+		the transposition table
+		"""
+		stats = self.metrics.stats
+		stats['solutions'] = self.n_solutions
+		entries = len(self.states) + sum(self.__worker_states.values())
+		stats['tables'] = {'transposition': entries}
+		stats['transposition'] = self.states.stats
+		stats['transposition']['entries'] = entries
+		return stats
+
+	def share_bound(self, shared_bound):
+		"""
+		Shares the length of the smallest solution with the other processes of a parallel search
+		:param shared_bound: multiprocessing.Value('i') with a lock. It is read without the lock on every node, only
+		updating it takes the lock
+		"""
+		self.shared_bound = shared_bound
+		self.__shared_value = shared_bound.get_obj()
+
+	def solve(self, movements_left=20, debug=False, processes=1, split_depth=1, time_limit=None, max_nodes=None,
+	          cancel=None):
+		"""
+		Searches every solution of up to movements_left movements, leaving them in self.solved_solutions. If the
+		budget runs out first, the search stops keeping the solutions found so far (self.stats['stopped'] tells why)
+		:param movements_left: Longest solution to look for
+		:param debug: True to display every cube tried
+		:param processes: Worker processes sharing the search. None for one per CPU
+		:param split_depth: With more than one process, movements done here before handing every branch to a worker
+		:param time_limit: Seconds the search can last. None for no limit
+		:param max_nodes: Nodes the search can expand. None for no limit
+		:param cancel: Object whose is_set() returns True once the search has to stop, IE: a threading.Event set by
+		another thread. None for no cancellation
+		:return: The best solution found (see best_solution), None if there's none
+		:raise ValueError: If the cube can't be solved
+		"""
+		self.cube.check()
+		# Every search starts from the cube as it is now with an empty table: a stopped search leaves states in it
+		# whose branches were never finished, and would cut them off in the next one
+		self.search_start = len(self.cube.movements_applied)
+		self.states = TranspositionTable(self.states.capacity, policy=self.states.policy, verify=self.states.verify)
+		self.metrics.restart(time_limit, max_nodes, cancel)
+		processes = processes or os.cpu_count()
+		state = self.cube.state
+		applied = len(self.cube.movements_applied)
+		if self.cache is not None:
+			cached = self.cache.get(state, self.metric)
+			if cached is not None and len(cached[0]) <= movements_left:
+				# A known solution bounds the search, which is only needed if it may not be optimal
+				self.__add_solution(self.cube.movements_applied[:applied] + cached[0])
+				if cached[1]:
+					return self.best_solution
+		self.__search(movements_left, debug, processes, split_depth)
+		if self.cache is not None and self.best_solution is not None:
+			# Every shorter sequence was tried unless the search was stopped
+			self.cache.put(state, self.best_solution[applied:], self.metrics.stopped is None, self.metric)
+		return self.best_solution
+
+	def solve_branch(self, movements_left=20, debug=False, time_limit=None, max_nodes=None):
+		"""
+		Searches like solve() the branch below the cube, keeping search_start and the transposition table of the
+		previous branches: a worker process of a parallel search solves all its branches with the same solver, so they
+		cut off the states reached by each other
+		:return: The best solution found (see best_solution), None if there's none
+		"""
+		self.metrics.restart(time_limit, max_nodes)
+		self.__search(movements_left, debug, 1, 0)
+		return self.best_solution
+
+	def __search(self, movements_left, debug, processes, split_depth):
+		"""
+		Runs the search until it ends or its budget runs out, leaving the cube as it was
+		"""
+		applied = len(self.cube.movements_applied)
+		try:
+			if processes > 1:
+				self.__solve_parallel(movements_left, debug, processes, split_depth)
+			else:
+				self.__solve(movements_left, debug)
+		except SearchStopped:
+			while len(self.cube.movements_applied) > applied:
+				self.cube.undo()
+
+	def __solve(self, movements_left=20, debug=False):
 		if debug:
 			print(self.cube.movements_applied)
 			self.cube.display()
 			time.sleep(2)
 			self.cube.check()
 
+		# Other processes may have found shorter solutions
+		if self.__shared_value is not None and self.__shared_value.value < self.smallest_solution:
+			self.smallest_solution = self.__shared_value.value
+
 		# If there's a solution already with less movements than this try
 		# Cut off the branch
 		if len(self.cube.movements_applied) > self.smallest_solution:
+			self.metrics.prunes['bound'] += 1
 			return False
 
 		if self.cube.solved:  # If the cube is solved add it as a possible solution
-			self.n_solutions += 1
-			solution = copy.copy(self.cube.movements_applied)
-			print("=======  !!!SOLUTION with", len(solution), "movements!!! ========")
-			if len(solution) < self.smallest_solution:
-				self.smallest_solution = len(solution)
-			if len(solution) in self.solved_solutions:
-				self.solved_solutions[len(solution)].append(solution)
-			else:
-				self.solved_solutions[len(solution)] = [solution]
+			self.__add_solution()
 			return True
 
 		# If the cube has registered current state with more movements left than the current try
 		# Cut off the branch
+		if self.__repeated_state():
+			self.metrics.prunes['transposition'] += 1
+			return False
+
+		if self.endgame is not None:
+			# The table has the shortest solution of every state within its depth
+			allowed = min(movements_left, self.smallest_solution - len(self.cube.movements_applied))
+			finish = self.endgame.solution(self.cube.state)
+			if finish is not None and len(finish) <= allowed:
+				self.__add_solution(self.cube.movements_applied + finish)
+				return True
+			if finish is not None or allowed <= self.endgame.depth:
+				self.metrics.prunes['bound'] += 1
+				return False
+
+		if not movements_left:
+			self.metrics.prunes['depth'] += 1
+			return False
+
+		if self.metrics.expand():
+			self.metrics.progress(self.stats)
+		movements = self.generate_movements(*self.__last_movements())
+		for movement in movements:
+			self.cube.do_movement(movement)
+			self.__solve(movements_left=movements_left - 1, debug=debug)
+			self.cube.undo()
+		return False
+
+	def __add_solution(self, solution=None):
+		"""
+		Keeps a solution, the movements applied to the cube if None
+		"""
+		self.n_solutions += 1
+		if solution is None:
+			solution = copy.copy(self.cube.movements_applied)
+		if len(solution) < self.smallest_solution:
+			self.smallest_solution = len(solution)
+			if self.shared_bound is not None:
+				with self.shared_bound.get_lock():
+					if len(solution) < self.shared_bound.value:
+						self.shared_bound.value = len(solution)
+		if len(solution) in self.solved_solutions:
+			self.solved_solutions[len(solution)].append(solution)
+		else:
+			self.solved_solutions[len(solution)] = [solution]
+
+	def __repeated_state(self):
+		"""
+		Registers the current state, returning True if it was reached before with as many movements or less
+		"""
 		if self.cube.movements_applied:
-			position_of_past_state = self.states.get(self.cube.json, None)
+			key = self.cube.canonical_key if self.symmetry else self.cube.key
+			position_of_past_state = self.states.get(key, None)
 			if position_of_past_state:
 				if len(self.cube.movements_applied) >= position_of_past_state:
-					return False
-			self.states[self.cube.json] = len(self.cube.movements_applied)
-
-		if movements_left:
-			movements = self.generate_movements(self.cube.last_movement)
-			for movement in movements:
-				self.cube.do_movement(movement)
-				print("Trying movement", movement, ",", movements_left, "movements left (", self.n_solutions,"solutions found)")
-				self.solve(movements_left=movements_left - 1, debug=debug)
-				self.cube.undo()
+					return True
+			self.states[key] = len(self.cube.movements_applied)
 		return False
 
-	def generate_movements(self, last_movement=None):
-		all_movements = ['U', 'D', 'R', 'L', 'F', 'B', 'U1', 'D1', 'R1', 'L1', 'F1', 'B1', 'M', 'E', 'S', 'M1', 'E1',
-		                 'S1']
-		if not last_movement:
-			return all_movements
-		all_movements.remove(RubikCube.get_opposite_movement(last_movement))
-		return all_movements
+	def __solve_parallel(self, movements_left, debug, processes, split_depth):
+		"""
+		Does the first split_depth movements here and solves every branch below them in a pool of processes, which
+		share the length of the smallest solution to cut off their branches. Every worker keeps one solver, with its
+		own transposition table of the capacity of this one, for all the branches it solves.
+		"""
+		tasks = []
+		self.__split(movements_left, split_depth, debug, tasks)
+		bound = multiprocessing.Value('i', self.smallest_solution)
+		self.__worker_states = {}
+		endgame_path = None if self.endgame is None else self.endgame.path
+		settings = (self.states.capacity, self.states.policy, self.states.verify, self.symmetry, self.metric,
+		            endgame_path)
+		try:
+			with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(bound, settings)) as pool:
+				results = pool.imap_unordered(_solve_branch, tasks)
+				while True:
+					try:
+						worker, solved_solutions, n_solutions, stats = results.next(
+							timeout=BacktrackingSolver.POLL_INTERVAL)
+					except multiprocessing.TimeoutError:
+						# Leaving the pool terminates the workers if the budget ran out
+						self.metrics.check()
+						continue
+					except StopIteration:
+						break
+					for length, solutions in solved_solutions.items():
+						self.solved_solutions.setdefault(length, []).extend(solutions)
+					self.n_solutions += n_solutions
+					self.states.hits += stats['transposition']['hits']
+					self.states.misses += stats['transposition']['misses']
+					self.states.evictions += stats['transposition']['evictions']
+					self.__worker_states[worker] = stats['transposition']['entries']
+					if self.metrics.merge(stats):
+						self.metrics.progress(self.stats)
+		finally:
+			self.smallest_solution = min(self.smallest_solution, bound.value)
+
+	def __split(self, movements_left, split_depth, debug, tasks):
+		"""
+		Walks the first split_depth movements of the search, adding a task for every branch below them
+		"""
+		if not split_depth or not movements_left:
+			# Every worker gets the budget left, the whole search is stopped here once it runs out
+			metrics = self.metrics
+			time_limit = None if metrics.deadline is None else max(metrics.deadline - time.perf_counter(), 0)
+			max_nodes = None if metrics.max_nodes is None else metrics.max_nodes - metrics.nodes
+			tasks.append((self.cube.state, list(self.cube.movements_applied), self.search_start, movements_left,
+			              time_limit, max_nodes, debug))
+			return
+		if self.cube.solved:
+			self.__add_solution()
+			return
+		if self.__repeated_state():
+			return
+		for movement in self.generate_movements(*self.__last_movements()):
+			self.cube.do_movement(movement)
+			self.__split(movements_left - 1, split_depth - 1, debug, tasks)
+			self.cube.undo()
+
+	def __last_movements(self):
+		"""
+		Returns the last two movements done by the search, None if there aren't so many
+		"""
+		applied = self.cube.movements_applied
+		done = len(applied) - self.search_start
+		return applied[-1] if done > 0 else None, applied[-2] if done > 1 else None
+
+	def generate_movements(self, last_movement=None, previous_movement=None):
+		"""
+		Returns the movements to try after the last two, see get_successors()
+		"""
+		return get_successors(self.metric)[previous_movement, last_movement]
+
+
+# Solver of the worker process, kept for every branch it solves so they share its transposition table
+_worker_solver = None
+
+
+def _init_worker(shared_bound, settings):
+	"""
+	Creates the solver of a worker process of a parallel BacktrackingSolver.solve()
+	:param shared_bound: multiprocessing.Value with the smallest solution found by any process
+	:param settings: (capacity, replacement policy, verify, symmetry, metric, endgame table path or None)
+	"""
+	global _worker_solver
+	capacity, policy, verify, symmetry, metric, endgame_path = settings
+	from .endgame import EndgameTable
+	# The table stays mapped until the worker exits
+	endgame = None if endgame_path is None else EndgameTable(endgame_path)
+	_worker_solver = BacktrackingSolver(cube=RubikCube(cube=RubikCube.SOLVED), max_states=capacity,
+	                                    replacement=policy, verify=verify, symmetry=symmetry, metric=metric,
+	                                    endgame=endgame)
+	_worker_solver.share_bound(shared_bound)
+
+
+def _solve_branch(task):
+	"""
+	Solves a branch of a parallel BacktrackingSolver.solve() in a worker process
+	:return: (worker pid, solved_solutions, n_solutions, stats), with the transposition counters of this branch only
+	"""
+	state, movements_applied, search_start, movements_left, time_limit, max_nodes, debug = task
+	solver = _worker_solver
+	cube = RubikCube.from_state(state)
+	cube.movements_applied = movements_applied
+	solver.cube = cube
+	solver.search_start = search_start
+	solver.solved_solutions = {}
+	solver.n_solutions = 0
+	table = solver.states
+	before = table.hits, table.misses, table.evictions
+	solver.solve_branch(movements_left=movements_left, debug=debug, time_limit=time_limit, max_nodes=max_nodes)
+	stats = solver.stats
+	stats['transposition'].update(hits=table.hits - before[0], misses=table.misses - before[1],
+	                              evictions=table.evictions - before[2])
+	return os.getpid(), solver.solved_solutions, solver.n_solutions, stats
+
 
 class HeuristicSolver:
+	"""
+	Greedy best first search: expands first the cubes with more cells of the colour of their face.
+	The frontier is a heap of packed ints (see __push) and every expanded cube is stored once, as its flat state and a
+	pointer to its parent, so cubes are expanded without replaying their movements and paths are only rebuilt for
+	solutions. The children of every expanded cube are scored together and queued with their own heuristic.
+	"""
 
 	LIMIT = 20
+	# Bits of the packed frontier entries: priority | tie break | parent node | movement
+	MOVEMENT_BITS = 5
+	PARENT_BITS = 35
+	TIE_BREAK_BITS = 24
 
-	def __init__(self, cube=None):
+	def __init__(self, cube=None, randomize=True, verify=True, symmetry=False, metric='qstm', progress=None,
+	             progress_interval=1.0, cache=None, endgame=None):
+		"""
+		:param cube: RubikCube to solve. None to solve a random one
+		:param randomize: True to break ties between cubes with the same heuristic randomly, False to expand them in
+		the order they were found
+		:param verify: True to keep whole past states, False to keep only their 64 bit hashes (less memory, but a state
+		may be taken for another one with the same hash)
+		:param symmetry: True to keep past states by their canonical state, so rotations and mirrors of a state are
+		taken as the same state
+		:param metric: Turn metric whose movements are searched, see RubikCube.METRICS
+		:param progress: Callable called with self.stats while searching, IE: metrics.print_progress. None for no
+		progress
+		:param progress_interval: Fewest seconds between calls to progress
+		:param cache: SolutionCache looked up before searching and updated after. None for no cache
+		:param endgame: EndgameTable of the metric finishing the solution of the states in it without searching. None
+		for no table
+		"""
+		if metric not in RubikCube.METRICS:
+			raise ValueError('Invalid metric ' + metric)
+		if endgame is not None and endgame.metric != metric:
+			raise ValueError('The endgame table is of the metric ' + endgame.metric)
 		self.cube = cube or RubikCube()
-		self.n_movements_done = 0
+		self.metric = metric
+		self.cache = cache
+		self.endgame = endgame
+		self.randomize = randomize
+		self.verify = verify
+		self.symmetry = symmetry
+		self.metrics = SearchMetrics(progress, progress_interval)
 		self.solutions = {}
-		self.past_states = set()
-		self.possible_solutions = {} #Heuristic -> [movements]
+		self.__reset()
 		self.smallest_solution = 40000
 		self.n_solutions = 0
-		self.randomizer_probability = 1
-
-	def get_heuristic(self, cube):
-		heuristic = 0
-		for i, face in enumerate(cube):
-			for j, cell in enumerate(face):
-				if j != 4 and cell == i+1:
-					heuristic += 1
-		return heuristic
+		self.__names = RubikCube.METRICS[metric]
+		self.__movements = [RubikCube.MOVEMENTS[movement] for movement in self.__names]
+		from .cube_array import CubeArray, MOVEMENT_INDEXES, numpy
+		# Children are scored with numpy if it's installed
+		self.__cube_array = CubeArray if numpy is not None else None
+		if numpy is not None:
+			self.__children = numpy.array([MOVEMENT_INDEXES[movement] for movement in self.__names], dtype=numpy.intp)
+		# get_successors() with indexes of the metric's movements
+		index = {movement: i for i, movement in enumerate(self.__names)}
+		index[None] = None
+		self.__successors = {(index[previous], index[last]): [index[movement] for movement in movements]
+		                     for (previous, last), movements in get_successors(metric).items()}
+
+	# Heuristic of the solved cubes, every cell but the centres
+	SOLVED_HEURISTIC = 48
 
-	def __randomizer(self):
-		if random.randint(0, 100) < self.randomizer_probability:
-			return 0
-		else:
-			return -1
+	@property
+	def n_movements_done(self):
+		return self.metrics.nodes
 
-	def solve(self):
-		if self.cube.solved:
-			print("Cube was already solved!!")
-			self.solutions[0] = []
-			return
-		print("Generating first movement's heuristics")
-		#Init first heuristics
-		for movement in self.generate_movements():
-			self.cube.do_movement(movement)
-			heuristic = self.get_heuristic(self.cube.cube)
-			if heuristic in self.possible_solutions:
-				self.possible_solutions[heuristic].append([movement])
-			else:
-				self.possible_solutions[heuristic] = [[movement]]
-			self.cube.undo()
+	@property
+	def stats(self):
+		"""
+		Returns the counters of the search: nodes expanded, prunes by reason, time, solutions found and the sizes of
+		the past states, the frontier and the nodes kept
+		"""
+		stats = self.metrics.stats
+		stats['solutions'] = self.n_solutions
+		stats['tables'] = {'past_states': len(self.past_states), 'frontier': len(self.frontier),
+		                   'nodes': len(self.depths)}
+		return stats
 
-		print("Starting...")
+	@property
+	def best_solution(self):
+		"""
+		Returns the first of the shortest solutions found, None if there's none yet
+		"""
+		if not self.solutions:
+			return None
+		return self.solutions[min(self.solutions)][0]
 
-		while self.possible_solutions:
+	def get_heuristic(self, state):
+		"""
+		Returns the cells, not counting centres, of the colour of their face's centre
+		"""
+		return HeuristicSolver.SOLVED_HEURISTIC - sum(map(ne, state, RubikCube.FACE_CENTRES(state)))
 
-			greater_heuristic = sorted(self.possible_solutions.keys())[self.__randomizer()]
-			random.shuffle(self.possible_solutions[greater_heuristic])
-			possible_solution = self.possible_solutions[greater_heuristic].pop()
-			print("Solutions:", self.n_solutions, "\tScore:", greater_heuristic, "\tPossible solution:", possible_solution)
+	def get_children_heuristics(self, state):
+		"""
+		Scores every cube one movement away of state at once, vectorised with numpy if it's installed
+		:param state: Flat state of the cube (or its key)
+		:return: List of the heuristic after every movement of the metric
+		"""
+		if self.__cube_array is not None:
+			return self.__cube_array(bytes(state)).children(self.__children).heuristic.tolist()
+		return [self.get_heuristic(movement(state)) for movement in self.__movements]
 
-			#If no more solutions with that heuristic score delete key
-			if not self.possible_solutions[greater_heuristic]:
-				del self.possible_solutions[greater_heuristic]
+	def __reset(self):
+		"""
+		Empties the frontier, the past states and the nodes
+		"""
+		self.past_states = set()
+		self.frontier = []
+		# Expanded nodes: flat states (54 bytes each), parent nodes, movements (indexes of the metric's movements) from
+		# the parent and depths
+		self.states = bytearray()
+		self.parents = array('q')
+		self.movements = bytearray()
+		self.depths = bytearray()
+
+	def __add_node(self, key, parent, movement, depth):
+		self.states += key
+		self.parents.append(parent)
+		self.movements.append(movement)
+		self.depths.append(depth)
+		return len(self.depths) - 1
+
+	def __push(self, heuristic, node, movement):
+		"""
+		Adds to the frontier the cube reached doing movement on node, packed in an int so the heap pops the greater
+		heuristic first
+		"""
+		tie_break = random.getrandbits(HeuristicSolver.TIE_BREAK_BITS) if self.randomize else 0
+		entry = ((HeuristicSolver.SOLVED_HEURISTIC - heuristic) << HeuristicSolver.TIE_BREAK_BITS) | tie_break
+		entry = (entry << HeuristicSolver.PARENT_BITS) | node
+		heappush(self.frontier, (entry << HeuristicSolver.MOVEMENT_BITS) | movement)
 
-			#If possible solution is longer than smallest solution found, cut off branch
-			if len(possible_solution) >= self.smallest_solution:
-				continue
+	def __past_state(self, key):
+		if self.symmetry:
+			key = RubikCube.canonical(key)[0]
+		return key if self.verify else hash(key)
 
+	def get_path(self, node):
+		"""
+		Returns the movements from the initial cube to an expanded node
+		"""
+		path = []
+		while node:
+			path.append(self.__names[self.movements[node]])
+			node = self.parents[node]
+		path.reverse()
+		return path
+
+	def solve(self, time_limit=None, max_nodes=None, cancel=None):
+		"""
+		Searches solutions of up to LIMIT movements, leaving them in self.solutions. If the budget runs out first, the
+		search stops keeping the solutions found so far (self.stats['stopped'] tells why)
+		:param time_limit: Seconds the search can last. None for no limit
+		:param max_nodes: Nodes the search can expand. None for no limit
+		:param cancel: Object whose is_set() returns True once the search has to stop, IE: a threading.Event set by
+		another thread. None for no cancellation
+		:return: The best solution found (see best_solution), None if there's none
+		:raise ValueError: If the cube can't be solved
+		"""
+		self.cube.check()
+		self.metrics.restart(time_limit, max_nodes, cancel)
+		# The nodes of a previous search start from its own root, only the solutions it found are kept
+		self.__reset()
+		if self.cube.solved:
+			self.__add_solution([])
+			return self.best_solution
+		if self.cache is not None:
+			cached = self.cache.get(self.cube.state, self.metric)
+			if cached is not None:
+				# Only shorter solutions than a known one are searched
+				solution, optimal = cached
+				self.__add_solution(solution)
+				if optimal:
+					return self.best_solution
+		try:
+			self.__search()
+		except SearchStopped:
+			pass
+		if self.cache is not None and self.best_solution is not None:
+			self.cache.put(self.cube.state, self.best_solution, False, self.metric)
+		return self.best_solution
+
+	def __add_solution(self, solution):
+		self.n_solutions += 1
+		if len(solution) < self.smallest_solution:
+			self.smallest_solution = len(solution)
+		self.solutions.setdefault(len(solution), []).append(solution)
+
+	def __search(self):
+		key = self.cube.key
+		if self.endgame is not None:
+			finish = self.endgame.solution(key)
+			if finish is not None:
+				self.__add_solution(finish)
+				return
+		self.past_states.add(self.__past_state(key))
+		root = self.__add_node(key, -1, 0, 0)
+		heuristics = self.get_children_heuristics(key)
+		for movement in self.__successors[None, None]:
+			self.__push(heuristics[movement], root, movement)
+
+		movement_mask = (1 << HeuristicSolver.MOVEMENT_BITS) - 1
+		parent_mask = (1 << HeuristicSolver.PARENT_BITS) - 1
+		priority_shift = HeuristicSolver.MOVEMENT_BITS + HeuristicSolver.PARENT_BITS + HeuristicSolver.TIE_BREAK_BITS
+		while self.frontier:
+			# Long runs of entries cut off without expanding anything have to stop on time too
+			self.metrics.poll()
+			entry = heappop(self.frontier)
+			movement = entry & movement_mask
+			parent = (entry >> HeuristicSolver.MOVEMENT_BITS) & parent_mask
+			# The heuristic of every cube is scored once, while expanding its parent, and travels in its entry
+			heuristic = HeuristicSolver.SOLVED_HEURISTIC - (entry >> priority_shift)
+			depth = self.depths[parent] + 1
 
+			#If possible solution is longer than smallest solution found, cut off branch
+			if depth >= self.smallest_solution:
+				self.metrics.prunes['bound'] += 1
+				continue
 
-			#Performs movements of possible solution to the cube
-			for movement in possible_solution:
-				self.cube.do_movement(movement)
+			start = parent * 54
+			state = self.__movements[movement](self.states[start:start + 54])
 
 			# If current state has been already reached before, cut off branch
-			if self.cube.json in self.past_states:
+			key = bytes(state)
+			past_state = self.__past_state(key)
+			if past_state in self.past_states:
+				self.metrics.prunes['transposition'] += 1
 				continue
+			self.past_states.add(past_state)
+			if self.metrics.expand():
+				self.metrics.progress(self.stats)
 
 			#Check if cube is solved
-			if self.cube.solved:
-				print("Found solution in", len(possible_solution), "movements!!")
-				self.n_solutions += 1
-				if len(possible_solution) < self.smallest_solution:
-					self.smallest_solution = len(possible_solution)
-
-				if not self.solutions.get(len(possible_solution), False):
-					self.solutions[len(possible_solution)] = [copy.deepcopy(possible_solution)]
-				else:
-					self.solutions[len(possible_solution)].append(copy.deepcopy(possible_solution))
+			if heuristic == HeuristicSolver.SOLVED_HEURISTIC:
+				self.__add_solution(self.get_path(parent) + [self.__names[movement]])
+
+			# The endgame table has the shortest solution of every state within its depth
+			elif self.endgame is not None:
+				finish = self.endgame.solution(key)
+				if finish is not None and depth + len(finish) < self.smallest_solution:
+					self.__add_solution(self.get_path(parent) + [self.__names[movement]] + finish)
+					continue
+				# Out of the table, the cube is farther from solved than its depth
+				if finish is not None or depth + self.endgame.depth + 1 >= self.smallest_solution:
+					self.metrics.prunes['bound'] += 1
+					continue
 
 			# If ongoing possible solutions are longer than the smallest solution, cut off branch
-			if len(possible_solution) + 1 > self.smallest_solution or len(possible_solution) > HeuristicSolver.LIMIT:
+			if depth + 1 > self.smallest_solution:
+				self.metrics.prunes['bound'] += 1
+				continue
+			if depth > self.LIMIT:
+				self.metrics.prunes['depth'] += 1
 				continue
 
-			current_heuristic = self.get_heuristic(self.cube.cube)
-
-			if not self.possible_solutions.get(current_heuristic, False):
-				self.possible_solutions[current_heuristic] = []
-
-			for new_movement in self.generate_movements(possible_solution[-1]):
-				new_solutions = copy.copy(possible_solution)
-				new_solutions.append(new_movement)
-				self.possible_solutions[current_heuristic].append(new_solutions)
+			node = self.__add_node(key, parent, movement, depth)
+			heuristics = self.get_children_heuristics(key)
+			previous = self.movements[parent] if parent != root else None
+			for new_movement in self.__successors[previous, movement]:
+				self.__push(heuristics[new_movement], node, new_movement)
 
-			for _ in possible_solution:
-				self.cube.undo()
+	def generate_movements(self, last_movement=None, previous_movement=None):
+		"""
+		Returns the movements to try after the last two in random order, see get_successors()
+		"""
+		movements = list(get_successors(self.metric)[previous_movement, last_movement])
+		random.shuffle(movements)
+		return movements
+
+class IDASolver:
+	"""
+	Iterative deepening A* solver. Every iteration is a depth first search cut off when the movements done plus the
+	heuristic exceed the bound, which grows to the smallest exceeding value of the previous iteration. As the heuristic
+	never overestimates, the first solution found is optimal, and memory only grows with the depth.
+	"""
+
+	def __init__(self, cube=None, pattern_databases=(), metric='qstm', progress=None, progress_interval=1.0,
+	             cache=None):
+		"""
+		:param cube: RubikCube to solve. None to solve a random one
+		:param pattern_databases: PatternDatabases whose distances are also used as lower bounds
+		:param metric: Turn metric whose movements are searched and counted, see RubikCube.METRICS
+		:param progress: Callable called with self.stats while searching, IE: metrics.print_progress. None for no
+		progress
+		:param progress_interval: Fewest seconds between calls to progress
+		:param cache: SolutionCache looked up before searching and updated after. None for no cache
+		"""
+		if metric not in RubikCube.METRICS:
+			raise ValueError('Invalid metric ' + metric)
+		self.cube = cube or RubikCube()
+		self.metric = metric
+		self.cache = cache
+		# Pattern databases count quarter turns, a half turn is two of them
+		self.__half_turns = metric in ('htm', 'stm')
+		self.pattern_databases = list(pattern_databases)
+		self.metrics = SearchMetrics(progress, progress_interval)
+		self.bound = None
+		self.solution = None
+		self.__corners = itemgetter(*[cell for corner in RubikCube.CORNERS for cell in corner])
+		self.__edges = itemgetter(*[cell for edge in RubikCube.EDGES for cell in edge])
+		self.__centres = itemgetter(*RubikCube.CENTRES)
+		self.__goals = [self.__pieces(state) for state in RubikCube.solved_states()]
 
+	@property
+	def shortest_solution(self):
+		if self.solution is not None:
+			return {'initial_cube': self.cube.initial_cube, 'solution': self.solution}
+		else:
+			raise IndexError('No solutions found yet')
 
+	@property
+	def n_movements_done(self):
+		return self.metrics.nodes
 
+	@property
+	def stats(self):
+		"""
+		Returns the counters of the search: nodes expanded, prunes by reason, time and the bound of the iteration
+		"""
+		stats = self.metrics.stats
+		stats['bound'] = self.bound
+		stats['tables'] = {}
+		return stats
+
+	def __pieces(self, state):
+		corners = self.__corners(state)
+		edges = self.__edges(state)
+		return list(zip(corners[0::3], corners[1::3], corners[2::3])), list(zip(edges[0::2], edges[1::2])), \
+			self.__centres(state)
+
+	def get_heuristic(self, state):
+		"""
+		Lower bound of the movements needed to solve the state. Every movement, half turns too, moves at most 4 corners,
+		4 edges and 4 centres, so for every solved orientation the cube needs at least a quarter of the misplaced pieces
+		of each kind.
+		:param state: Flat state of the cube
+		:return: (int) Minimum number of movements to solve the state
+		"""
+		corners, edges, centres = self.__pieces(state)
+		heuristic = None
+		for goal_corners, goal_edges, goal_centres in self.__goals:
+			misplaced = max(sum(map(ne, corners, goal_corners)), sum(map(ne, edges, goal_edges)),
+			                sum(map(ne, centres, goal_centres)))
+			if heuristic is None or misplaced < heuristic:
+				heuristic = misplaced
+		heuristic = (heuristic + 3) // 4
+		for pattern_database in self.pattern_databases:
+			distance = pattern_database.lookup(state)
+			heuristic = max(heuristic, (distance + 1) // 2 if self.__half_turns else distance)
+		return heuristic
 
-	def generate_movements(self, last_movement=None):
-		all_movements = ['U', 'D', 'R', 'L', 'F', 'B', 'U1', 'D1', 'R1', 'L1', 'F1', 'B1', 'M', 'E', 'S', 'M1', 'E1',
-		                 'S1']
-		random.shuffle(all_movements)
-		if not last_movement:
-			return all_movements
-		all_movements.remove(RubikCube.get_opposite_movement(last_movement))
-		return all_movements
\ No newline at end of file
+	def solve(self, max_movements=20, time_limit=None, max_nodes=None, cancel=None):
+		"""
+		Searches the shortest solution of the cube, leaving it in self.solution. The first solution found is the
+		shortest one, so if the budget runs out first there's none (self.stats['stopped'] tells why)
+		:param max_movements: Longest solution to look for
+		:param time_limit: Seconds the search can last. None for no limit
+		:param max_nodes: Nodes the search can expand. None for no limit
+		:param cancel: Object whose is_set() returns True once the search has to stop, IE: a threading.Event set by
+		another thread. None for no cancellation
+		:return: List of movements of the shortest solution or None if there is none with max_movements or less
+		:raise ValueError: If the cube can't be solved
+		"""
+		self.cube.check()
+		self.metrics.restart(time_limit, max_nodes, cancel)
+		state = self.cube.state
+		if self.cache is not None:
+			cached = self.cache.get(state, self.metric)
+			if cached is not None and cached[1]:
+				if len(cached[0]) > max_movements:
+					return None
+				self.solution = cached[0]
+				return self.solution
+		self.bound = self.get_heuristic(state)
+		path = []
+		try:
+			while self.bound <= max_movements:
+				next_bound = self.__search(state, path, self.bound)
+				if next_bound is None:
+					self.solution = path
+					if self.cache is not None:
+						self.cache.put(state, path, True, self.metric)
+					return path
+				if next_bound == float('inf'):
+					break
+				self.bound = next_bound
+		except SearchStopped:
+			pass
+		return None
+
+	def __search(self, state, path, bound):
+		"""
+		Depth first search of a solution within the bound
+		:return: None if a solution was found (in path), else the smallest cost over the bound found
+		"""
+		if self.metrics.expand():
+			self.metrics.progress(self.stats)
+		heuristic = self.get_heuristic(state)
+		cost = len(path) + heuristic
+		if cost > bound:
+			self.metrics.prunes['bound'] += 1
+			return cost
+		if heuristic == 0:  # Every piece is where one of the solved states has it
+			return None
+		smallest = float('inf')
+		for movement in self.generate_movements(path[-1] if path else None, path[-2] if len(path) > 1 else None):
+			path.append(movement)
+			result = self.__search(RubikCube.MOVEMENTS[movement](state), path, bound)
+			if result is None:
+				return None
+			path.pop()
+			if result < smallest:
+				smallest = result
+		return smallest
+
+	def generate_movements(self, last_movement=None, previous_movement=None):
+		"""
+		Returns the movements to try after the last two, see get_successors()
+		"""
+		return get_successors(self.metric)[previous_movement, last_movement]
@@ -0,0 +1,273 @@
+"""
+Endgame tables: every state within a few movements of solved, with its distance and the movement to play, so the
+searches can finish the solution of any state in the table straight away instead of searching its last movements.
+
+Tables are built once by build(), a breadth first search from the solved cube, and opened by EndgameTable, which maps
+the file in memory so every process using it shares the same copy. The search only keeps the hashes of the last levels
+and the states of the deepest one packed in a bytearray, writing every level sorted into its own file once it is
+finished and merging them at the end, so a table of depth 6 (about 8 million states, 70MB) is built in about a minute
+with less than 1GB. States are turned by a whole cube rotation into the one with the centres of RubikCube.SOLVED, so the
+table only keeps one of the 24 orientations of every state, and are stored as the first 8 bytes of the blake2b hash of
+that state, sorted, 9 bytes per state:
+	- Header: magic, turn metric, depth and number of states
+	- Index: INDEX_SIZE + 1 offsets, the first state whose hash starts by every 2 bytes prefix
+	- States: 8 bytes hash and a byte with the distance (3 bits) and the index in RubikCube.ALL_MOVEMENTS of the
+	movement to play (5 bits)
+As hashes may collide, the movements of a solution are checked to take the state one movement closer to solved.
+"""
+import heapq
+import mmap
+import os
+import struct
+from hashlib import blake2b
+from operator import itemgetter
+
+from .cubik import RubikCube
+
+MAGIC = b'CUBIKEND'
+# Magic, turn metric, depth and number of states
+HEADER = struct.Struct('<8s8sBQ')
+INDEX_SIZE = 1 << 16
+INDEX = struct.Struct('<%dI' % (INDEX_SIZE + 1))
+RECORD_SIZE = 9
+KEY_SIZE = 8
+# Deepest table that can be built: every level multiplies the states and the memory by about 13 ('qstm'), so depth 7
+# (the most the 3 bits of the distance allow) would need around 13GB
+MAX_DEPTH = 6
+NO_MOVEMENT = 0x1F
+STATE_SIZE = 54
+
+_CENTRES = itemgetter(*RubikCube.CENTRES)
+
+
+def _orientations():
+	"""
+	Returns the whole cube rotation (index of RubikCube.SYMMETRIES) taking every arrangement of the centres to the one
+	of RubikCube.SOLVED
+	"""
+	solved = RubikCube(cube=RubikCube.SOLVED).state
+	orientations = {}
+	for state in RubikCube.solved_states():
+		for rotation, getter in enumerate(RubikCube.SYMMETRY_GETTERS[:24]):
+			if getter(state) == solved:
+				orientations[_CENTRES(state)] = rotation
+	return orientations
+
+
+_ORIENTATIONS = _orientations()
+
+
+def normalize(state):
+	"""
+	Turns a state with a whole cube rotation into the one with the centres of RubikCube.SOLVED
+	:param state: Flat state of the cube
+	:return: (key of the turned state, rotation) with rotation the index of RubikCube.SYMMETRIES turning it, or
+	(None, None) if its centres aren't those of a cube
+	"""
+	rotation = _ORIENTATIONS.get(_CENTRES(state))
+	if rotation is None:
+		return None, None
+	return bytes(RubikCube.SYMMETRY_GETTERS[rotation](state)), rotation
+
+
+def _key(state):
+	"""
+	Returns the hash of the state turned to the orientation of RubikCube.SOLVED and the rotation turning it, None if
+	its centres aren't those of a cube
+	"""
+	normalized, rotation = normalize(state)
+	if normalized is None:
+		return None, None
+	return blake2b(normalized, digest_size=KEY_SIZE).digest(), rotation
+
+
+def undo_movements(movements):
+	"""
+	Returns the movement undoing every movement, as seen from the cube turned by every rotation
+	:param movements: Movements of RubikCube.ALL_MOVEMENTS
+	:return: List of 24 dicts, one per rotation: movement -> index in RubikCube.ALL_MOVEMENTS of the movement undoing it
+	once the cube is turned by normalize()
+	"""
+	return [{movement: RubikCube.ALL_MOVEMENTS.index(transformed)
+	         for transformed, original in RubikCube.SYMMETRIES[rotation][1].items()
+	         for movement in movements if original == RubikCube.get_opposite_movement(movement)}
+	        for rotation in range(24)]
+
+
+def build(path, depth=5, metric='qstm'):
+	"""
+	Builds the endgame table of every state within depth movements of solved into path
+	:param path: File of the table
+	:param depth: Most movements of the states kept, MAX_DEPTH at most. Every movement multiplies the states by about
+	13 ('qstm'), a depth of 5 keeps around half a million states
+	:param metric: Turn metric of the movements, see RubikCube.METRICS
+	:return: Number of states
+	"""
+	if not 0 <= depth <= MAX_DEPTH:
+		raise ValueError('The depth of an endgame table goes from 0 to ' + str(MAX_DEPTH))
+	if metric not in RubikCube.METRICS:
+		raise ValueError('Invalid metric ' + metric)
+	movements = RubikCube.METRICS[metric]
+	getters = [RubikCube.MOVEMENTS[movement] for movement in movements]
+	undo = undo_movements(movements)
+	solved = normalize(RubikCube(cube=RubikCube.SOLVED).state)[0]
+	index = [0] * (INDEX_SIZE + 1)
+	level_paths = []
+	# The neighbours of a state are at most one movement closer or farther from solved, so the states of the last two
+	# levels are enough to tell the new ones
+	previous, current = {}, {blake2b(solved, digest_size=KEY_SIZE).digest(): NO_MOVEMENT}
+	frontier = bytearray(solved)
+	try:
+		for distance in range(1, depth + 2):
+			level_paths.append('%s.level%d' % (path, distance - 1))
+			_write_level(level_paths[-1], current, index)
+			if distance > depth:
+				break
+			new = {}
+			new_frontier = bytearray()
+			for start in range(0, len(frontier), STATE_SIZE):
+				state = frontier[start:start + STATE_SIZE]
+				for movement, getter in zip(movements, getters):
+					child, rotation = normalize(getter(state))
+					key = blake2b(child, digest_size=KEY_SIZE).digest()
+					if key in current or key in previous or key in new:
+						continue
+					new[key] = (distance << 5) | undo[rotation][movement]
+					# The states of the deepest level are never expanded
+					if distance < depth:
+						new_frontier += child
+			previous, current, frontier = current, new, new_frontier
+		previous = current = frontier = None
+
+		for i in range(INDEX_SIZE):
+			index[i + 1] += index[i]
+		new_path = path + '.new'
+		with open(new_path, 'wb') as file:
+			file.write(HEADER.pack(MAGIC, metric.encode(), depth, index[-1]))
+			file.write(INDEX.pack(*index))
+			file.writelines(heapq.merge(*[_read_level(level_path) for level_path in level_paths]))
+		os.replace(new_path, path)
+	finally:
+		for level_path in level_paths:
+			if os.path.exists(level_path):
+				os.remove(level_path)
+	return index[-1]
+
+
+def _write_level(path, entries, index):
+	"""
+	Writes the records of a level of the search sorted into path, counting them in the index
+	:param entries: Dict key -> byte with the distance and the movement
+	:param index: INDEX_SIZE + 1 counters of the records whose key starts by every 2 bytes prefix, shifted by one
+	"""
+	with open(path, 'wb') as file:
+		for key in sorted(entries):
+			index[(key[0] << 8 | key[1]) + 1] += 1
+			file.write(key + bytes((entries[key],)))
+
+
+def _read_level(path):
+	"""
+	Yields the records of a level written by _write_level
+	"""
+	with open(path, 'rb') as file:
+		while True:
+			block = file.read(RECORD_SIZE << 16)
+			if not block:
+				return
+			for start in range(0, len(block), RECORD_SIZE):
+				yield block[start:start + RECORD_SIZE]
+
+
+class EndgameTable:
+	"""
+	A built endgame table, mapped read only in memory
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.file = open(path, 'rb')
+		magic, metric, depth, size = HEADER.unpack(self.file.read(HEADER.size))
+		if magic != MAGIC:
+			self.file.close()
+			raise ValueError('Not an endgame table')
+		self.metric = metric.rstrip(b'\0').decode()
+		self.depth = depth
+		self.size = size
+		self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		self.__index = INDEX.unpack_from(self.data, HEADER.size)
+		self.__offset = HEADER.size + INDEX.size
+
+	def __len__(self):
+		return self.size
+
+	def lookup(self, state):
+		"""
+		Returns the distance of a state to solved and the movement to play
+		:param state: Flat state of the cube (RubikCube.state)
+		:return: (distance, movement) with movement None for solved states, or None if the state isn't in the table
+		"""
+		key, rotation = _key(state)
+		if key is None:
+			return None
+		bucket = key[0] << 8 | key[1]
+		low, high = self.__index[bucket], self.__index[bucket + 1]
+		data, offset = self.data, self.__offset
+		while low < high:
+			middle = (low + high) >> 1
+			start = offset + middle * RECORD_SIZE
+			found = data[start:start + KEY_SIZE]
+			if found < key:
+				low = middle + 1
+			elif found > key:
+				high = middle
+			else:
+				value = data[start + KEY_SIZE]
+				movement = value & NO_MOVEMENT
+				if movement == NO_MOVEMENT:
+					return value >> 5, None
+				return value >> 5, RubikCube.SYMMETRIES[rotation][1][RubikCube.ALL_MOVEMENTS[movement]]
+		return None
+
+	def solution(self, state):
+		"""
+		Returns the shortest solution of a state in the table
+		:param state: Flat state of the cube (RubikCube.state)
+		:return: List of movements, or None if the state isn't in the table
+		"""
+		found = self.lookup(state)
+		if found is None:
+			return None
+		distance, movement = found
+		solution = []
+		while distance:
+			state = RubikCube.MOVEMENTS[movement](state)
+			solution.append(movement)
+			found = self.lookup(state)
+			# A state whose hash collides with one in the table
+			if found is None or found[0] != distance - 1:
+				return None
+			distance, movement = found
+		return solution
+
+	def close(self):
+		self.data.close()
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+if __name__ == '__main__':
+	import argparse
+
+	parser = argparse.ArgumentParser(description='Builds an endgame table of the states near solved')
+	parser.add_argument('path', help='File of the table')
+	parser.add_argument('--depth', type=int, default=5, help='Most movements of the states kept')
+	parser.add_argument('--metric', choices=sorted(RubikCube.METRICS), default='qstm', help='Turn metric')
+	arguments = parser.parse_args()
+
+	print(build(arguments.path, depth=arguments.depth, metric=arguments.metric), "states in", arguments.path)
@@ -0,0 +1,320 @@
+"""
+Kociemba's two-phase algorithm. Phase 1 brings the cube into the group generated by U, D, R2, L2, F2 and B2 (every
+corner and edge oriented, and the middle layer edges in the middle layer). Phase 2 solves it within that group.
+Both phases are iterative deepening searches on small integer coordinates, with move tables to move them and pruning
+tables to bound the movements left. The tables are generated once and cached on disk.
+
+Only face movements are used, so the centres stay where they are and the cube is solved relative to them.
+"""
+import os
+import time
+from array import array
+
+from . import cubie
+from .cubie import CubieCube, N_TWIST, N_FLIP, N_SLICE, N_CORNERS, SLICE_EDGES, SLICE_GOAL
+from .cubik import RubikCube
+
+FACES = ['U', 'R', 'F', 'D', 'L', 'B']
+# Face turns of the search: every face turned once, twice and three times (once counterclockwise)
+MOVES = [(face, power) for face in FACES for power in (1, 2, 3)]
+# Moves which keep the cube in phase 2's group
+PHASE2_MOVES = [i for i, (face, power) in enumerate(MOVES) if face in 'UD' or power == 2]
+# Every move as movements of RubikCube.POSSIBLE_MOVEMENTS
+SEQUENCES = [[face] if power == 1 else [face, face] if power == 2 else [face + '1'] for face, power in MOVES]
+# Cost of every move counted in RubikCube.POSSIBLE_MOVEMENTS, a half turn is two of them
+COSTS = [2 if power == 2 else 1 for face, power in MOVES]
+OPPOSITE = {'U': 'D', 'R': 'L', 'F': 'B', 'D': 'U', 'L': 'R', 'B': 'F'}
+
+N_UD_EDGES = 40320
+N_SLICE_PERMUTATION = 24
+
+DEFAULT_TABLES_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'cubik')
+
+
+# Phase 2 coordinates of the edges
+
+def get_ud_edges(permutation):
+	return cubie.rank_arrangement(permutation[:8], 8)
+
+
+def get_slice_permutation(permutation):
+	return cubie.rank_arrangement([edge - 8 for edge in permutation[8:]], 4)
+
+
+def set_ud_edges(rank):
+	return cubie.unrank_arrangement(rank, 8, 8) + list(SLICE_EDGES)
+
+
+def set_slice_permutation(rank):
+	return list(range(8)) + [edge + 8 for edge in cubie.unrank_arrangement(rank, 4, 4)]
+
+
+# Tables
+
+def _pruning_table(first_moves, second_moves, n_second, goal, moves):
+	"""
+	Generates a pruning table by a search from the goal: table[first * n_second + second] is the cost of the cheapest
+	moves taking both coordinates to the goal, counted in COSTS
+	"""
+	n_moves = len(moves)
+	costs = [COSTS[move] for move in moves]
+	size = len(first_moves) // n_moves * n_second
+	table = bytearray(b'\xff') * size
+	table[goal] = 0
+	# Frontiers by cost, expanded from the cheapest one
+	frontiers = {0: [goal]}
+	depth = 0
+	while frontiers:
+		frontier = frontiers.pop(depth, [])
+		for index in frontier:
+			if table[index] != depth:
+				continue
+			first, second = divmod(index, n_second)
+			first, second = first * n_moves, second * n_moves
+			for first_neighbour, second_neighbour, cost in zip(first_moves[first:first + n_moves],
+			                                                   second_moves[second:second + n_moves], costs):
+				neighbour = first_neighbour * n_second + second_neighbour
+				cost += depth
+				if cost < table[neighbour]:
+					table[neighbour] = cost
+					frontiers.setdefault(cost, []).append(neighbour)
+		depth += 1
+	return table
+
+
+class Tables:
+	"""
+	Move and pruning tables of both phases
+	"""
+	NAMES = ['twist_moves', 'flip_moves', 'slice_moves', 'corners_moves', 'ud_edges_moves', 'slice_permutation_moves',
+	         'twist_slice_pruning', 'flip_slice_pruning', 'corners_slice_pruning', 'ud_edges_slice_pruning']
+
+	def __init__(self, path=None):
+		"""
+		Loads the tables from path, generating and saving them there first if they aren't yet
+		:param path: Directory of the tables. None for ~/.cache/cubik
+		"""
+		self.path = path or DEFAULT_TABLES_PATH
+		if not all(os.path.exists(self.__file(name)) for name in Tables.NAMES):
+			self.generate()
+			self.save()
+		else:
+			self.load()
+
+	def __file(self, name):
+		return os.path.join(self.path, 'kociemba_' + name + '.bin')
+
+	def generate(self):
+		all_moves = list(range(len(MOVES)))
+		phase2_sequences = [SEQUENCES[move] for move in PHASE2_MOVES]
+		self.twist_moves = cubie.move_table(N_TWIST, 'twist', SEQUENCES)
+		self.flip_moves = cubie.move_table(N_FLIP, 'flip', SEQUENCES)
+		self.slice_moves = cubie.move_table(N_SLICE, 'slice', SEQUENCES)
+		self.corners_moves = cubie.move_table(N_CORNERS, 'corners', phase2_sequences)
+		self.ud_edges_moves = cubie.move_table(N_UD_EDGES, (lambda cube: get_ud_edges(cube.ep),
+		                                                    lambda rank: CubieCube(ep=set_ud_edges(rank))),
+		                                       phase2_sequences)
+		self.slice_permutation_moves = cubie.move_table(N_SLICE_PERMUTATION,
+		                                                (lambda cube: get_slice_permutation(cube.ep),
+		                                                 lambda rank: CubieCube(ep=set_slice_permutation(rank))),
+		                                                phase2_sequences)
+
+		self.twist_slice_pruning = _pruning_table(self.twist_moves, self.slice_moves, N_SLICE, SLICE_GOAL, all_moves)
+		self.flip_slice_pruning = _pruning_table(self.flip_moves, self.slice_moves, N_SLICE, SLICE_GOAL, all_moves)
+		self.corners_slice_pruning = _pruning_table(self.corners_moves, self.slice_permutation_moves,
+		                                            N_SLICE_PERMUTATION, 0, PHASE2_MOVES)
+		self.ud_edges_slice_pruning = _pruning_table(self.ud_edges_moves, self.slice_permutation_moves,
+		                                             N_SLICE_PERMUTATION, 0, PHASE2_MOVES)
+
+	def save(self):
+		os.makedirs(self.path, exist_ok=True)
+		for name in Tables.NAMES:
+			new_file = self.__file(name) + '.new'
+			with open(new_file, 'wb') as file:
+				file.write(getattr(self, name))
+			os.replace(new_file, self.__file(name))
+
+	def load(self):
+		for name in Tables.NAMES:
+			with open(self.__file(name), 'rb') as file:
+				if name.endswith('_moves'):
+					table = array('H')
+					table.frombytes(file.read())
+				else:
+					table = bytearray(file.read())
+			setattr(self, name, table)
+
+
+_tables = {}
+
+
+def get_tables(path=None):
+	"""
+	Returns the tables of path, loading them only once per process
+	"""
+	path = path or DEFAULT_TABLES_PATH
+	if path not in _tables:
+		_tables[path] = Tables(path)
+	return _tables[path]
+
+
+class _Timeout(Exception):
+	pass
+
+
+class KociembaSolver:
+	"""
+	Two-phase solver. Quickly finds a solution of at most max_length movements, not necessarily the shortest one.
+	"""
+
+	def __init__(self, cube=None, max_length=32, timeout=10, tables_path=None, cache=None):
+		"""
+		:param cube: RubikCube to solve. None to solve a random one
+		:param max_length: Longest solution accepted, in movements of RubikCube.POSSIBLE_MOVEMENTS
+		:param timeout: Seconds to look for a solution
+		:param tables_path: Directory of the cached tables. None for ~/.cache/cubik
+		:param cache: SolutionCache looked up before searching and updated after. None for no cache
+		"""
+		self.cube = cube or RubikCube()
+		self.cache = cache
+		self.max_length = max_length
+		self.timeout = timeout
+		self.tables = get_tables(tables_path)
+		self.solution = None
+		self.n_movements_done = 0
+
+	@property
+	def shortest_solution(self):
+		if self.solution is not None:
+			return {'initial_cube': self.cube.initial_cube, 'solution': self.solution}
+		else:
+			raise IndexError('No solutions found yet')
+
+	def solve(self):
+		"""
+		Searches a solution of at most max_length movements, leaving it in self.solution
+		:return: List of movements of the solution or None if none was found before the timeout
+		:raise ValueError: If the cube can't be solved
+		"""
+		self.cube.check()
+		if self.cache is not None:
+			cached = self.cache.get(self.cube.state)
+			if cached is not None and len(cached[0]) <= self.max_length:
+				self.solution = cached[0]
+				return self.solution
+		self.__cubie_cube = CubieCube.from_state(cubie.relative_to_centres(self.cube.state))
+		self.__deadline = time.time() + self.timeout
+		self.__path = []
+		self.__found = None
+
+		twist = self.__cubie_cube.twist
+		flip = self.__cubie_cube.flip
+		slice_ = self.__cubie_cube.slice
+		bound = 0
+		try:
+			while bound <= self.max_length and self.__found is None:
+				self.__phase1(twist, flip, slice_, 0, bound)
+				bound += 1
+		except _Timeout:
+			pass
+		if self.__found is None:
+			return None
+		self.solution = [movement for move in self.__found for movement in SEQUENCES[move]]
+		if self.cache is not None:
+			self.cache.put(self.cube.state, self.solution)
+		return self.solution
+
+	def __heuristic1(self, twist, flip, slice_):
+		tables = self.tables
+		return max(tables.twist_slice_pruning[twist * N_SLICE + slice_], tables.flip_slice_pruning[flip * N_SLICE + slice_])
+
+	def __phase1(self, twist, flip, slice_, cost, bound):
+		"""
+		Searches the phase 1 solutions costing exactly bound and tries to finish every one of them with phase 2
+		:return: True once a solution is found
+		"""
+		self.n_movements_done += 1
+		if self.n_movements_done % 1000 == 0 and time.time() > self.__deadline:
+			raise _Timeout()
+		path = self.__path
+		heuristic = self.__heuristic1(twist, flip, slice_)
+		if heuristic == 0 and cost == bound:
+			# If the last move is a phase 2 move, the shorter phase 1 solution without it was tried already
+			if not path or path[-1] not in PHASE2_MOVES:
+				return self.__start_phase2(cost)
+			return False
+		if cost + heuristic > bound:
+			return False
+
+		tables = self.tables
+		n_moves = len(MOVES)
+		for move, (face, power) in enumerate(MOVES):
+			if path and not self.__allowed(path[-1], face):
+				continue
+			move_cost = COSTS[move]
+			if cost + move_cost > bound:
+				continue
+			path.append(move)
+			if self.__phase1(tables.twist_moves[twist * n_moves + move], tables.flip_moves[flip * n_moves + move],
+			                 tables.slice_moves[slice_ * n_moves + move], cost + move_cost, bound):
+				return True
+			path.pop()
+		return False
+
+	@staticmethod
+	def __allowed(last_move, face):
+		"""
+		Turning the same face twice in a row, or opposite faces in both orders, only finds the same cubes again
+		"""
+		last_face = MOVES[last_move][0]
+		return face != last_face and not (OPPOSITE[face] == last_face and FACES.index(face) > FACES.index(last_face))
+
+	def __start_phase2(self, phase1_cost):
+		cube = self.__cubie_cube.copy()
+		for move in self.__path:
+			for movement in SEQUENCES[move]:
+				cube.do_movement(movement)
+		corners = cube.corners
+		ud_edges = get_ud_edges(cube.ep)
+		slice_permutation = get_slice_permutation(cube.ep)
+
+		phase1_path = list(self.__path)
+		bound = self.__heuristic2(corners, ud_edges, slice_permutation)
+		while phase1_cost + bound <= self.max_length:
+			if self.__phase2(corners, ud_edges, slice_permutation, 0, bound):
+				self.__found = list(self.__path)
+				return True
+			bound += 1
+		self.__path[:] = phase1_path
+		return False
+
+	def __heuristic2(self, corners, ud_edges, slice_permutation):
+		tables = self.tables
+		return max(tables.corners_slice_pruning[corners * N_SLICE_PERMUTATION + slice_permutation],
+		           tables.ud_edges_slice_pruning[ud_edges * N_SLICE_PERMUTATION + slice_permutation])
+
+	def __phase2(self, corners, ud_edges, slice_permutation, cost, bound):
+		self.n_movements_done += 1
+		if self.n_movements_done % 1000 == 0 and time.time() > self.__deadline:
+			raise _Timeout()
+		heuristic = self.__heuristic2(corners, ud_edges, slice_permutation)
+		if heuristic == 0:
+			return True
+		if cost + heuristic > bound:
+			return False
+
+		tables = self.tables
+		path = self.__path
+		n_moves = len(PHASE2_MOVES)
+		for i, move in enumerate(PHASE2_MOVES):
+			if path and not self.__allowed(path[-1], MOVES[move][0]):
+				continue
+			move_cost = COSTS[move]
+			if cost + move_cost > bound:
+				continue
+			path.append(move)
+			if self.__phase2(tables.corners_moves[corners * n_moves + i], tables.ud_edges_moves[ud_edges * n_moves + i],
+			                 tables.slice_permutation_moves[slice_permutation * n_moves + i], cost + move_cost, bound):
+				return True
+			path.pop()
+		return False
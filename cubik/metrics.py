@@ -0,0 +1,150 @@
+"""
+Search metrics: every solver counts the nodes it expands and the branches it prunes, by reason, in a SearchMetrics
+instead of printing them. Callers wanting to follow a long search give the solver a progress callback, called with the
+solver's stats at most once every interval seconds, IE: print_progress.
+SearchMetrics also keeps the budget of a search, a time limit, a number of nodes or a cancellation token (anything with
+is_set(), IE: a threading.Event set by another thread), raising SearchStopped once it runs out so the solver can return
+the best solution found so far.
+"""
+import sys
+import time
+
+# Why a branch was cut off:
+#	- 'bound': It can't give a solution shorter than the bound (the smallest solution found or IDA*'s threshold)
+#	- 'transposition': Its state was reached before with as many movements or less
+#	- 'depth': It reached the deepest level searched without a solution
+PRUNE_REASONS = ('bound', 'transposition', 'depth')
+# Why a search was stopped before finishing
+STOP_REASONS = ('time', 'nodes', 'cancelled', 'memory')
+
+
+class SearchStopped(Exception):
+	"""
+	Raised when the budget of a search runs out
+	"""
+
+	def __init__(self, reason):
+		super().__init__(reason)
+		self.reason = reason
+
+
+class SearchMetrics:
+	"""
+	Counters of a search and the rate limit of its progress callback
+	"""
+
+	# Nodes expanded between reads of the clock
+	CHECK_EVERY = 1024
+
+	def __init__(self, progress=None, interval=1.0):
+		"""
+		:param progress: Callable called with the stats of the solver while it searches. None for no progress
+		:param interval: Fewest seconds between calls to progress
+		"""
+		self.progress = progress
+		self.interval = interval
+		self.nodes = 0
+		self.prunes = dict.fromkeys(PRUNE_REASONS, 0)
+		self.start = time.perf_counter()
+		self.__last_report = self.start
+		self.__next_check = SearchMetrics.CHECK_EVERY
+		self.__polls = 0
+		self.deadline = None
+		self.max_nodes = None
+		self.cancel = None
+		self.stopped = None
+
+	def restart(self, time_limit=None, max_nodes=None, cancel=None):
+		"""
+		Starts counting a new search from zero and sets its budget
+		:param time_limit: Seconds the search can last. None for no limit
+		:param max_nodes: Nodes the search can expand. None for no limit
+		:param cancel: Object whose is_set() returns True once the search has to stop, IE: threading.Event. None for
+		no cancellation
+		"""
+		self.nodes = 0
+		self.prunes = dict.fromkeys(PRUNE_REASONS, 0)
+		self.start = self.__last_report = time.perf_counter()
+		self.deadline = None if time_limit is None else self.start + time_limit
+		self.max_nodes = max_nodes
+		self.cancel = cancel
+		self.stopped = None
+		self.__next_check = 0
+		self.__polls = 0
+
+	def expand(self):
+		"""
+		Counts an expanded node
+		:return: True if the progress callback is due
+		:raise SearchStopped: If the budget of the search ran out
+		"""
+		due = self.nodes >= self.__next_check and self.__due()
+		self.nodes += 1
+		return due
+
+	def poll(self):
+		"""
+		Checks the budget once every CHECK_EVERY calls, for the work done between expansions, IE: popping branches
+		that are cut off
+		:raise SearchStopped: If the budget of the search ran out
+		"""
+		self.__polls += 1
+		if self.__polls >= SearchMetrics.CHECK_EVERY:
+			self.__polls = 0
+			self.check()
+
+	def check(self):
+		"""
+		:raise SearchStopped: If the budget of the search ran out
+		"""
+		reason = None
+		if self.max_nodes is not None and self.nodes >= self.max_nodes:
+			reason = 'nodes'
+		elif self.cancel is not None and self.cancel.is_set():
+			reason = 'cancelled'
+		elif self.deadline is not None and time.perf_counter() >= self.deadline:
+			reason = 'time'
+		if reason is not None:
+			self.stopped = reason
+			raise SearchStopped(reason)
+
+	def merge(self, stats):
+		"""
+		Adds the counters of the stats of another search, IE: the branch of a worker process
+		:return: True if the progress callback is due
+		"""
+		self.nodes += stats['nodes']
+		for reason, prunes in stats['prunes'].items():
+			self.prunes[reason] += prunes
+		return self.__due()
+
+	def __due(self):
+		self.check()
+		self.__next_check = self.nodes + SearchMetrics.CHECK_EVERY
+		if self.max_nodes is not None:
+			self.__next_check = min(self.__next_check, self.max_nodes)
+		if self.progress is None:
+			return False
+		now = time.perf_counter()
+		if now - self.__last_report < self.interval:
+			return False
+		self.__last_report = now
+		return True
+
+	@property
+	def stats(self):
+		seconds = time.perf_counter() - self.start
+		return {'nodes': self.nodes, 'prunes': dict(self.prunes), 'seconds': seconds,
+		        'nodes/sec': self.nodes / seconds if seconds else 0.0, 'stopped': self.stopped}
+
+
+def print_progress(stats, file=None):
+	"""
+	Progress callback printing the stats of a solver in a line
+	:param stats: Stats of the solver
+	:param file: Writable text file. None for stderr
+	"""
+	prunes = ', '.join(reason + ' ' + str(prunes) for reason, prunes in stats['prunes'].items())
+	tables = ', '.join(table + ' ' + str(size) for table, size in stats['tables'].items())
+	print('%.1fs' % stats['seconds'], "\t", stats['nodes'], "nodes (", int(stats['nodes/sec']), "/sec)\tPruned:", prunes,
+	      "\tTables:", tables, file=file or sys.stderr)
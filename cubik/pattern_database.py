@@ -0,0 +1,292 @@
+"""
+Pattern databases: the exact number of movements needed to solve some of the pieces of the cube, for every way those
+pieces can be placed, used as a lower bound of the movements needed to solve the whole cube.
+
+Databases are built once into a file by build(), 4 bits per entry, and opened by PatternDatabase, which maps the file
+in memory so every process using it shares the same copy.
+"""
+import mmap
+import os
+import struct
+from math import factorial
+
+from . import cubie
+from .cubik import RubikCube
+
+MAGIC = b'CUBIKPDB'
+# Magic, pattern name, number of entries, depth being built, next entry to expand, entries found at this depth, complete
+HEADER = struct.Struct('<8s40sQBQQ?')
+UNKNOWN = 0xF
+
+
+class PiecesPattern:
+	"""
+	Some of the corners or some of the edges of the cube, ignoring every other piece.
+	Every placement of the pieces (their slots and orientations) has an index between 0 and size - 1.
+	"""
+	KINDS = {
+		'corners': (RubikCube.CORNERS, cubie.CORNER_COLOURS, cubie.CORNER_MOVEMENTS),
+		'edges': (RubikCube.EDGES, cubie.EDGE_COLOURS, cubie.EDGE_MOVEMENTS),
+	}
+
+	def __init__(self, kind, pieces=None):
+		"""
+		:param kind: 'corners' or 'edges'
+		:param pieces: Pieces of the pattern (as numbered in RubikCube.CORNERS/EDGES). None for all of them
+		"""
+		if kind not in PiecesPattern.KINDS:
+			raise ValueError('Invalid kind of pieces ' + kind)
+		self.kind = kind
+		self.slots, self.colours, movements = PiecesPattern.KINDS[kind]
+		self.n_slots = len(self.slots)
+		self.n_orientations = len(self.slots[0])
+		self.pieces = tuple(range(self.n_slots)) if pieces is None else tuple(pieces)
+		self.__tracked = {piece: i for i, piece in enumerate(self.pieces)}
+		n, k = self.n_slots, len(self.pieces)
+		self.n_arrangements = factorial(n) // factorial(n - k)
+		# With every piece in the pattern, the orientation of the last one follows from the others
+		self.n_orientation_digits = k - 1 if k == n else k
+		self.size = self.n_arrangements * self.n_orientations ** self.n_orientation_digits
+
+		# Movements as (destinations, twists), leaving out those that don't move this kind of pieces (I.E: slices
+		# and corners). destinations[i] is the slot where the piece on slot i goes
+		self.movements = []
+		for movement in RubikCube.POSSIBLE_MOVEMENTS:
+			sources, twists = movements[movement]
+			if sources == tuple(range(n)) and not any(twists):
+				continue
+			destinations = [0] * n
+			for slot, source in enumerate(sources):
+				destinations[source] = slot
+			self.movements.append((destinations, twists))
+
+	@property
+	def name(self):
+		if len(self.pieces) == self.n_slots:
+			return self.kind
+		return '-'.join([self.kind] + [str(piece) for piece in self.pieces])
+
+	@staticmethod
+	def from_name(name):
+		"""
+		Inverse of the name property
+		:param name: Name of a pattern. IE: corners, edges-0-1-2
+		:return: PiecesPattern
+		"""
+		kind, *pieces = name.split('-')
+		return PiecesPattern(kind, [int(piece) for piece in pieces] if pieces else None)
+
+	def index(self, state):
+		"""
+		Returns the index of the pattern's placement in a cube
+		:param state: Flat state of the cube (use only with numeric cube)
+		:return: (int) Index of the placement
+		"""
+		positions = [0] * len(self.pieces)
+		orientations = [0] * len(self.pieces)
+		colours = self.colours
+		for slot, cells in enumerate(self.slots):
+			piece, orientation = colours[tuple(state[cell] for cell in cells)]
+			i = self.__tracked.get(piece)
+			if i is not None:
+				positions[i] = slot
+				orientations[i] = orientation
+		return self.encode(positions, orientations)
+
+	def encode(self, positions, orientations):
+		index = cubie.rank_arrangement(positions, self.n_slots)
+		for orientation in orientations[:self.n_orientation_digits]:
+			index = index * self.n_orientations + orientation
+		return index
+
+	def decode(self, index):
+		"""
+		Inverse of encode()
+		:return: (positions, orientations) lists of the pattern's pieces
+		"""
+		orientations = []
+		for _ in range(self.n_orientation_digits):
+			index, orientation = divmod(index, self.n_orientations)
+			orientations.append(orientation)
+		orientations.reverse()
+		if self.n_orientation_digits < len(self.pieces):
+			orientations.append(-sum(orientations) % self.n_orientations)
+		return cubie.unrank_arrangement(index, self.n_slots, len(self.pieces)), orientations
+
+	def neighbours(self, index):
+		"""
+		Yields the index of the placements one movement away
+		"""
+		positions, orientations = self.decode(index)
+		n_orientations = self.n_orientations
+		for destinations, twists in self.movements:
+			new_positions = [destinations[position] for position in positions]
+			new_orientations = [(orientation + twists[position]) % n_orientations
+			                    for orientation, position in zip(orientations, new_positions)]
+			yield self.encode(new_positions, new_orientations)
+
+	def goals(self):
+		"""
+		Returns the indexes of the pattern in the solved states (one per orientation of the whole cube)
+		"""
+		return sorted({self.index(state) for state in RubikCube.solved_states()})
+
+
+def _read_header(file):
+	file.seek(0)
+	magic, name, size, depth, position, found, complete = HEADER.unpack(file.read(HEADER.size))
+	if magic != MAGIC:
+		raise ValueError('Not a pattern database')
+	return name.rstrip(b'\0').decode(), size, depth, position, found, complete
+
+
+def _header(pattern, depth, position, found, complete):
+	return HEADER.pack(MAGIC, pattern.name.encode(), pattern.size, depth, position, found, complete)
+
+
+def _write_header(file, pattern, depth, position, found, complete):
+	file.seek(0)
+	file.write(_header(pattern, depth, position, found, complete))
+
+
+def build(pattern, path, chunk_size=1 << 16, max_chunks=None):
+	"""
+	Builds the pattern database of pattern into path with a breadth first search from the solved states, one depth at a
+	time: the entries of the current depth are expanded chunk by chunk and the progress is saved in the file after
+	every chunk, so the build can be stopped at any moment and resumed calling build() again with the same path.
+	The progress is written into the header through the same mapping as the entries and both are flushed together. A
+	build stopped in the middle of a chunk leaves some of its entries marked but not counted, so the first chunk scanned
+	after resuming counts the entries already marked with the next depth too: a depth is never taken as the last one
+	while some entry has the next.
+	:param pattern: PiecesPattern
+	:param path: File of the database
+	:param chunk_size: Entries to scan between saves
+	:param max_chunks: Chunks to scan before returning. None to build the whole database
+	:return: True if the database is complete
+	"""
+	chunk_size += chunk_size % 2
+	if not os.path.exists(path):
+		new_path = path + '.new'
+		with open(new_path, 'wb') as file:
+			_write_header(file, pattern, 0, 0, 0, False)
+			remaining = (pattern.size + 1) // 2
+			while remaining:
+				block = min(remaining, 1 << 20)
+				file.write(b'\xff' * block)
+				remaining -= block
+		with open(new_path, 'r+b') as file, mmap.mmap(file.fileno(), 0) as data:
+			for goal in pattern.goals():
+				_set(data, goal, 0)
+			data.flush()
+		os.replace(new_path, path)
+
+	with open(path, 'r+b') as file:
+		name, size, depth, position, found, complete = _read_header(file)
+		if name != pattern.name or size != pattern.size:
+			raise ValueError('The file is the pattern database of ' + name)
+		with mmap.mmap(file.fileno(), 0) as data:
+			chunks = 0
+			while not complete and (max_chunks is None or chunks < max_chunks):
+				end = min(position + chunk_size, size)
+				found += _expand(pattern, data, depth, position, end, recount=not chunks)
+				if found and depth + 1 == UNKNOWN:
+					raise ValueError('Pattern too deep for 4 bits entries')
+				position = end
+				if position == size:
+					complete = not found
+					depth, position, found = depth + 1, 0, 0
+				data[:HEADER.size] = _header(pattern, depth, position, found, complete)
+				data.flush()
+				chunks += 1
+	return complete
+
+
+def _expand(pattern, data, depth, start, end, recount=False):
+	"""
+	Marks with depth + 1 every unknown neighbour of the entries with depth between start and end (start is even)
+	:param recount: True to count too the neighbours already marked with depth + 1, which an interrupted scan of the
+	same entries may have left
+	:return: Number of entries marked
+	"""
+	found = 0
+	offset = HEADER.size
+	for byte_index in range(start >> 1, (end + 1) >> 1):
+		byte = data[offset + byte_index]
+		if byte == 0xff:
+			continue
+		for index, distance in ((byte_index << 1, byte & 0xF), ((byte_index << 1) + 1, byte >> 4)):
+			if distance != depth or index >= end:
+				continue
+			for neighbour in pattern.neighbours(index):
+				distance = _get(data, neighbour)
+				if distance == UNKNOWN:
+					_set(data, neighbour, depth + 1)
+					found += 1
+				elif recount and distance == depth + 1:
+					found += 1
+	return found
+
+
+def _get(data, index):
+	byte = data[HEADER.size + (index >> 1)]
+	return byte >> 4 if index & 1 else byte & 0xF
+
+
+def _set(data, index, distance):
+	position = HEADER.size + (index >> 1)
+	byte = data[position]
+	if index & 1:
+		data[position] = (byte & 0x0F) | (distance << 4)
+	else:
+		data[position] = (byte & 0xF0) | distance
+
+
+class PatternDatabase:
+	"""
+	A built pattern database, mapped read only in memory
+	"""
+
+	def __init__(self, path):
+		self.file = open(path, 'rb')
+		name, size, depth, position, found, complete = _read_header(self.file)
+		if not complete:
+			self.file.close()
+			raise ValueError('Pattern database not built yet, resume it with build()')
+		self.pattern = PiecesPattern.from_name(name)
+		self.max_distance = depth - 1
+		self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def lookup(self, state):
+		"""
+		Returns the movements needed to solve the pattern's pieces
+		:param state: Flat state of the cube (RubikCube.state)
+		:return: (int) Movements needed
+		"""
+		return _get(self.data, self.pattern.index(state))
+
+	def close(self):
+		self.data.close()
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+if __name__ == '__main__':
+	import argparse
+
+	parser = argparse.ArgumentParser(description='Builds or resumes building a pattern database')
+	parser.add_argument('pattern', help='Pattern name. IE: corners, edges-0-1-2-3-4-5')
+	parser.add_argument('path', help='File of the database')
+	parser.add_argument('--chunk-size', type=int, default=1 << 16, help='Entries to scan between saves')
+	arguments = parser.parse_args()
+
+	pattern = PiecesPattern.from_name(arguments.pattern)
+	while not build(pattern, arguments.path, chunk_size=arguments.chunk_size, max_chunks=1):
+		with open(arguments.path, 'rb') as file:
+			name, size, depth, position, found, complete = _read_header(file)
+		print("Depth", depth, "\t", position, "/", size, "\t", found, "found")
+	print("Done")
@@ -0,0 +1,125 @@
+"""
+Solution cache: known solutions of cubes kept in a SQLite file, so positions solved before, or their rotations and
+mirrors, aren't searched again.
+
+Solutions are stored by the canonical state of the cube (RubikCube.canonical), as the movements solving the canonical
+state, together with the turn metric they were searched in and whether they are proven optimal in it. A solution only
+replaces another one if it is optimal and the old one isn't, or if it is shorter.
+The most recently used entries are also kept in memory. The file is opened in write ahead logging mode, so every
+process can open its own SolutionCache on the same path and read while another one writes.
+"""
+import sqlite3
+from collections import OrderedDict
+
+from .cubik import RubikCube
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS solutions (
+	state BLOB NOT NULL,
+	metric TEXT NOT NULL,
+	solution TEXT NOT NULL,
+	length INTEGER NOT NULL,
+	optimal INTEGER NOT NULL,
+	PRIMARY KEY (state, metric)
+)
+'''
+
+# Inserts a solution unless the one stored is at least as good
+UPSERT = '''
+INSERT INTO solutions (state, metric, solution, length, optimal) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (state, metric) DO UPDATE SET solution = excluded.solution, length = excluded.length,
+	optimal = excluded.optimal
+WHERE excluded.optimal > solutions.optimal OR (excluded.optimal = solutions.optimal AND excluded.length < solutions.length)
+'''
+
+# Inverse of the movements mapping of every symmetry: movements done to the original cube -> movements doing the same
+# to the transformed one
+_INVERSE_MAPPINGS = [{original: transformed for transformed, original in movements.items()}
+                     for symmetry, movements in RubikCube.SYMMETRIES]
+
+
+class SolutionCache:
+	"""
+	Maps cube states to their best known solution
+	"""
+
+	def __init__(self, path, memory_entries=1024, timeout=30):
+		"""
+		:param path: SQLite file of the cache, created if it doesn't exist
+		:param memory_entries: Entries kept in memory. 0 to read every entry from the file
+		:param timeout: Seconds to wait for another process writing into the file
+		"""
+		self.path = path
+		self.memory_entries = memory_entries
+		self.connection = sqlite3.connect(path, timeout=timeout)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute(SCHEMA)
+		self.connection.commit()
+		self.__memory = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def __remember(self, key, entry):
+		if not self.memory_entries:
+			return
+		self.__memory[key] = entry
+		self.__memory.move_to_end(key)
+		if len(self.__memory) > self.memory_entries:
+			self.__memory.popitem(last=False)
+
+	def get(self, state, metric='qstm'):
+		"""
+		Returns the best known solution of a state
+		:param state: Flat state of the cube
+		:param metric: Turn metric of the solution, see RubikCube.METRICS
+		:return: (solution, optimal) or None if there's none
+		"""
+		canonical, symmetry = RubikCube.canonical(state)
+		key = (canonical, metric)
+		entry = self.__memory.get(key)
+		if entry is not None:
+			self.__memory.move_to_end(key)
+		else:
+			row = self.connection.execute('SELECT solution, optimal FROM solutions WHERE state = ? AND metric = ?',
+			                              key).fetchone()
+			if row is None:
+				self.misses += 1
+				return None
+			entry = (row[0].split(), bool(row[1]))
+			self.__remember(key, entry)
+		self.hits += 1
+		solution, optimal = entry
+		return RubikCube.map_movements(solution, symmetry), optimal
+
+	def put(self, state, solution, optimal=False, metric='qstm'):
+		"""
+		Stores a solution of a state, unless the one known is at least as good
+		:param state: Flat state of the cube
+		:param solution: List of movements solving the state
+		:param optimal: True if there's no shorter solution in the metric
+		:param metric: Turn metric of the solution, see RubikCube.METRICS
+		"""
+		canonical, symmetry = RubikCube.canonical(state)
+		mapping = _INVERSE_MAPPINGS[symmetry]
+		canonical_solution = [mapping[movement] for movement in solution]
+		with self.connection:
+			self.connection.execute(UPSERT, (canonical, metric, ' '.join(canonical_solution), len(solution),
+			                                 int(optimal)))
+		# Forgets the entry in memory, the one in the file may be better
+		self.__memory.pop((canonical, metric), None)
+
+	def __len__(self):
+		return self.connection.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+
+	@property
+	def stats(self):
+		return {'entries': len(self), 'memory': len(self.__memory), 'hits': self.hits, 'misses': self.misses}
+
+	def close(self):
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
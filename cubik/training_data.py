@@ -0,0 +1,184 @@
+"""
+Training data: (state, length of the scramble or distance to solved, best next movement) samples of scrambled cubes,
+written as fixed width records of RECORD_SIZE bytes into shards, so training jobs can map them in memory instead of
+parsing JSON.
+
+Every shard is a .npy file of unsigned bytes with shape (samples, RECORD_SIZE): numpy.load(path, mmap_mode='r') reads
+it without copying, and Shard reads it without numpy. A record is the 54 cells of RubikCube.state, the length of the
+scramble (the distance to solved if generated with optimal) and the index in RubikCube.POSSIBLE_MOVEMENTS of the best
+next movement (NO_MOVEMENT for solved cubes).
+Scrambles are never redundant (see get_successors): no movement undoing or repeating the face of the last one,
+opposite faces in a fixed order, so the length of the scramble is rarely more than the distance.
+
+Every shard has its own seed, derived from the seed of the dataset and the number of the shard, so the same arguments
+always give the same data whatever the number of processes. Shards already written are skipped, so an interrupted
+generation is resumed calling generate() again.
+"""
+import ast
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+
+from .cubik import RubikCube, IDASolver, get_successors
+
+RECORD_SIZE = 56
+NO_MOVEMENT = 0xFF
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+
+def shard_path(path, shard):
+	return os.path.join(path, 'shard-%05d.npy' % shard)
+
+
+def scramble(rng, depth):
+	"""
+	Does depth random movements to a solved cube, only choosing among the successors of the last two (see
+	get_successors), so no sequence of the scramble can be done with fewer movements
+	:param rng: random.Random
+	:param depth: Number of movements
+	:return: (state, movements)
+	"""
+	successors = get_successors()
+	state = RubikCube(cube=RubikCube.SOLVED).state
+	movements = []
+	for _ in range(depth):
+		movement = rng.choice(successors[movements[-2] if len(movements) > 1 else None,
+		                                 movements[-1] if movements else None])
+		state = RubikCube.MOVEMENTS[movement](state)
+		movements.append(movement)
+	return state, movements
+
+
+def sample(rng, min_depth, max_depth, optimal=False):
+	"""
+	Generates the record of a cube scrambled with between min_depth and max_depth movements.
+	Without optimal, the record has the length of the scramble (an upper bound of the distance, equal to it for most
+	short scrambles) and the best movement undoes the last one of the scramble. With optimal, both come from IDASolver's shortest solution.
+	:return: (bytes) Record
+	"""
+	state, movements = scramble(rng, rng.randint(min_depth, max_depth))
+	if optimal:
+		solution = IDASolver(cube=RubikCube.from_state(state)).solve(max_movements=len(movements))
+	else:
+		solution = [RubikCube.get_opposite_movement(movement) for movement in reversed(movements)]
+	best_movement = RubikCube.POSSIBLE_MOVEMENTS.index(solution[0]) if solution else NO_MOVEMENT
+	return bytes(state) + bytes((len(solution), best_movement))
+
+
+def npy_header(n_records):
+	"""
+	Header of a .npy file (format version 1.0) of n_records records of unsigned bytes
+	"""
+	header = "{'descr': '|u1', 'fortran_order': False, 'shape': (%d, %d), }" % (n_records, RECORD_SIZE)
+	# The data starts aligned to 64 bytes
+	header += ' ' * (-(len(NPY_MAGIC) + 2 + len(header) + 1) % 64) + '\n'
+	return NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+def generate_shard(arguments):
+	"""
+	Writes a shard, in a worker process
+	:param arguments: (path, shard, n_samples, min_depth, max_depth, seed, optimal)
+	:return: Number of the shard
+	"""
+	path, shard, n_samples, min_depth, max_depth, seed, optimal = arguments
+	rng = random.Random('%d-%d' % (seed, shard))
+	file_path = shard_path(path, shard)
+	new_path = file_path + '.new'
+	with open(new_path, 'wb') as file:
+		file.write(npy_header(n_samples))
+		for _ in range(n_samples):
+			file.write(sample(rng, min_depth, max_depth, optimal))
+	os.replace(new_path, file_path)
+	return shard
+
+
+def generate(path, n_samples, shard_size=1 << 20, min_depth=1, max_depth=20, seed=0, processes=None, optimal=False):
+	"""
+	Generates the samples into shards of path, one shard per task of a pool of processes
+	:param path: Directory of the shards
+	:param n_samples: Number of samples
+	:param shard_size: Samples per shard
+	:param min_depth: Fewest movements of the scrambles
+	:param max_depth: Most movements of the scrambles
+	:param seed: Seed of the dataset
+	:param processes: Worker processes. None for one per CPU
+	:param optimal: True to label the samples with the optimal distance (slow beyond 7 or 8 movements)
+	:return: Paths of the shards
+	"""
+	if not 0 <= min_depth <= max_depth < NO_MOVEMENT:
+		raise ValueError('Invalid depths ' + str(min_depth) + '-' + str(max_depth))
+	os.makedirs(path, exist_ok=True)
+	n_shards = -(-n_samples // shard_size)
+	tasks = [(path, shard, min(shard_size, n_samples - shard * shard_size), min_depth, max_depth, seed, optimal)
+	         for shard in range(n_shards) if not os.path.exists(shard_path(path, shard))]
+	if tasks:
+		with multiprocessing.Pool(processes) as pool:
+			for _ in pool.imap_unordered(generate_shard, tasks):
+				pass
+	return [shard_path(path, shard) for shard in range(n_shards)]
+
+
+class Shard:
+	"""
+	A shard of samples, mapped read only in memory
+	"""
+
+	def __init__(self, path):
+		self.file = open(path, 'rb')
+		magic = self.file.read(len(NPY_MAGIC))
+		if magic != NPY_MAGIC:
+			self.file.close()
+			raise ValueError('Not a shard of samples')
+		header_size, = struct.unpack('<H', self.file.read(2))
+		header = ast.literal_eval(self.file.read(header_size).decode('latin1'))
+		self.offset = len(NPY_MAGIC) + 2 + header_size
+		self.n_samples = header['shape'][0]
+		self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def __len__(self):
+		return self.n_samples
+
+	def __getitem__(self, i):
+		"""
+		Returns the sample i
+		:return: (state, distance, best movement) with best movement None for solved cubes
+		"""
+		if not 0 <= i < self.n_samples:
+			raise IndexError('Sample out of range')
+		start = self.offset + i * RECORD_SIZE
+		record = self.data[start:start + RECORD_SIZE]
+		movement = record[55]
+		return tuple(record[:54]), record[54], None if movement == NO_MOVEMENT else RubikCube.POSSIBLE_MOVEMENTS[movement]
+
+	def close(self):
+		self.data.close()
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+if __name__ == '__main__':
+	import argparse
+
+	parser = argparse.ArgumentParser(description='Generates training data of scrambled cubes')
+	parser.add_argument('path', help='Directory of the shards')
+	parser.add_argument('samples', type=int, help='Number of samples')
+	parser.add_argument('--shard-size', type=int, default=1 << 20, help='Samples per shard')
+	parser.add_argument('--min-depth', type=int, default=1, help='Fewest movements of the scrambles')
+	parser.add_argument('--max-depth', type=int, default=20, help='Most movements of the scrambles')
+	parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset')
+	parser.add_argument('--processes', type=int, help='Worker processes. One per CPU if missing')
+	parser.add_argument('--optimal', action='store_true', help='Label with the optimal distance (slow)')
+	arguments = parser.parse_args()
+
+	shards = generate(arguments.path, arguments.samples, shard_size=arguments.shard_size,
+	                  min_depth=arguments.min_depth, max_depth=arguments.max_depth, seed=arguments.seed,
+	                  processes=arguments.processes, optimal=arguments.optimal)
+	print(len(shards), "shards in", arguments.path)
@@ -0,0 +1,117 @@
+"""
+Transposition tables: the fewest movements with which every state of the cube has been reached, so the searches can
+cut off the branches reaching a state again with as many movements or more.
+A table can be given a capacity, in entries or in bytes, so long searches stay within a memory budget. Once it is full
+new states replace old ones following its replacement policy:
+	- 'depth': Entries live in a fixed array of slots indexed by the hash of the state. A state colliding with another
+	one replaces it only if it was reached with as many movements or less, as those cut off the bigger branches.
+	- 'lru': The least recently used entry is replaced.
+Without verify, a table keeps the 64 bit hash of every state (RubikCube.hash64) instead of its 54 bytes key, using less
+than half the memory but taking for the same state, once in a while, a different state with the same hash.
+"""
+from collections import OrderedDict
+
+POLICIES = ('depth', 'lru')
+# Approximate memory of every entry: the state key (87 bytes, 36 its hash) plus the slot or the ordered dict entry
+BYTES_PER_ENTRY = {'depth': 96, 'lru': 192}
+HASH_BYTES_PER_ENTRY = {'depth': 45, 'lru': 141}
+
+
+class TranspositionTable:
+	"""
+	Maps state keys (RubikCube.key) to the number of movements they were reached with
+	"""
+
+	def __init__(self, max_entries=None, max_bytes=None, policy='depth', verify=True):
+		"""
+		:param max_entries: Maximum number of entries. None for no limit
+		:param max_bytes: Approximate maximum memory of the entries. None for no limit
+		:param policy: 'depth' or 'lru', how entries are replaced once the table is full
+		:param verify: True to keep the whole keys, ruling out hash collisions. False to keep only their hashes
+		"""
+		if policy not in POLICIES:
+			raise ValueError('Invalid replacement policy ' + policy)
+		self.policy = policy
+		self.verify = verify
+		self.capacity = max_entries
+		if max_bytes is not None:
+			by_bytes = max_bytes // (BYTES_PER_ENTRY if verify else HASH_BYTES_PER_ENTRY)[policy]
+			self.capacity = by_bytes if self.capacity is None else min(self.capacity, by_bytes)
+		if self.capacity is not None and self.capacity < 1:
+			raise ValueError('The transposition table needs room for one entry at least')
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		if self.capacity is None:
+			self.__entries = {}
+		elif policy == 'lru':
+			self.__entries = OrderedDict()
+		else:
+			self.__keys = [None] * self.capacity
+			self.__depths = bytearray(self.capacity)
+			self.__length = 0
+
+	@property
+	def bounded(self):
+		return self.capacity is not None
+
+	def get(self, key, default=None):
+		"""
+		Returns the movements key was reached with, counting a hit or a miss
+		"""
+		if not self.verify:
+			key = hash(key)
+		if self.bounded and self.policy == 'depth':
+			slot = hash(key) % self.capacity
+			if self.__keys[slot] == key:
+				self.hits += 1
+				return self.__depths[slot]
+		else:
+			depth = self.__entries.get(key)
+			if depth is not None:
+				self.hits += 1
+				if self.bounded:
+					self.__entries.move_to_end(key)
+				return depth
+		self.misses += 1
+		return default
+
+	def __setitem__(self, key, depth):
+		if not self.verify:
+			key = hash(key)
+		if not self.bounded:
+			self.__entries[key] = depth
+		elif self.policy == 'lru':
+			self.__entries[key] = depth
+			self.__entries.move_to_end(key)
+			if len(self.__entries) > self.capacity:
+				self.__entries.popitem(last=False)
+				self.evictions += 1
+		else:
+			slot = hash(key) % self.capacity
+			old_key = self.__keys[slot]
+			if old_key is None:
+				self.__length += 1
+			elif old_key != key:
+				if depth > self.__depths[slot]:
+					return
+				self.evictions += 1
+			self.__keys[slot] = key
+			self.__depths[slot] = depth
+
+	def __contains__(self, key):
+		if not self.verify:
+			key = hash(key)
+		if self.bounded and self.policy == 'depth':
+			return self.__keys[hash(key) % self.capacity] == key
+		return key in self.__entries
+
+	def __len__(self):
+		if self.bounded and self.policy == 'depth':
+			return self.__length
+		return len(self.__entries)
+
+	@property
+	def stats(self):
+		return {'entries': len(self), 'capacity': self.capacity, 'hits': self.hits, 'misses': self.misses,
+		        'evictions': self.evictions}
@@ -1,17 +1,4 @@
-from cubik import HeuristicSolver
-import json
+from cubik.batch import main
 
-solver = HeuristicSolver()
-try:
-	solver.solve()
-except KeyboardInterrupt:
-	pass
-
-try:
-	with open("solution.json", 'w') as file:
-		json.dump(solver.solutions, file, indent=4)
-	print(solver.solutions)
-except Exception as e:
-	with open('solution.json', 'w') as file:
-		file.write("Error :(\n")
-		file.write(str(e))
\ No newline at end of file
+if __name__ == '__main__':
+	main()
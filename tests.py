@@ -1,6 +1,37 @@
+import contextlib
+import io
+import json
+import mmap
+import os
+import random
+import tempfile
+import threading
 import unittest
 
-from Cubik import RubikCube
+from cubik import RubikCube, BacktrackingSolver, HeuristicSolver, IDASolver, BidirectionalSolver, KociembaSolver
+from cubik.cubik import get_successors, branching_factor
+from cubik.cubie import CubieCube, get_move_table, permutation_parity, random_states
+from cubik.kociemba import Tables, SLICE_GOAL
+from cubik.metrics import SearchMetrics, SearchStopped, PRUNE_REASONS, print_progress
+from cubik.batch import solve_batch, finished_ids
+from cubik.cube_array import CubeArray, numpy
+from cubik import endgame
+from cubik.endgame import EndgameTable, build as build_endgame
+from cubik.training_data import Shard, generate, npy_header
+from cubik.transposition import TranspositionTable, BYTES_PER_ENTRY, HASH_BYTES_PER_ENTRY
+from cubik.pattern_database import PiecesPattern, PatternDatabase, build, HEADER, _expand, _read_header
+from cubik.solution_cache import SolutionCache
+
+
+def scrambled(movements):
+	"""
+	Returns a solved cube after the movements, as the cube to solve (no movements applied)
+	"""
+	cube = RubikCube(cube=RubikCube.SOLVED)
+	for movement in movements:
+		cube.do_movement(movement)
+	cube.movements_applied = []
+	return cube
 
 
 class TestRubikCube(unittest.TestCase):
@@ -151,3 +182,908 @@ class TestRubikCube(unittest.TestCase):
 			cube.S1()
 		last_state = cube.json
 		self.assertEqual(first_state, last_state)
+
+
+class TestMovementPermutations(unittest.TestCase):
+
+	def test_movements_are_permutations(self):
+		for movement, permutation in RubikCube.PERMUTATIONS.items():
+			self.assertEqual(sorted(permutation), list(range(54)), movement)
+
+	def test_opposite_movements_cancel(self):
+		cube = RubikCube()
+		first_state = cube.state
+		for movement in RubikCube.POSSIBLE_MOVEMENTS:
+			cube.do_movement(movement)
+			cube.do_movement(RubikCube.get_opposite_movement(movement))
+			self.assertEqual(first_state, cube.state, movement)
+
+	def test_cube_view(self):
+		cube = RubikCube(cube=RubikCube.DEBUG)
+		self.assertEqual(cube.cube, RubikCube.DEBUG)
+		cube.do_movement('R')
+		self.assertEqual(cube.cube[0][2], 'b2')
+		self.assertEqual(cube.cube[4][0], 'e6')
+		cube.undo()
+		self.assertEqual(cube.cube, RubikCube.DEBUG)
+
+	def test_state_key(self):
+		cube = RubikCube()
+		other = RubikCube(cube=cube.cube)
+		self.assertEqual(cube.key, other.key)
+		self.assertEqual(len(cube.key), 54)
+		other.do_movement('U')
+		self.assertNotEqual(cube.key, other.key)
+		other.undo()
+		self.assertEqual(cube.key, other.key)
+
+
+class TestIDASolver(unittest.TestCase):
+
+	def test_solved_states_have_no_heuristic(self):
+		solver = IDASolver(scrambled([]))
+		for state in RubikCube.solved_states():
+			self.assertEqual(solver.get_heuristic(state), 0)
+
+	def test_optimal_solution(self):
+		cube = scrambled(['R', 'U', 'F1'])
+		solution = IDASolver(cube).solve()
+		self.assertEqual(len(solution), 3)
+		for movement in solution:
+			cube.do_movement(movement)
+		self.assertTrue(cube.solved)
+
+	def test_rotated_cube_is_solved(self):
+		cube = scrambled(RubikCube.ROTATIONS['x'] + ['U'])
+		self.assertEqual(IDASolver(cube).solve(), ['U1'])
+
+
+class TestHeuristicSolver(unittest.TestCase):
+
+	def test_solutions(self):
+		for randomize in (True, False):
+			cube = scrambled(['R', 'U1'])
+			solver = HeuristicSolver(cube=cube, randomize=randomize)
+			solver.LIMIT = 2
+			solver.solve()
+			self.assertLessEqual(solver.smallest_solution, 3)
+			self.assertEqual(cube.state, scrambled(['R', 'U1']).state)
+			for solution in solver.solutions[solver.smallest_solution]:
+				solved = scrambled(['R', 'U1'])
+				for movement in solution:
+					solved.do_movement(movement)
+				self.assertTrue(solved.solved)
+
+	def test_rotated_solution(self):
+		cube = scrambled(['R', 'L1', 'M1', 'U'])
+		self.assertEqual(cube.misplaced, 12)
+		solver = HeuristicSolver(cube=cube)
+		solver.LIMIT = 1
+		solver.solve()
+		self.assertEqual(solver.solutions[1], [['U1']])
+
+	def test_children_heuristics(self):
+		solver = HeuristicSolver()
+		for cube in (RubikCube(), RubikCube(cube=RubikCube.SOLVED)):
+			expected = []
+			for movement in RubikCube.POSSIBLE_MOVEMENTS:
+				cube.do_movement(movement)
+				expected.append(sum(1 for i, cell in enumerate(cube.state) if i % 9 != 4 and cell == cube.state[i // 9 * 9 + 4]))
+				cube.undo()
+			self.assertEqual(solver.get_children_heuristics(cube.state), expected)
+			self.assertEqual(solver.get_children_heuristics(cube.key), expected)
+
+	def test_paths(self):
+		solver = HeuristicSolver(cube=scrambled(['F', 'M', 'D1']))
+		solver.LIMIT = 1
+		solver.solve()
+		for node in range(1, len(solver.depths)):
+			cube = scrambled(['F', 'M', 'D1'])
+			path = solver.get_path(node)
+			self.assertEqual(len(path), solver.depths[node])
+			for movement in path:
+				cube.do_movement(movement)
+			self.assertEqual(cube.key, bytes(solver.states[node * 54:(node + 1) * 54]))
+
+
+class TestTranspositionTable(unittest.TestCase):
+
+	def test_unbounded(self):
+		table = TranspositionTable()
+		for i in range(1000):
+			table[bytes([i % 256, i // 256])] = i % 20
+		self.assertEqual(len(table), 1000)
+		self.assertEqual(table.get(bytes([3, 0])), 3)
+		self.assertIsNone(table.get(b'missing'))
+		self.assertEqual((table.hits, table.misses, table.evictions), (1, 1, 0))
+
+	def test_depth_policy(self):
+		table = TranspositionTable(max_entries=1)
+		table[b'a'] = 5
+		table[b'b'] = 7
+		self.assertEqual((table.get(b'a'), table.get(b'b')), (5, None))
+		table[b'b'] = 3
+		self.assertEqual((table.get(b'a'), table.get(b'b')), (None, 3))
+		self.assertEqual((len(table), table.evictions), (1, 1))
+
+	def test_lru_policy(self):
+		table = TranspositionTable(max_entries=2, policy='lru')
+		table[b'a'] = 1
+		table[b'b'] = 2
+		table.get(b'a')
+		table[b'c'] = 3
+		self.assertNotIn(b'b', table)
+		self.assertEqual((table.get(b'a'), table.get(b'c')), (1, 3))
+		self.assertEqual((len(table), table.evictions), (2, 1))
+
+	def test_capacity_in_bytes(self):
+		self.assertEqual(TranspositionTable(max_bytes=100 * BYTES_PER_ENTRY['lru'], policy='lru').capacity, 100)
+		self.assertEqual(TranspositionTable(max_entries=10, max_bytes=1 << 20).capacity, 10)
+		with self.assertRaises(ValueError):
+			TranspositionTable(max_bytes=1)
+		with self.assertRaises(ValueError):
+			TranspositionTable(policy='random')
+
+	def test_hashes(self):
+		cube = RubikCube()
+		table = TranspositionTable(max_entries=10, verify=False)
+		table[cube.key] = 4
+		self.assertIn(cube.key, table)
+		self.assertEqual(table.get(cube.key), 4)
+		self.assertEqual(cube.hash64, hash(cube.key))
+		self.assertLess(cube.hash64.bit_length(), 65)
+		self.assertEqual(TranspositionTable(max_bytes=1 << 20, verify=False).capacity,
+		                 (1 << 20) // HASH_BYTES_PER_ENTRY['depth'])
+		past_states = []
+		for verify in (True, False):
+			solver = HeuristicSolver(cube=cube, randomize=False, verify=verify)
+			solver.LIMIT = 1
+			solver.solve()
+			past_states.append(solver.past_states)
+		self.assertEqual({hash(key) for key in past_states[0]}, past_states[1])
+		solver = BacktrackingSolver(cube=cube, max_states=1000, verify=False)
+		solver.solve(movements_left=2)
+		self.assertFalse(solver.states.verify)
+		self.assertGreater(len(solver.states), 0)
+
+	def test_bounded_solver(self):
+		for replacement in ('depth', 'lru'):
+			cube = scrambled(['R', 'U', 'F1'])
+			solver = BacktrackingSolver(cube=cube, max_states=500, replacement=replacement)
+			solver.solve(movements_left=3)
+			self.assertEqual(sorted(solver.solved_solutions), [3])
+			self.assertLessEqual(len(solver.states), 500)
+			self.assertGreater(solver.states.evictions, 0)
+
+
+class TestParallelBacktrackingSolver(unittest.TestCase):
+
+	def test_same_solutions(self):
+		sequential = BacktrackingSolver(cube=scrambled(['L', 'E1', 'B']))
+		sequential.solve(movements_left=3)
+		for split_depth in (1, 2):
+			parallel = BacktrackingSolver(cube=scrambled(['L', 'E1', 'B']))
+			parallel.solve(movements_left=3, processes=2, split_depth=split_depth)
+			self.assertEqual(parallel.smallest_solution, sequential.smallest_solution)
+			self.assertEqual(sorted(map(tuple, parallel.solved_solutions[3])),
+			                 sorted(map(tuple, sequential.solved_solutions[3])))
+			self.assertGreater(parallel.states.hits + parallel.states.misses, 0)
+
+	def test_worker_transposition_tables(self):
+		# Branches two movements deep only repeat states of other branches solved by the same worker
+		cube = scrambled(['R', 'U', 'F1', 'L'])
+		parallel = BacktrackingSolver(cube=cube)
+		parallel.solve(movements_left=4, processes=2, split_depth=2)
+		self.assertGreater(parallel.states.hits, 0)
+		self.assertGreater(parallel.stats['tables']['transposition'], len(parallel.states))
+		self.assertEqual(parallel.stats['transposition']['entries'], parallel.stats['tables']['transposition'])
+
+
+class TestPatternDatabase(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, 'corners.pdb')
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_pattern_indexes(self):
+		for pattern in (PiecesPattern('corners', [0, 1, 2]), PiecesPattern('edges', [3, 7])):
+			for index in range(0, pattern.size, 7):
+				self.assertEqual(pattern.encode(*pattern.decode(index)), index)
+
+	def test_resumed_build(self):
+		pattern = PiecesPattern('corners', [0, 1, 2])
+		while not build(pattern, self.path, chunk_size=1000, max_chunks=3):
+			pass
+		with open(self.path, 'rb') as file:
+			resumed = file.read()
+		os.remove(self.path)
+		self.assertTrue(build(pattern, self.path))
+		with open(self.path, 'rb') as file:
+			self.assertEqual(resumed, file.read())
+
+	def test_build_interrupted_in_a_chunk(self):
+		# Every chunk is first scanned by a build stopped before saving its progress, then scanned again resuming
+		pattern = PiecesPattern('corners', [0, 1, 2])
+		while not build(pattern, self.path, chunk_size=1000, max_chunks=1):
+			with open(self.path, 'r+b') as file, mmap.mmap(file.fileno(), 0) as data:
+				name, size, depth, position, found, complete = _read_header(file)
+				_expand(pattern, data, depth, position, min(position + 1000, size))
+		with open(self.path, 'rb') as file:
+			interrupted = file.read()
+		os.remove(self.path)
+		build(pattern, self.path)
+		with open(self.path, 'rb') as file:
+			built = file.read()
+		self.assertEqual(interrupted[HEADER.size:], built[HEADER.size:])
+		self.assertFalse(any(byte & 0xF == 0xF or byte >> 4 == 0xF for byte in interrupted[HEADER.size:]))
+
+	def test_lookup(self):
+		pattern = PiecesPattern('edges', [0, 1, 2])
+		build(pattern, self.path)
+		with PatternDatabase(self.path) as pattern_database:
+			cube = RubikCube(cube=RubikCube.SOLVED)
+			self.assertEqual(pattern_database.lookup(cube.state), 0)
+			for movement in ['R', 'U', 'M']:
+				cube.do_movement(movement)
+				self.assertLessEqual(pattern_database.lookup(cube.state), len(cube.movements_applied))
+			self.assertEqual(pattern_database.lookup(cube.state), 3)
+			cube.movements_applied = []
+			solution = IDASolver(cube, pattern_databases=[pattern_database]).solve()
+			self.assertEqual(len(solution), 3)
+
+
+class TestKociembaSolver(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.directory = tempfile.TemporaryDirectory()
+		Tables(cls.directory.name)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.directory.cleanup()
+
+	def test_tables_are_cached(self):
+		self.assertTrue(os.listdir(self.directory.name))
+		tables = Tables(self.directory.name)
+		self.assertEqual(tables.twist_slice_pruning[SLICE_GOAL], 0)
+
+	def test_solution(self):
+		random.seed(0)
+		for _ in range(3):
+			cube = RubikCube()
+			solution = KociembaSolver(cube, max_length=34, tables_path=self.directory.name).solve()
+			self.assertLessEqual(len(solution), 34)
+			for movement in solution:
+				self.assertIn(movement, RubikCube.POSSIBLE_MOVEMENTS)
+				cube.do_movement(movement)
+			self.assertTrue(cube.solved)
+
+	def test_moved_centres(self):
+		cube = RubikCube(cube=RubikCube.SOLVED)
+		for movement in ['M', 'E1', 'R', 'S']:
+			cube.do_movement(movement)
+		solution = KociembaSolver(cube, tables_path=self.directory.name).solve()
+		for movement in solution:
+			cube.do_movement(movement)
+		self.assertTrue(cube.solved)
+
+
+class TestCubieCube(unittest.TestCase):
+
+	def test_conversion(self):
+		for _ in range(20):
+			cube = RubikCube()
+			self.assertEqual(CubieCube.from_cube(cube).to_state(), cube.state)
+		self.assertEqual(CubieCube().to_cube().cube, RubikCube.SOLVED)
+
+	def test_movements(self):
+		cube = RubikCube()
+		cubie_cube = CubieCube.from_cube(cube)
+		for movement in RubikCube.POSSIBLE_MOVEMENTS * 2:
+			cube.do_movement(movement)
+			cubie_cube.do_movement(movement)
+			self.assertEqual(cubie_cube.to_state(), cube.state)
+
+	def test_coordinates(self):
+		cube = CubieCube.from_cube(RubikCube())
+		copy = CubieCube()
+		copy.twist, copy.flip, copy.corners, copy.edges = cube.twist, cube.flip, cube.corners, cube.edges
+		self.assertEqual((copy.cp, copy.co, copy.ep, copy.eo), (cube.cp, cube.co, cube.ep, cube.eo))
+
+	def test_move_tables(self):
+		cube = CubieCube.from_cube(RubikCube())
+		twist_moves = get_move_table('twist')
+		corners_moves = get_move_table('corners')
+		twist, corners = cube.twist, cube.corners
+		for i, movement in enumerate(RubikCube.POSSIBLE_MOVEMENTS):
+			cube.do_movement(movement)
+			twist = twist_moves[twist * 18 + i]
+			corners = corners_moves[corners * 18 + i]
+			self.assertEqual((twist, corners), (cube.twist, cube.corners))
+
+
+class TestRandomStates(unittest.TestCase):
+
+	def invariants(self, state):
+		cube = CubieCube.from_state(state)
+		return (permutation_parity(cube.cp) ^ permutation_parity(cube.ep) ^ permutation_parity(cube.centres),
+		        sum(cube.co) % 3, sum(cube.eo) % 2)
+
+	def test_invariants_of_moved_cubes(self):
+		cube = RubikCube(cube=RubikCube.SOLVED)
+		for _ in range(300):
+			cube.do_movement(random.choice(RubikCube.POSSIBLE_MOVEMENTS))
+			self.assertEqual(self.invariants(cube.state), (0, 0, 0))
+
+	def test_random_states_are_solvable(self):
+		for state in random_states(200):
+			self.assertEqual(self.invariants(state), (0, 0, 0))
+			self.assertEqual(sorted(state), sorted(RubikCube(cube=RubikCube.SOLVED).state))
+
+	def test_seed(self):
+		self.assertEqual(list(random_states(5, seed=3)), list(random_states(5, seed=3)))
+		self.assertNotEqual(list(random_states(5, seed=3)), list(random_states(5, seed=4)))
+		cube, other = RubikCube(), RubikCube()
+		cube.generate_random_cube(seed=7)
+		other.generate_random_cube(seed=7)
+		self.assertEqual(cube.state, other.state)
+
+
+class TestSolvability(unittest.TestCase):
+
+	def changed(self, *cells):
+		"""
+		Returns a random cube with the colours of cells moved one place forward, I.E: changed((1, 2)) swaps them
+		"""
+		cube = RubikCube()
+		state = list(cube.state)
+		for group in cells:
+			colours = [state[cell] for cell in group]
+			for cell, colour in zip(group, colours[-1:] + colours[:-1]):
+				state[cell] = colour
+		return RubikCube.from_state(tuple(state))
+
+	def assertUnsolvable(self, cube, message):
+		with self.assertRaisesRegex(ValueError, message):
+			cube.check()
+
+	def test_random_cubes_are_solvable(self):
+		for _ in range(50):
+			RubikCube().check()
+
+	def test_twisted_corner(self):
+		self.assertUnsolvable(self.changed(RubikCube.CORNERS[0]), 'Twisted corner')
+
+	def test_flipped_edge(self):
+		self.assertUnsolvable(self.changed(RubikCube.EDGES[0]), 'Flipped edge')
+
+	def test_swapped_edges(self):
+		self.assertUnsolvable(self.changed(*zip(RubikCube.EDGES[0], RubikCube.EDGES[1])), 'parity')
+
+	def test_impossible_centres(self):
+		self.assertUnsolvable(self.changed(RubikCube.CENTRES[:2]), 'centres')
+
+	def test_impossible_colours(self):
+		self.assertUnsolvable(self.changed((RubikCube.CORNERS[0][0], RubikCube.CORNERS[1][1])), 'Corrupted|Impossible')
+		cube = RubikCube()
+		cube.state = (cube.state[1],) + cube.state[1:]
+		self.assertUnsolvable(cube, 'Corrupted')
+
+	def test_solvers_reject_unsolvable_cubes(self):
+		with self.assertRaises(ValueError):
+			IDASolver(cube=self.changed(RubikCube.CORNERS[0])).solve()
+
+
+class TestBatch(unittest.TestCase):
+	LINES = [json.dumps({'id': 'a', 'scramble': 'R U1'}), json.dumps({'scramble': ['M', 'F']}), 'not json', '',
+	         json.dumps({'id': 'b', 'state': [1] * 54})]
+
+	def test_results(self):
+		output = io.StringIO()
+		self.assertEqual(solve_batch(self.LINES, output, processes=1, solver='ida', max_length=3), 2)
+		results = {result['id']: result for result in map(json.loads, output.getvalue().splitlines())}
+		self.assertEqual(sorted(results, key=str), [1, 2, 'a', 'b'])
+		self.assertEqual((results['a']['status'], results['a']['length']), ('solved', 2))
+		self.assertEqual(results[1]['solution'], ['F1', 'M1'])
+		self.assertGreater(results[1]['nodes'], 0)
+		self.assertEqual((results[2]['status'], results['b']['status']), ('error', 'error'))
+
+	def test_malformed_lines(self):
+		lines = [json.dumps({'state': 5}), json.dumps({'scramble': [['R']]}), json.dumps({'scramble': 7}),
+		         json.dumps({'id': ['x'], 'scramble': 'R'}), json.dumps({'id': 'a', 'scramble': 'R'})]
+		output = io.StringIO()
+		self.assertEqual(solve_batch(lines, output, processes=1, solver='ida', max_length=3), 1)
+		results = {result['id']: result for result in map(json.loads, output.getvalue().splitlines())}
+		self.assertEqual(sorted(results, key=str), [0, 1, 2, 3, 'a'])
+		self.assertEqual([results[i]['status'] for i in range(4)], ['error'] * 4)
+		self.assertEqual(results['a']['status'], 'solved')
+
+	def test_resume(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'solutions.jsonl')
+			with open(path, 'w') as output:
+				solve_batch(self.LINES[:2], output, processes=1, solver='ida', max_length=3)
+			with open(path, 'r+') as output:
+				output.truncate(len(output.readline()) + 10)
+			done = finished_ids(path)
+			self.assertEqual(len(done), 1)
+			with open(path, 'a') as output:
+				solve_batch(self.LINES[:2], output, processes=1, solver='ida', max_length=3, done=done)
+			with open(path) as output:
+				self.assertEqual(sorted((json.loads(line)['id'] for line in output), key=str), [1, 'a'])
+
+
+class TestTrainingData(unittest.TestCase):
+
+	def test_deterministic_shards(self):
+		with tempfile.TemporaryDirectory() as directory:
+			one, two = os.path.join(directory, 'one'), os.path.join(directory, 'two')
+			shards = generate(one, 250, shard_size=100, max_depth=6, seed=5, processes=1)
+			self.assertEqual(len(shards), 3)
+			generate(two, 250, shard_size=100, max_depth=6, seed=5, processes=2)
+			for shard in range(3):
+				with open(shards[shard], 'rb') as file, open(os.path.join(two, os.path.basename(shards[shard])), 'rb') as other:
+					self.assertEqual(file.read(), other.read())
+			with Shard(shards[2]) as shard:
+				self.assertEqual(len(shard), 50)
+
+	def test_samples(self):
+		with tempfile.TemporaryDirectory() as directory:
+			path, = generate(directory, 60, min_depth=0, max_depth=3, processes=1, optimal=True)
+			with Shard(path) as shard:
+				for i in range(len(shard)):
+					state, distance, movement = shard[i]
+					cube = RubikCube.from_state(state)
+					cube.check()
+					self.assertEqual(cube.solved, movement is None)
+					if movement is not None:
+						self.assertEqual(len(IDASolver(cube=cube).solve(max_movements=3)), distance)
+						cube.do_movement(movement)
+						self.assertEqual(len(IDASolver(cube=cube).solve(max_movements=3)), distance - 1)
+
+	def test_scramble_lengths(self):
+		# Scrambles never have a redundant sequence of 3 movements or less
+		with tempfile.TemporaryDirectory() as directory:
+			path, = generate(directory, 100, min_depth=1, max_depth=3, seed=2, processes=1)
+			with Shard(path) as shard:
+				for i in range(len(shard)):
+					state, length, movement = shard[i]
+					self.assertEqual(len(IDASolver(cube=RubikCube.from_state(state)).solve(max_movements=3)), length)
+
+	def test_npy_header(self):
+		for n_records in (0, 1, 10 ** 9):
+			self.assertEqual(len(npy_header(n_records)) % 64, 0)
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestCubeArray(unittest.TestCase):
+
+	def setUp(self):
+		self.cubes = [RubikCube() for _ in range(30)]
+
+	def test_conversion(self):
+		cubes = CubeArray.from_cubes(self.cubes).to_cubes()
+		self.assertEqual([cube.state for cube in cubes], [cube.state for cube in self.cubes])
+
+	def test_movements(self):
+		array = CubeArray.from_cubes(self.cubes)
+		array.do_movement('R')
+		movements = [random.choice(RubikCube.POSSIBLE_MOVEMENTS) for _ in self.cubes]
+		array.do_movements(movements)
+		for cube, movement, state in zip(self.cubes, movements, array.to_cubes()):
+			cube.do_movement('R')
+			cube.do_movement(movement)
+			self.assertEqual(cube.state, state.state)
+		with self.assertRaises(ValueError):
+			array.do_movements(movements[1:])
+
+	def test_children(self):
+		children = CubeArray.from_cubes(self.cubes[:2]).children()
+		self.assertEqual(len(children), 36)
+		cube = self.cubes[1]
+		for j, movement in enumerate(RubikCube.POSSIBLE_MOVEMENTS):
+			cube.do_movement(movement)
+			self.assertEqual(tuple(children.states[18 + j]), cube.state)
+			cube.undo()
+
+	def test_solved(self):
+		array = CubeArray.solved_cubes(4)
+		array.do_movements(['R', 'M', 'U1', 'E'])
+		array.do_movements(['R1', 'L', 'U', 'E1'])
+		self.assertEqual(array.solved.tolist(), [True, False, True, True])
+		self.assertFalse(CubeArray.from_cubes(self.cubes).solved.any())
+
+
+class TestSymmetries(unittest.TestCase):
+
+	def test_canonical_state(self):
+		self.assertEqual(len({symmetry for symmetry, movements in RubikCube.SYMMETRIES}), 48)
+		cube = RubikCube()
+		key, symmetry = RubikCube.canonical(cube.state)
+		self.assertEqual(bytes(RubikCube.SYMMETRY_GETTERS[symmetry](cube.state)), key)
+		for getter in RubikCube.SYMMETRY_GETTERS:
+			self.assertEqual(RubikCube.canonical(getter(cube.state))[0], key)
+		self.assertNotEqual(RubikCube().canonical_key, key)
+		self.assertEqual(len({RubikCube.canonical(state)[0] for state in RubikCube.solved_states()}), 1)
+
+	def test_mapped_movements(self):
+		state = RubikCube().state
+		movements = [random.choice(RubikCube.POSSIBLE_MOVEMENTS) for _ in range(20)]
+		for symmetry, getter in enumerate(RubikCube.SYMMETRY_GETTERS):
+			transformed, original = getter(state), state
+			for movement in movements:
+				transformed = RubikCube.MOVEMENTS[movement](transformed)
+			for movement in RubikCube.map_movements(movements, symmetry):
+				original = RubikCube.MOVEMENTS[movement](original)
+			self.assertEqual(getter(original), transformed)
+
+	def test_solvers(self):
+		cube = scrambled(['R', 'U', 'F1'])
+		solver = BacktrackingSolver(cube=cube, symmetry=True)
+		solver.solve(movements_left=3)
+		self.assertEqual(solver.smallest_solution, 3)
+		solver = HeuristicSolver(cube=cube, symmetry=True)
+		solver.LIMIT = 2
+		solver.solve()
+		self.assertLessEqual(solver.smallest_solution, 3)
+
+
+
+class TestMovementPruning(unittest.TestCase):
+
+	def test_successors(self):
+		successors = get_successors()
+		self.assertEqual(successors[None, None], RubikCube.POSSIBLE_MOVEMENTS)
+		for movement in RubikCube.POSSIBLE_MOVEMENTS:
+			self.assertNotIn(RubikCube.get_opposite_movement(movement), successors[None, movement])
+			if (movement, movement) in successors:
+				self.assertNotIn(movement, successors[movement, movement])
+		# Commuting movements are tried in one order only
+		self.assertIn('D', successors[None, 'U'])
+		self.assertNotIn('U', successors[None, 'D'])
+		self.assertLess(branching_factor(), 17)
+
+	def test_optimal_solutions(self):
+		random.seed(3)
+		for _ in range(5):
+			cube = scrambled([random.choice(RubikCube.POSSIBLE_MOVEMENTS) for _ in range(4)])
+			unpruned = BacktrackingSolver(cube=cube)
+			unpruned.generate_movements = lambda last=None, previous=None: RubikCube.POSSIBLE_MOVEMENTS
+			unpruned.solve(movements_left=4)
+			solver = BacktrackingSolver(cube=cube)
+			solver.solve(movements_left=4)
+			self.assertEqual(solver.smallest_solution, unpruned.smallest_solution)
+			self.assertEqual(len(IDASolver(cube).solve()), unpruned.smallest_solution)
+
+
+class TestTurnMetrics(unittest.TestCase):
+
+	def test_half_turns(self):
+		cube = RubikCube()
+		for movement in RubikCube.HALF_TURNS:
+			state = cube.state
+			self.assertEqual(RubikCube.get_opposite_movement(movement), movement)
+			cube.do_movement(movement)
+			self.assertEqual(cube.state, RubikCube.MOVEMENTS[movement[0]](RubikCube.MOVEMENTS[movement[0]](state)))
+			cube.undo()
+			self.assertEqual(cube.state, state)
+			cubie_cube = CubieCube.from_state(state)
+			cubie_cube.do_movement(movement)
+			self.assertEqual(cubie_cube.to_state(), RubikCube.MOVEMENTS[movement](state))
+
+	def test_count_movements(self):
+		movements = ['U', 'R2', 'M', 'E2']
+		self.assertEqual(RubikCube.count_movements(movements, 'qtm'), 9)
+		self.assertEqual(RubikCube.count_movements(movements, 'htm'), 6)
+		self.assertEqual(RubikCube.count_movements(movements, 'qstm'), 6)
+		self.assertEqual(RubikCube.count_movements(movements, 'stm'), 4)
+		self.assertRaises(ValueError, RubikCube.count_movements, movements, 'atm')
+
+	def test_solvers(self):
+		cube = scrambled(['R2', 'U', 'F2'])
+		self.assertEqual(IDASolver(cube, metric='stm').solve(), ['F2', 'U1', 'R2'])
+		self.assertEqual(len(IDASolver(cube).solve()), 5)
+		solver = BacktrackingSolver(cube=cube, metric='htm')
+		solver.solve(movements_left=3)
+		self.assertEqual(solver.smallest_solution, 3)
+		solver = HeuristicSolver(cube=cube, metric='stm')
+		solver.LIMIT = 2
+		solver.solve()
+		self.assertEqual(solver.smallest_solution, 3)
+		for movements in solver.solutions.values():
+			for solution in movements:
+				self.assertTrue(set(solution) <= set(RubikCube.METRICS['stm']))
+		self.assertRaises(ValueError, IDASolver, cube, metric='atm')
+		self.assertGreater(branching_factor(metric='stm'), branching_factor(metric='qstm'))
+
+
+class TestSearchMetrics(unittest.TestCase):
+
+	def test_no_output(self):
+		output = io.StringIO()
+		with contextlib.redirect_stdout(output):
+			BacktrackingSolver(cube=scrambled(['R', 'U'])).solve(movements_left=3)
+			solver = HeuristicSolver(cube=scrambled(['R', 'U']))
+			solver.LIMIT = 2
+			solver.solve()
+			IDASolver(scrambled(['R', 'U'])).solve()
+		self.assertEqual(output.getvalue(), '')
+
+	def test_stats(self):
+		reports = []
+		solver = BacktrackingSolver(cube=scrambled(['R', 'U', 'F1']), progress=reports.append, progress_interval=0)
+		solver.solve(movements_left=4)
+		stats = solver.stats
+		self.assertEqual(solver.n_movements_done, stats['nodes'])
+		self.assertGreater(stats['nodes'], SearchMetrics.CHECK_EVERY)
+		self.assertEqual(set(stats['prunes']), set(PRUNE_REASONS))
+		self.assertGreater(stats['prunes']['depth'], 0)
+		self.assertGreater(stats['prunes']['bound'], 0)
+		self.assertEqual(stats['tables']['transposition'], len(solver.states))
+		self.assertTrue(reports)
+		self.assertLessEqual(reports[-1]['nodes'], stats['nodes'])
+		output = io.StringIO()
+		print_progress(reports[-1], file=output)
+		self.assertIn('nodes', output.getvalue())
+
+		# Rate limited
+		n_reports = len(reports)
+		solver = IDASolver(scrambled(['R', 'U', 'F1']), progress=reports.append, progress_interval=3600)
+		solver.solve()
+		self.assertGreater(solver.stats['prunes']['bound'], 0)
+		self.assertEqual(solver.stats['bound'], 3)
+		self.assertEqual(len(reports), n_reports)
+
+		# Every solve counts from zero
+		stats = solver.stats
+		solver.solve()
+		self.assertEqual(solver.stats['nodes'], stats['nodes'])
+		self.assertEqual(solver.stats['prunes'], stats['prunes'])
+
+
+class TestAnytimeSolving(unittest.TestCase):
+
+	def test_node_budget(self):
+		cube = scrambled(['R', 'U', 'F1', 'L', 'D'])
+		solver = BacktrackingSolver(cube=cube)
+		self.assertIsNone(solver.solve(movements_left=6, max_nodes=500))
+		self.assertEqual(solver.stats['stopped'], 'nodes')
+		self.assertEqual(solver.n_movements_done, 500)
+		self.assertEqual(cube.movements_applied, [])
+		self.assertIsNone(IDASolver(cube).solve(max_nodes=500))
+
+		solver = HeuristicSolver(cube=cube, randomize=False)
+		solution = solver.solve(max_nodes=2000)
+		self.assertEqual(solver.stats['stopped'], 'nodes')
+		self.assertEqual(solution, solver.best_solution)
+		if solution is not None:
+			self.assertEqual(len(solution), solver.smallest_solution)
+
+	def test_best_solution_is_kept(self):
+		solver = BacktrackingSolver(cube=scrambled(['R', 'U']))
+		solution = solver.solve(movements_left=3)
+		self.assertEqual(len(solution), 2)
+		self.assertEqual(solver.shortest_solution['solution'], solution)
+		self.assertEqual(solver.shortest_solution['solution'], solution)
+		self.assertIsNone(solver.stats['stopped'])
+
+	def test_solve_again(self):
+		# A stopped search doesn't leave its unfinished states cutting off the next one
+		solver = BacktrackingSolver(cube=scrambled(['L', 'R', 'U', 'E1']))
+		self.assertIsNone(solver.solve(movements_left=4, max_nodes=1500))
+		self.assertEqual(solver.solve(movements_left=4),
+		                 BacktrackingSolver(cube=scrambled(['L', 'R', 'U', 'E1'])).solve(movements_left=4))
+		solver.cube.do_movement('R')
+		solver.solve(movements_left=1)
+		self.assertEqual(solver.search_start, 1)
+
+		solver = HeuristicSolver(cube=scrambled(['R', 'U']), randomize=False)
+		solver.solve(max_nodes=3)
+		self.assertEqual(solver.solve(), ['U1', 'R1'])
+		self.assertIsNone(solver.stats['stopped'])
+
+	def test_solved_cube(self):
+		for movements in ([], ['R', 'R1']):
+			solver = HeuristicSolver(cube=scrambled(movements))
+			self.assertEqual(solver.solve(), [])
+			self.assertEqual(solver.solutions, {0: [[]]})
+			self.assertEqual(BacktrackingSolver(cube=scrambled(movements)).solve(movements_left=2), [])
+
+	def test_time_limit_and_cancellation(self):
+		cube = RubikCube()
+		solver = IDASolver(cube)
+		self.assertIsNone(solver.solve(time_limit=0.2))
+		self.assertEqual(solver.stats['stopped'], 'time')
+		self.assertLess(solver.stats['seconds'], 1)
+		cancel = threading.Event()
+		threading.Timer(0.2, cancel.set).start()
+		solver = HeuristicSolver(cube=cube)
+		solver.solve(cancel=cancel)
+		self.assertEqual(solver.stats['stopped'], 'cancelled')
+		self.assertLess(solver.stats['seconds'], 1)
+		solver = BacktrackingSolver(cube=cube)
+		solver.solve(movements_left=20, processes=2, time_limit=0.5)
+		self.assertEqual(solver.stats['stopped'], 'time')
+		self.assertLess(solver.stats['seconds'], 2)
+
+	def test_poll(self):
+		cancel = threading.Event()
+		metrics = SearchMetrics()
+		metrics.restart(cancel=cancel)
+		for _ in range(2 * SearchMetrics.CHECK_EVERY):
+			metrics.poll()
+		cancel.set()
+		for _ in range(SearchMetrics.CHECK_EVERY - 1):
+			metrics.poll()
+		self.assertRaises(SearchStopped, metrics.poll)
+		self.assertEqual(metrics.stopped, 'cancelled')
+		self.assertEqual(metrics.nodes, 0)
+
+
+class TestSolutionCache(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, 'solutions.sqlite')
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_symmetries(self):
+		cube = scrambled(['R', 'U2', 'F1', 'M', 'E2', 'B'])
+		with SolutionCache(self.path) as cache:
+			cache.put(cube.state, ['B1', 'E2', 'M1', 'F', 'U2', 'R1'], metric='stm')
+			self.assertIsNone(cache.get(cube.state))
+			for getter in RubikCube.SYMMETRY_GETTERS:
+				solution, optimal = cache.get(getter(cube.state), 'stm')
+				self.assertFalse(optimal)
+				transformed = RubikCube.from_state(getter(cube.state))
+				for movement in solution:
+					transformed.do_movement(movement)
+				self.assertTrue(transformed.solved)
+
+	def test_best_solution_is_kept(self):
+		cube = scrambled(['R', 'U'])
+		with SolutionCache(self.path, memory_entries=0) as cache:
+			cache.put(cube.state, ['U1', 'U', 'U1', 'R1'])
+			cache.put(cube.state, ['U', 'U', 'R1'])
+			self.assertEqual(cache.get(cube.state), (['U', 'U', 'R1'], False))
+			cache.put(cube.state, ['U1', 'U', 'U1', 'R1'])
+			cache.put(cube.state, ['U1', 'R1'], optimal=True)
+			cache.put(cube.state, ['U', 'U', 'R1'])
+			self.assertEqual(cache.get(cube.state), (['U1', 'R1'], True))
+		with SolutionCache(self.path) as cache:
+			self.assertEqual(len(cache), 1)
+			self.assertEqual(cache.get(cube.state), (['U1', 'R1'], True))
+			self.assertEqual(cache.get(cube.state), (['U1', 'R1'], True))
+			self.assertEqual(cache.stats['memory'], 1)
+
+	def test_solvers(self):
+		cube = scrambled(['R', 'U', 'F1'])
+		with SolutionCache(self.path) as cache:
+			solution = IDASolver(cube, cache=cache).solve()
+			solver = IDASolver(cube, cache=cache)
+			self.assertEqual(solver.solve(), solution)
+			self.assertEqual(solver.n_movements_done, 0)
+			solver = BacktrackingSolver(cube=cube, cache=cache)
+			self.assertEqual(solver.solve(movements_left=3), solution)
+			self.assertEqual(solver.n_movements_done, 0)
+
+			rotated = scrambled(RubikCube.ROTATIONS['y'] + ['L', 'D1'])
+			solver = HeuristicSolver(cube=rotated, cache=cache)
+			solver.LIMIT = 2
+			self.assertEqual(len(solver.solve()), 2)
+			self.assertFalse(cache.get(rotated.state)[1])
+			solver = BacktrackingSolver(cube=rotated, cache=cache)
+			self.assertEqual(len(solver.solve(movements_left=3)), 2)
+			self.assertTrue(cache.get(rotated.state)[1])
+
+	def test_batch(self):
+		for _ in range(2):
+			output = io.StringIO()
+			solve_batch(TestBatch.LINES, output, processes=2, solver='ida', max_length=3, cache_path=self.path)
+			results = {result['id']: result for result in map(json.loads, output.getvalue().splitlines())}
+			self.assertEqual(results['a']['length'], 2)
+		self.assertEqual(results['a']['nodes'], 0)
+		with SolutionCache(self.path) as cache:
+			self.assertEqual(len(cache), 2)
+
+
+class TestEndgameTable(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.directory = tempfile.TemporaryDirectory()
+		cls.path = os.path.join(cls.directory.name, 'endgame')
+		cls.n_states = build_endgame(cls.path, depth=3)
+		cls.table = EndgameTable(cls.path)
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.table.close()
+		cls.directory.cleanup()
+
+	def test_solutions(self):
+		self.assertEqual(len(self.table), self.n_states)
+		self.assertEqual((self.table.metric, self.table.depth), ('qstm', 3))
+		for state in RubikCube.solved_states():
+			self.assertEqual(self.table.solution(state), [])
+		random.seed(5)
+		for _ in range(50):
+			cube = scrambled(RubikCube.ROTATIONS[random.choice('xyz')] +
+			                      [random.choice(RubikCube.POSSIBLE_MOVEMENTS) for _ in range(3)])
+			solution = self.table.solution(cube.state)
+			distance, movement = self.table.lookup(cube.state)
+			self.assertEqual(len(solution), distance)
+			self.assertLessEqual(distance, 3)
+			for movement in solution:
+				cube.do_movement(movement)
+			self.assertTrue(cube.solved)
+		self.assertIsNone(self.table.lookup(scrambled(['R', 'U', 'F', 'L']).state))
+
+	def test_build(self):
+		# Only the table is left, not the files of its levels
+		self.assertEqual(os.listdir(self.directory.name), ['endgame'])
+		with open(self.path, 'rb') as file:
+			self.assertEqual(len(file.read()), endgame.HEADER.size + endgame.INDEX.size + endgame.RECORD_SIZE * self.n_states)
+		self.assertRaises(ValueError, build_endgame, self.path + '7', depth=endgame.MAX_DEPTH + 1)
+
+	def test_solvers(self):
+		cube = scrambled(['R', 'U', 'F1', 'L'])
+		solver = BacktrackingSolver(cube=cube)
+		solver.solve(movements_left=4)
+		endgame_solver = BacktrackingSolver(cube=cube, endgame=self.table)
+		solution = endgame_solver.solve(movements_left=4)
+		self.assertEqual(len(solution), 4)
+		self.assertLess(endgame_solver.n_movements_done, solver.n_movements_done)
+		self.assertEqual(BacktrackingSolver(cube=cube, endgame=self.table).solve(movements_left=4, processes=2),
+		                 solution)
+		solver = HeuristicSolver(cube=cube, endgame=self.table)
+		solver.LIMIT = 4
+		self.assertLessEqual(len(solver.solve()), 5)
+		self.assertEqual(HeuristicSolver(cube=scrambled(['R', 'U']), endgame=self.table).solve(), ['U1', 'R1'])
+		self.assertRaises(ValueError, BacktrackingSolver, cube, metric='stm', endgame=self.table)
+
+
+class TestBidirectionalSolver(unittest.TestCase):
+
+	def test_optimal(self):
+		random.seed(8)
+		for metric in RubikCube.METRICS:
+			for verify in (True, False):
+				movements = RubikCube.METRICS[metric]
+				cube = scrambled(RubikCube.ROTATIONS[random.choice('xyz')] +
+				                      [random.choice(movements) for _ in range(5)])
+				solution = BidirectionalSolver(cube=cube, metric=metric, verify=verify).solve()
+				self.assertEqual(len(solution), len(IDASolver(cube=cube, metric=metric).solve()))
+				self.assertTrue(set(solution) <= set(movements))
+				for movement in solution:
+					cube.do_movement(movement)
+				self.assertTrue(cube.solved)
+		self.assertEqual(BidirectionalSolver(cube=scrambled(RubikCube.ROTATIONS['x'])).solve(), [])
+
+	def test_limits(self):
+		cube = scrambled(['R', 'U', 'F1', 'L', 'D', 'M'])
+		solver = BidirectionalSolver(cube=cube)
+		self.assertIsNone(solver.solve(max_movements=5))
+		self.assertIsNone(solver.stats['stopped'])
+		self.assertEqual(len(solver.solve()), 6)
+		self.assertEqual(sum(solver.stats['depths']), 6)
+		solver = BidirectionalSolver(cube=cube, max_bytes=200000)
+		self.assertIsNone(solver.solve())
+		self.assertEqual(solver.stats['stopped'], 'memory')
+		self.assertLessEqual(solver.stats['memory'], 200000)
+		solver = BidirectionalSolver(cube=cube)
+		self.assertIsNone(solver.solve(max_nodes=10))
+		self.assertEqual(solver.stats['stopped'], 'nodes')
+		self.assertRaises(ValueError, solver.solve, max_movements=15)
+		with tempfile.TemporaryDirectory() as directory, SolutionCache(os.path.join(directory, 'cache')) as cache:
+			solution = BidirectionalSolver(cube=cube, cache=cache).solve()
+			self.assertEqual(cache.get(cube.state), (solution, True))
+			solver = BidirectionalSolver(cube=cube, cache=cache)
+			self.assertEqual(solver.solve(), solution)
+			self.assertEqual(solver.n_movements_done, 0)